@@ -0,0 +1,283 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text, delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .db import SessionLocal
+from .models import Scan, ScanRollup, FindingRollup
+
+# cross-scan 통계 (project별 추세 / 평균 수정 시간 / 시끄러운 rule)
+# findings 원본(수억 row)은 scan이 끝날 때 한 번만 읽어서 rollup 테이블에 모아두고,
+# /analytics API는 rollup 테이블만 조회한다.
+
+# 경로 prefix 깊이 (src/api/user.py -> depth 2 = "src/api")
+ANALYTICS_PATH_DEPTH = int(os.getenv("ANALYTICS_PATH_DEPTH", "2"))
+ANALYTICS_DEFAULT_DAYS = int(os.getenv("ANALYTICS_DEFAULT_DAYS", "90"))
+
+NO_PROJECT = "(none)"
+BUCKETS = ("day", "week", "month")
+DIMENSIONS = {"severity": "severity", "rule": "rule_id", "path_prefix": "path_prefix"}
+
+# 이 scan의 findings -> rule / severity / 경로 prefix(디렉토리 기준) 별 개수
+_ROLLUP_SQL = text("""
+INSERT INTO finding_rollups (scan_id, rule_id, severity, path_prefix, findings)
+SELECT :scan_id,
+       coalesce(rule_id, ''),
+       coalesce(upper(severity), ''),
+       coalesce(nullif(array_to_string(
+           (string_to_array(coalesce(path, ''), '/'))[
+               1:least(CAST(:depth AS int), coalesce(array_length(string_to_array(path, '/'), 1), 1) - 1)
+           ], '/'), ''), '.'),
+       count(*)
+FROM findings
+WHERE scan_id = :scan_id
+GROUP BY 2, 3, 4
+""")
+
+# 이번 scan에 있는 finding: 새로 나타났으면 insert, 있던 것이면 last_seen 갱신
+# (수정됐다가 다시 나타난 것은 새 lifecycle로 보고 first_seen 재설정)
+_LIFECYCLE_SEEN_SQL = text("""
+INSERT INTO finding_lifecycle
+    (project_name, fingerprint, rule_id, severity, path,
+     first_seen_at, last_seen_at, first_scan_id, last_scan_id, fixed_at)
+SELECT DISTINCT ON (fingerprint)
+       :project, fingerprint, rule_id, upper(severity), path,
+       :ts, :ts, :scan_id, :scan_id, NULL
+FROM findings
+WHERE scan_id = :scan_id AND fingerprint IS NOT NULL
+ORDER BY fingerprint
+ON CONFLICT (project_name, fingerprint) DO UPDATE SET
+    severity = EXCLUDED.severity,
+    path = EXCLUDED.path,
+    last_seen_at = EXCLUDED.last_seen_at,
+    last_scan_id = EXCLUDED.last_scan_id,
+    first_seen_at = CASE WHEN finding_lifecycle.fixed_at IS NULL
+                         THEN finding_lifecycle.first_seen_at ELSE EXCLUDED.first_seen_at END,
+    first_scan_id = CASE WHEN finding_lifecycle.fixed_at IS NULL
+                         THEN finding_lifecycle.first_scan_id ELSE EXCLUDED.first_scan_id END,
+    fixed_at = NULL,
+    fixed_scan_id = NULL
+RETURNING first_scan_id = :scan_id AS is_new
+""")
+
+# 이번 scan에 없는 open finding -> 수정됨 (이 scan이 수정 처리한 것으로 기록)
+_LIFECYCLE_FIXED_SQL = text("""
+UPDATE finding_lifecycle
+SET fixed_at = :ts, fixed_scan_id = :scan_id
+WHERE project_name = :project AND fixed_at IS NULL AND last_seen_at < :ts
+""")
+
+# 이 scan이 수정 처리한 finding 수 / (수정 시각 - 최초 발견) 합계
+# 위 UPDATE의 RETURNING으로 세면 재실행 때 0이 되므로 (이미 fixed) lifecycle에서 다시 계산
+_FIXED_BY_SCAN_SQL = text("""
+SELECT count(*), coalesce(sum(extract(epoch FROM fixed_at - first_seen_at)), 0)
+FROM finding_lifecycle
+WHERE fixed_scan_id = :scan_id AND project_name = :project
+""")
+
+
+def record_scan(scan_id: str) -> dict | None:
+    """
+    scan ingest가 끝난 뒤(done) 호출. 같은 scan을 다시 넣어도 결과가 같도록(idempotent) 작성
+    - finding_rollups: 이 scan의 findings를 group by (scan_id 인덱스만 사용)
+    - finding_lifecycle / scan_rollups: project 단위 최초 발견 / 수정 시각
+    """
+    db = SessionLocal()
+    try:
+        scan = db.get(Scan, scan_id)
+        if not scan or scan.status != "done":
+            return None
+        project = scan.project_name or NO_PROJECT
+        finished_at = scan.updated_at
+
+        # 같은 project의 scan은 한 번에 하나씩 반영 (lifecycle 갱신 순서 보장)
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:p))"), {"p": project})
+
+        db.execute(delete(FindingRollup).where(FindingRollup.scan_id == scan_id))
+        db.execute(_ROLLUP_SQL, {"scan_id": scan_id, "depth": ANALYTICS_PATH_DEPTH})
+        total = db.execute(
+            text("SELECT coalesce(sum(findings), 0) FROM finding_rollups WHERE scan_id = :scan_id"),
+            {"scan_id": scan_id},
+        ).scalar()
+
+        new_findings, fixed_findings, fix_seconds = 0, 0, 0.0
+        # project가 없으면 scan 간 비교 대상이 없음
+        # 더 나중에 끝난 scan이 이미 반영됐으면 lifecycle은 건드리지 않고 이전에 계산한 값을 유지 (backfill / 재실행)
+        newer = db.execute(
+            select(ScanRollup.scan_id)
+            .where(ScanRollup.project_name == project, ScanRollup.finished_at > finished_at)
+            .limit(1)
+        ).first()
+        if scan.project_name and not newer:
+            params = {"project": project, "scan_id": scan_id, "ts": finished_at}
+            new_findings = sum(1 for row in db.execute(_LIFECYCLE_SEEN_SQL, params) if row[0])
+            db.execute(_LIFECYCLE_FIXED_SQL, params)
+            fixed_findings, fix_seconds = db.execute(_FIXED_BY_SCAN_SQL, params).one()
+        elif scan.project_name:
+            existing = db.get(ScanRollup, scan_id)
+            if existing:
+                new_findings = existing.new_findings
+                fixed_findings = existing.fixed_findings
+                fix_seconds = existing.fix_seconds_total
+
+        values = {
+            "project_name": project,
+            "finished_at": finished_at,
+            "findings_total": total,
+            "new_findings": new_findings,
+            "fixed_findings": fixed_findings,
+            "fix_seconds_total": float(fix_seconds),
+        }
+        db.execute(
+            pg_insert(ScanRollup)
+            .values(scan_id=scan_id, **values)
+            .on_conflict_do_update(index_elements=["scan_id"], set_=values)
+        )
+        db.commit()
+        return {"scan_id": scan_id, **values}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def backfill(limit: int | None = None) -> int:
+    # rollup 도입 이전에 끝난 scan들을 완료 순서대로 반영
+    db = SessionLocal()
+    try:
+        q = (
+            db.query(Scan.scan_id)
+            .outerjoin(ScanRollup, ScanRollup.scan_id == Scan.scan_id)
+            .filter(Scan.status == "done", ScanRollup.scan_id.is_(None))
+            .order_by(Scan.updated_at.asc())
+        )
+        if limit:
+            q = q.limit(limit)
+        scan_ids = [row[0] for row in q.all()]
+    finally:
+        db.close()
+
+    for scan_id in scan_ids:
+        record_scan(scan_id)
+    return len(scan_ids)
+
+
+# ---------------------------------------------------------------------------
+# 조회 (rollup 테이블만 사용)
+
+def default_window(since: datetime | None, until: datetime | None) -> tuple[datetime, datetime]:
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(days=ANALYTICS_DEFAULT_DAYS)
+    return since, until
+
+
+def _project_filter(project: str | None, column: str = "project_name") -> str:
+    return f" AND {column} = :project" if project else ""
+
+
+def trends(
+    bucket: str,
+    by: str,
+    since: datetime,
+    until: datetime,
+    project: str | None = None,
+    limit: int = 20,
+) -> list[dict]:
+    """
+    bucket(day/week/month)마다 각 project의 마지막 scan 기준 finding 수
+    (같은 기간에 scan을 여러 번 돌려도 중복 합산하지 않음)
+    by 별 상위 limit 개만 반환
+    """
+    # bucket / by 는 API에서 BUCKETS / DIMENSIONS 로 검증된 값만 들어옴
+    column = DIMENSIONS[by]
+    sql = text(f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (project_name, date_trunc('{bucket}', finished_at))
+                   scan_id, date_trunc('{bucket}', finished_at) AS bucket
+            FROM scan_rollups
+            WHERE finished_at >= :since AND finished_at < :until{_project_filter(project)}
+            ORDER BY project_name, date_trunc('{bucket}', finished_at), finished_at DESC
+        ),
+        per_bucket AS (
+            SELECT latest.bucket, r.{column} AS key, sum(r.findings) AS findings,
+                   row_number() OVER (PARTITION BY latest.bucket ORDER BY sum(r.findings) DESC) AS rank
+            FROM latest JOIN finding_rollups r ON r.scan_id = latest.scan_id
+            GROUP BY latest.bucket, r.{column}
+        )
+        SELECT bucket, key, findings FROM per_bucket
+        WHERE rank <= :limit
+        ORDER BY bucket, findings DESC
+    """)
+    db = SessionLocal()
+    try:
+        rows = db.execute(sql, {
+            "since": since, "until": until, "project": project, "limit": limit,
+        }).all()
+        return [{"bucket": r[0], by: r[1], "findings": int(r[2])} for r in rows]
+    finally:
+        db.close()
+
+
+def activity(bucket: str, since: datetime, until: datetime, project: str | None = None) -> list[dict]:
+    # bucket별 scan 수 / 새로 생긴 finding / 수정된 finding / 평균 수정 시간(MTTF)
+    sql = text(f"""
+        SELECT date_trunc('{bucket}', finished_at) AS bucket,
+               count(*) AS scans,
+               sum(new_findings) AS new_findings,
+               sum(fixed_findings) AS fixed_findings,
+               sum(fix_seconds_total) AS fix_seconds
+        FROM scan_rollups
+        WHERE finished_at >= :since AND finished_at < :until{_project_filter(project)}
+        GROUP BY 1
+        ORDER BY 1
+    """)
+    db = SessionLocal()
+    try:
+        out = []
+        for r in db.execute(sql, {"since": since, "until": until, "project": project}):
+            fixed = int(r[3] or 0)
+            out.append({
+                "bucket": r[0],
+                "scans": int(r[1]),
+                "new_findings": int(r[2] or 0),
+                "fixed_findings": fixed,
+                "mean_time_to_fix_hours": round(r[4] / fixed / 3600, 2) if fixed else None,
+            })
+        return out
+    finally:
+        db.close()
+
+
+def noisy_rules(since: datetime, until: datetime, project: str | None = None, limit: int = 20) -> list[dict]:
+    """
+    기간 안 각 project의 마지막 scan 기준으로 finding이 많은 rule
+    projects: 몇 개 project에서 나왔는지 (여러 project에서 대량으로 나오면 규칙 튜닝 대상)
+    """
+    sql = text(f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (project_name) scan_id
+            FROM scan_rollups
+            WHERE finished_at >= :since AND finished_at < :until{_project_filter(project)}
+            ORDER BY project_name, finished_at DESC
+        )
+        SELECT r.rule_id, sum(r.findings) AS findings, count(DISTINCT r.scan_id) AS projects
+        FROM latest JOIN finding_rollups r ON r.scan_id = latest.scan_id
+        GROUP BY r.rule_id
+        ORDER BY findings DESC
+        LIMIT :limit
+    """)
+    db = SessionLocal()
+    try:
+        rows = db.execute(sql, {"since": since, "until": until, "project": project, "limit": limit}).all()
+        return [
+            {"rule_id": r[0], "findings": int(r[1]), "projects": int(r[2])}
+            for r in rows
+        ]
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print(f"backfilled {backfill()} scans")
@@ -1,5 +1,13 @@
+import os
 from celery import Celery
 
+# heartbeat 끊긴 작업 / 유실된 queued 작업 정리 주기 (celery beat)
+REAPER_INTERVAL_SEC = float(os.getenv("REAPER_INTERVAL_SEC", "15"))
+# 만료된 분할 업로드 정리 주기
+UPLOAD_EXPIRE_INTERVAL_SEC = float(os.getenv("UPLOAD_EXPIRE_INTERVAL_SEC", "600"))
+# 보관 기간 지난 프로파일 정리 주기
+PROFILE_EXPIRE_INTERVAL_SEC = float(os.getenv("PROFILE_EXPIRE_INTERVAL_SEC", "3600"))
+
 # docker-compose -> redis가 기본 포트 6379로 열려있는 상황
 celery_app = Celery(
     "fuzzlab",
@@ -13,6 +21,36 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="Asia/Seoul",
     enable_utc=True,
+    # interactive / batch 두 큐 (worker: -Q interactive,batch)
+    task_default_queue="batch",
+    # 큐는 나열 순서대로 확인 + 큐 안에서는 priority(0~9, 0이 가장 높음) 순
+    broker_transport_options={
+        "queue_order_strategy": "priority",
+        "priority_steps": list(range(10)),
+        "sep": ":",
+    },
+    # 미리 여러 개 가져가면 우선순위가 무시되므로 1개씩
+    worker_prefetch_multiplier=1,
+    # worker가 죽으면 받은 메시지를 다시 큐로 (실행 여부는 DB의 claim으로 판단)
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    beat_schedule={
+        "reap-stale-work": {
+            "task": "backend.app.tasks.reap_stale_work",
+            "schedule": REAPER_INTERVAL_SEC,
+            "options": {"queue": "interactive", "expires": REAPER_INTERVAL_SEC},
+        },
+        "expire-uploads": {
+            "task": "backend.app.tasks.expire_uploads",
+            "schedule": UPLOAD_EXPIRE_INTERVAL_SEC,
+            "options": {"queue": "batch", "expires": UPLOAD_EXPIRE_INTERVAL_SEC},
+        },
+        "expire-profiles": {
+            "task": "backend.app.tasks.expire_profiles",
+            "schedule": PROFILE_EXPIRE_INTERVAL_SEC,
+            "options": {"queue": "batch", "expires": PROFILE_EXPIRE_INTERVAL_SEC},
+        },
+    },
 )
 
 #celery에서 tasks 모듈 확실히 import하기 위해 추가함
@@ -0,0 +1,367 @@
+import io
+import os
+import csv
+import gzip
+import time
+import tempfile
+from pathlib import Path
+
+import redis
+
+from .db import SessionLocal
+from .models import Scan, Finding, LLMAnswer
+from .responses import encode_json
+from .redis_client import get_redis
+
+# scan 결과 내보내기 (SARIF 2.1.0 / CSV)
+# findings는 server-side cursor(yield_per)로 조금씩 읽어서 바로 내보냄 -> scan 크기와 무관하게 메모리 일정
+# 완료된 scan은 worker(render_exports)가 gzip 파일로 만들어두고 이후 다운로드는 파일을 그대로 전송
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# 이 크기만큼 모이면 한 번에 내보냄
+EXPORT_FLUSH_BYTES = int(os.getenv("EXPORT_FLUSH_BYTES", str(64 * 1024)))
+
+FORMATS = {
+    "sarif": {"media_type": "application/sarif+json", "ext": "sarif"},
+    "csv": {"media_type": "text/csv; charset=utf-8", "ext": "csv"},
+}
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+# semgrep / FuzzLab severity -> SARIF level
+_LEVELS = {
+    "CRITICAL": "error",
+    "HIGH": "error",
+    "ERROR": "error",
+    "MEDIUM": "warning",
+    "WARNING": "warning",
+    "LOW": "note",
+    "INFO": "note",
+}
+# code scanning UI가 읽는 rule.properties["security-severity"] (0~10)
+_SECURITY_SEVERITY = {
+    "CRITICAL": 9.5,
+    "HIGH": 8.0,
+    "ERROR": 8.0,
+    "MEDIUM": 5.5,
+    "WARNING": 5.5,
+    "LOW": 3.0,
+    "INFO": 1.0,
+}
+
+CSV_COLUMNS = [
+    "scan_id", "finding_id", "rule_id", "severity", "path", "start_line", "end_line",
+    "message", "group_id", "fingerprint",
+    "triage_status", "triage_risk_level", "triage_summary", "triage_recommendation", "triage_model",
+]
+
+EXPORT_PREFIX = "fuzzlab:export"
+
+
+def group_id_of(path, start_line, end_line) -> str:
+    # main.group_findings 와 같은 형식
+    return f"{path}:{start_line}-{end_line}"
+
+
+def _load_triage(db, scan_id: str) -> dict:
+    # LLM 답변은 group 단위라 finding 수보다 훨씬 적음 -> 미리 dict로
+    rows = (
+        db.query(LLMAnswer.group_id, LLMAnswer.status, LLMAnswer.model, LLMAnswer.response_json)
+        .filter(LLMAnswer.scan_id == scan_id)
+        .all()
+    )
+    return {
+        r.group_id: {"status": r.status, "model": r.model, "answer": r.response_json or {}}
+        for r in rows
+    }
+
+
+def _iter_findings(db, scan_id: str):
+    return (
+        db.query(
+            Finding.id,
+            Finding.rule_id,
+            Finding.severity,
+            Finding.message,
+            Finding.path,
+            Finding.start_line,
+            Finding.end_line,
+            Finding.fingerprint,
+            Finding.normalized_json,
+        )
+        .filter(Finding.scan_id == scan_id)
+        .order_by(Finding.id.asc())
+        .execution_options(stream_results=True)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+
+
+# ---------------------------------------------------------------------------
+# SARIF
+
+def _sarif_result(f, rule_index: int, triage: dict | None) -> dict:
+    normalized = f.normalized_json or {}
+    snippet = ((normalized.get("evidence") or {}).get("snippet")) or None
+    region = {}
+    if f.start_line is not None:
+        region["startLine"] = f.start_line
+    if f.end_line is not None:
+        region["endLine"] = f.end_line
+    if snippet:
+        region["snippet"] = {"text": snippet}
+
+    location = {"artifactLocation": {"uri": f.path or "", "uriBaseId": "%SRCROOT%"}}
+    if region:
+        location["region"] = region
+
+    group_id = group_id_of(f.path, f.start_line, f.end_line)
+    props = {"severity": f.severity, "group_id": group_id, "finding_id": f.id}
+    if triage:
+        answer = triage["answer"]
+        props["triage"] = {
+            "status": triage["status"],
+            "model": triage["model"],
+            "risk_level": answer.get("risk_level"),
+            "summary": answer.get("summary"),
+            "recommendation": answer.get("recommendation"),
+        }
+
+    result = {
+        "ruleId": f.rule_id or "unknown",
+        "ruleIndex": rule_index,
+        "level": _LEVELS.get((f.severity or "").upper(), "warning"),
+        "message": {"text": f.message or f.rule_id or ""},
+        "locations": [{"physicalLocation": location}],
+        "properties": props,
+    }
+    if f.fingerprint:
+        result["partialFingerprints"] = {"fuzzlab/v1": f.fingerprint}
+    return result
+
+
+def _sarif_rule(rule_id: str, f) -> dict:
+    normalized = f.normalized_json or {}
+    cwe = ((normalized.get("references") or {}).get("cwe")) or []
+    return {
+        "id": rule_id,
+        "name": rule_id,
+        "shortDescription": {"text": (f.message or rule_id)[:1000]},
+        "properties": {
+            "tags": ["security", *cwe],
+            "security-severity": str(_SECURITY_SEVERITY.get((f.severity or "").upper(), 5.5)),
+        },
+    }
+
+
+def iter_sarif(scan_id: str):
+    """
+    SARIF 2.1.0 을 bytes 조각으로 생성
+    results를 먼저 내보내고 tool.driver.rules는 마지막에 (rule 목록은 rule 수만큼만 메모리 사용)
+    JSON object 안의 key 순서는 의미가 없으므로 유효한 SARIF
+    """
+    db = SessionLocal()
+    try:
+        scan = db.get(Scan, scan_id)
+        if not scan:
+            return
+        triage = _load_triage(db, scan_id)
+        rules: dict[str, int] = {}
+        rule_defs: list[dict] = []
+
+        buf = bytearray()
+        buf += b'{"$schema":' + encode_json(SARIF_SCHEMA) + b',"version":"2.1.0","runs":[{"results":['
+        first = True
+        for f in _iter_findings(db, scan_id):
+            rule_id = f.rule_id or "unknown"
+            if rule_id not in rules:
+                rules[rule_id] = len(rule_defs)
+                rule_defs.append(_sarif_rule(rule_id, f))
+            result = _sarif_result(f, rules[rule_id], triage.get(group_id_of(f.path, f.start_line, f.end_line)))
+            if not first:
+                buf += b","
+            buf += encode_json(result)
+            first = False
+            if len(buf) >= EXPORT_FLUSH_BYTES:
+                yield bytes(buf)
+                buf.clear()
+
+        run_tail = {
+            "tool": {"driver": {
+                "name": "FuzzLab",
+                "rules": rule_defs,
+            }},
+            "automationDetails": {"id": f"fuzzlab/{scan_id}"},
+            "properties": {"scan_id": scan_id, "status": scan.status, "project_name": scan.project_name},
+        }
+        # results 배열 닫고 나머지 run 필드를 이어 붙임
+        buf += b"]," + encode_json(run_tail)[1:] + b"]}"
+        yield bytes(buf)
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# CSV
+
+def iter_csv(scan_id: str):
+    db = SessionLocal()
+    try:
+        if not db.get(Scan, scan_id):
+            return
+        triage = _load_triage(db, scan_id)
+
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(CSV_COLUMNS)
+        for f in _iter_findings(db, scan_id):
+            group_id = group_id_of(f.path, f.start_line, f.end_line)
+            t = triage.get(group_id) or {}
+            answer = t.get("answer") or {}
+            writer.writerow([
+                scan_id, f.id, f.rule_id, f.severity, f.path, f.start_line, f.end_line,
+                f.message, group_id, f.fingerprint,
+                t.get("status"), answer.get("risk_level"), answer.get("summary"),
+                answer.get("recommendation"), t.get("model"),
+            ])
+            if out.tell() >= EXPORT_FLUSH_BYTES:
+                yield out.getvalue().encode("utf-8")
+                out.seek(0)
+                out.truncate(0)
+        yield out.getvalue().encode("utf-8")
+    finally:
+        db.close()
+
+
+def iter_export(scan_id: str, fmt: str):
+    return iter_sarif(scan_id) if fmt == "sarif" else iter_csv(scan_id)
+
+
+# ---------------------------------------------------------------------------
+# 미리 만든 gzip 파일 (완료된 scan만)
+# 파일 이름에 generation을 넣어서, invalidate 이후에 끝난 렌더링 결과는 다운로드 쪽에서 절대 열지 않음
+
+def _exports_dir(scan_id: str) -> Path:
+    return Path("workspace") / scan_id / "exports"
+
+
+def artifact_path(scan_id: str, fmt: str, gen: int) -> Path:
+    return _exports_dir(scan_id) / f"report.{gen}.{FORMATS[fmt]['ext']}.gz"
+
+
+def _generation_key(scan_id: str) -> str:
+    return f"{EXPORT_PREFIX}:{scan_id}:gen"
+
+
+def _render_lock_key(scan_id: str) -> str:
+    return f"{EXPORT_PREFIX}:{scan_id}:rendering"
+
+
+def open_artifact(scan_id: str, fmt: str):
+    # 먼저 열어두면 전송 중에 invalidate로 파일이 지워져도 끝까지 보낼 수 있음
+    gen = generation(scan_id)
+    if gen < 0:
+        return None
+    try:
+        return artifact_path(scan_id, fmt, gen).open("rb")
+    except FileNotFoundError:
+        return None
+
+
+def iter_file(f, decompress: bool = False):
+    # gzip 그대로 / 또는 gzip을 못 받는 client용으로 풀어서
+    with f:
+        source = gzip.GzipFile(fileobj=f, mode="rb") if decompress else f
+        for block in iter(lambda: source.read(EXPORT_FLUSH_BYTES), b""):
+            yield block
+
+
+def generation(scan_id: str) -> int:
+    """
+    현재 generation (redis 장애면 -1)
+    키가 없으면(처음 / redis 재시작으로 유실) 0이 아니라 현재 시각(ms)으로 시작
+    -> 키를 잃어도 이전 generation으로 돌아가지 않으므로 디스크에 남은 예전 파일 / 렌더링 중이던 결과가 열리지 않음
+    """
+    try:
+        r = get_redis()
+        key = _generation_key(scan_id)
+        gen = r.get(key)
+        if gen is None:
+            r.set(key, time.time_ns() // 1_000_000, nx=True)
+            gen = r.get(key)
+        return int(gen)
+    except redis.RedisError:
+        return -1
+
+
+def _remove_other_generations(scan_id: str, gen: int) -> None:
+    # 현재 generation이 아닌 파일은 다시 열릴 일이 없음 -> 디스크에서 정리
+    keep = {artifact_path(scan_id, fmt, gen).name for fmt in FORMATS}
+    for path in _exports_dir(scan_id).glob("report.*.gz"):
+        if path.name not in keep:
+            path.unlink(missing_ok=True)
+
+
+def invalidate(scan_id: str) -> None:
+    """
+    LLM 답변 변경 등으로 결과가 바뀌면 파일 삭제
+    generation을 올려서 렌더링 중이던 worker가 오래된 파일을 남기지 않도록 함
+    """
+    try:
+        get_redis().incr(_generation_key(scan_id))
+    except redis.RedisError:
+        pass
+    # 이전 generation 파일은 더 이상 열리지 않음 -> 디스크만 정리
+    for path in _exports_dir(scan_id).glob("report.*.gz"):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def claim_render(scan_id: str) -> bool:
+    # 같은 scan의 렌더링 작업을 동시에 여러 개 넣지 않도록
+    try:
+        return bool(get_redis().set(_render_lock_key(scan_id), 1, nx=True, ex=600))
+    except redis.RedisError:
+        return False
+
+
+def release_render(scan_id: str) -> None:
+    try:
+        get_redis().delete(_render_lock_key(scan_id))
+    except redis.RedisError:
+        pass
+
+
+def render(scan_id: str) -> dict:
+    gen = generation(scan_id)
+    if gen < 0:
+        # generation을 모르면 어떤 파일을 써야 할지 모름 -> 다운로드는 DB에서 바로 stream
+        return {"scan_id": scan_id, "status": "skipped"}
+    written = {}
+    for fmt in FORMATS:
+        path = artifact_path(scan_id, fmt, gen)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 임시 파일에 쓰고 rename -> 다운로드 중인 요청이 반쯤 쓴 파일을 보지 않음
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as gz:
+                for chunk in iter_export(scan_id, fmt):
+                    gz.write(chunk)
+            if generation(scan_id) != gen:
+                # 렌더링 중에 invalidate 됨 -> 버림 (rename 이후에 invalidate 돼도 이름의 generation이 달라서 안 열림)
+                os.unlink(tmp)
+                return {"scan_id": scan_id, "status": "stale"}
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        written[fmt] = path.stat().st_size
+    if generation(scan_id) != gen:
+        # rename 직후 invalidate 됨 -> 열릴 일은 없지만 디스크에서 정리
+        for fmt in FORMATS:
+            artifact_path(scan_id, fmt, gen).unlink(missing_ok=True)
+        return {"scan_id": scan_id, "status": "stale"}
+    _remove_other_generations(scan_id, gen)
+    return {"scan_id": scan_id, "status": "done", "bytes": written}
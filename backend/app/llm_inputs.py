@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .db import SessionLocal
+from .models import LLMInput, LLMAnswer
+from .llm_service import canonical_json, prompt_input, render_prompt, PROMPT_VERSION
+from . import responses
+
+# llm_answers마다 전체 프롬프트를 저장하지 않고
+#   prompt_version (템플릿) + input_hash (llm_inputs의 압축 blob) 로 저장
+# 같은 입력은 scan이 달라도 한 번만 저장되고, 같은 입력 + 모델 + 템플릿이면 기존 답을 재사용할 수 있다.
+
+
+def _encoding() -> str:
+    return "zstd" if responses.zstandard is not None else "gzip"
+
+
+def _decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return responses.zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def prepare(llm_input: dict) -> dict:
+    """
+    build_llm_input 결과 -> {"input_hash", "input_json", "prompt_version", "prompt"}
+    prompt는 Ollama로 보낼 전문 (DB에는 저장하지 않음)
+    """
+    input_json = canonical_json(prompt_input(llm_input))
+    return {
+        "input_hash": hashlib.sha256(input_json.encode("utf-8")).hexdigest(),
+        "input_json": input_json,
+        "prompt_version": PROMPT_VERSION,
+        "prompt": render_prompt(input_json, PROMPT_VERSION),
+    }
+
+
+def store(prepared: dict) -> str:
+    # 이미 있는 해시면 아무것도 쓰지 않음 (write amplification 방지)
+    raw = prepared["input_json"].encode("utf-8")
+    encoding = _encoding()
+    db = SessionLocal()
+    try:
+        db.execute(
+            pg_insert(LLMInput)
+            .values(
+                input_hash=prepared["input_hash"],
+                encoding=encoding,
+                data=responses.compress(raw, encoding),
+                size_bytes=len(raw),
+            )
+            .on_conflict_do_nothing(index_elements=["input_hash"])
+        )
+        db.commit()
+    finally:
+        db.close()
+    return prepared["input_hash"]
+
+
+def load_input_json(db, input_hash: str) -> str | None:
+    blob = db.get(LLMInput, input_hash)
+    if not blob:
+        return None
+    return _decompress(blob.data, blob.encoding).decode("utf-8")
+
+
+def reconstruct_prompt(db, row: LLMAnswer) -> str | None:
+    # 이전 row(v1) / 수동 입력은 prompt 컬럼에 전문이 그대로 있음
+    if not row.input_hash or not row.prompt_version:
+        return row.prompt or None
+    input_json = load_input_json(db, row.input_hash)
+    if input_json is None:
+        return None
+    return render_prompt(input_json, row.prompt_version)
+
+
+def find_reusable(input_hash: str, prompt_version: str, model: str) -> dict | None:
+    """
+    같은 입력 + 같은 템플릿 + 같은 모델로 이미 성공한 답이 있으면 그 내용 (다른 scan 포함)
+    temperature가 낮고 출력 스키마가 고정이라 다시 호출해도 거의 같은 답 -> Ollama 호출 생략
+
+    재사용한 row에 답 / tier / input_hash / prompt_version 을 그대로 복사하므로 감사에 필요한 내용은 그 row만으로 충분
+    id는 복사해 온 row (그 row는 나중에 다시 생성돼서 내용이 바뀔 수 있음, 참고용)
+    """
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(LLMAnswer)
+            .filter(
+                LLMAnswer.input_hash == input_hash,
+                LLMAnswer.prompt_version == prompt_version,
+                LLMAnswer.model == model,
+                LLMAnswer.status == "done",
+                LLMAnswer.response_json.isnot(None),
+            )
+            .order_by(LLMAnswer.id.desc())
+            .first()
+        )
+        if not row:
+            return None
+        return {
+            "id": row.id,
+            "tier": row.tier,
+            "escalated": row.escalated,
+            "response_json": row.response_json,
+        }
+    finally:
+        db.close()
@@ -51,20 +51,41 @@ def build_llm_input(db, scan_id: str, group_id: str, group_findings_func) -> dic
         },
     }
 
-# Ollama에 전달할 프롬프트
-def make_prompt(llm_input: dict) -> str:
-    return (
-        "You are a security analyst.\n"
-        "Return ONLY a valid JSON object.\n"
-        "Do NOT include markdown, code fences, or extra text.\n"
-        "Use ONLY the provided evidence. If evidence is insufficient, state that in reasoning.\n\n"
-        "Required JSON fields:\n"
-        "- summary (string)\n"
-        "- risk_level (one of: low, medium, high, critical)\n"
-        "- reasoning (string)\n"
-        "- impact (string)\n"
-        "- recommendation (string)\n"
-        "- safe_example (string)\n\n"
-        "INPUT JSON:\n"
-        f"{json.dumps(llm_input, ensure_ascii=False, default=str)}\n"
-    )
+# 프롬프트 템플릿 (버전별로 고정, 바꿀 때는 새 버전 추가)
+# llm_answers에는 전체 프롬프트 대신 prompt_version + 입력 blob 해시(llm_inputs)만 저장하고
+# 감사(audit) 시 render_prompt로 그대로 다시 만든다.
+_PREAMBLE = (
+    "You are a security analyst.\n"
+    "Return ONLY a valid JSON object.\n"
+    "Do NOT include markdown, code fences, or extra text.\n"
+    "Use ONLY the provided evidence. If evidence is insufficient, state that in reasoning.\n\n"
+    "Required JSON fields:\n"
+    "- summary (string)\n"
+    "- risk_level (one of: low, medium, high, critical)\n"
+    "- reasoning (string)\n"
+    "- impact (string)\n"
+    "- recommendation (string)\n"
+    "- safe_example (string)\n\n"
+    "INPUT JSON:\n"
+)
+# (v1 = prompt_version이 없는 이전 row: scan 정보까지 포함, prompt 컬럼에 전문 저장)
+PROMPT_TEMPLATES = {
+    # v2: scan 정보 제외 (group + contract) -> 같은 코드/규칙이면 scan이 달라도 입력이 같음
+    "v2": _PREAMBLE + "{input_json}\n",
+}
+PROMPT_VERSION = "v2"
+
+
+def prompt_input(llm_input: dict) -> dict:
+    # scan_id / workspace_path / created_at 은 분석에 필요 없고 입력 dedup을 막으므로 제외
+    return {"group": llm_input["group"], "contract": llm_input["contract"]}
+
+
+def canonical_json(obj) -> str:
+    # 같은 내용이면 항상 같은 문자열 (key 정렬) -> 해시 / 프롬프트 재구성에 사용
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def render_prompt(input_json: str, version: str = PROMPT_VERSION) -> str:
+    return PROMPT_TEMPLATES[version].format(input_json=input_json)
+
@@ -12,11 +12,35 @@ from pathlib import Path
 import zipfile
 import shutil
 import math
+from datetime import datetime, timezone
 from fastapi import HTTPException
 from .models import LLMAnswer
 from .tasks import generate_llm_answer_for_group
 from pydantic import BaseModel
 from .models import LLMAnswer
+from fastapi import Request
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from . import response_cache
+from . import responses
+from .celery_app import celery_app
+from . import scheduler
+from . import ollama_pool
+from . import scan_state
+from . import openai_compat
+from . import uploads
+from . import analytics
+from . import exports
+from . import llm_inputs
+from . import profiling
+from .models import ProfileArtifact
+from .tasks import request_export_render
+from .tasks import run_upload_finalize
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from .models import Upload
+import os
+import hashlib
 
 SEVERITY_MAP = {
     None: 0,
@@ -25,30 +49,46 @@ SEVERITY_MAP = {
     "MEDIUM": 2,
     "HIGH": 3,
     "CRITICAL": 4,
+    # semgrep 기본 severity 표기
+    "WARNING": 2,
+    "ERROR": 3,
 }
 
-app = FastAPI(title="FuzzLab API Demo")
+# dict를 반환하는 endpoint도 stdlib json 대신 orjson으로 직렬화
+app = FastAPI(title="FuzzLab API Demo", default_response_class=responses.ORJSONResponse)
+# 헤더 X-FuzzLab-Profile: 1 (또는 ?_profile=1) 인 요청만 sampling 프로파일링
+app.add_middleware(profiling.ProfileMiddleware)
 
 class ScanRequest(BaseModel):
     scan_id: str | None = None
 
-@app.post("/scan")
-def create_scan(
-    file: UploadFile = File(...),
-    project_name: str | None = Form(None),
-):
-    scan_id = str(uuid4())
+def _validate_task_profile(task_profile: str | None, modes: tuple = profiling.MODES):
+    if task_profile is not None and task_profile not in modes:
+        raise HTTPException(status_code=400, detail=f"task_profile must be one of {list(modes)}")
 
-    # workspace/<scan_id>/src
-    base = Path("workspace") / scan_id
+
+def _validate_scan_options(priority: str, semgrep_timeout: int | None, semgrep_max_memory: int | None):
+    if priority not in scheduler.PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"unknown priority: {priority}")
+    for name, value in (("semgrep_timeout", semgrep_timeout), ("semgrep_max_memory", semgrep_max_memory)):
+        if value is not None and value <= 0:
+            raise HTTPException(status_code=400, detail=f"{name} must be positive")
+
+
+def _start_scan(
+    scan_id: str,
+    zip_path: Path,
+    project_name: str | None,
+    semgrep_timeout: int | None,
+    semgrep_max_memory: int | None,
+    priority: str,
+    task_profile: str | None = None,
+) -> dict:
+    # workspace/<scan_id>/upload.zip -> src/ 로 풀고 scan 생성 + 큐 제출 (POST /scan, 분할 업로드 공통)
+    base = zip_path.parent
     repo_root = base / "src"
-    base.mkdir(parents=True, exist_ok=True)
     repo_root.mkdir(parents=True, exist_ok=True)
-
-    # zip 저장
-    zip_path = base / "upload.zip"
-    with zip_path.open("wb") as f:
-        shutil.copyfileobj(file.file, f)
+    task_id = str(uuid4())
 
     # unzip(zip-slip 방지)
     try:
@@ -65,21 +105,267 @@ def create_scan(
             scan_id=scan_id,
             status="queued",
             workspace_path=str(repo_root),
+            task_id=task_id,
+            semgrep_timeout=semgrep_timeout,
+            semgrep_max_memory=semgrep_max_memory,
+            project_name=project_name,
+            priority=priority,
         ))
         db.commit()
     finally:
         db.close()
 
-    # semgrep 실행 (scan_id만 넘김)
-    run_semgrep_and_store.delay(scan_id)
+    # semgrep 실행 (scan_id만 넘김, task_id는 cancel용으로 미리 정해둠)
+    try:
+        scheduler.submit(
+            run_semgrep_and_store, [scan_id, task_profile],
+            kind="scan", project=project_name, priority_class=priority, task_id=task_id,
+        )
+    except Exception as e:
+        # broker / redis 장애: queued로 두면 reaper가 볼 때까지 아무도 실행하지 않음 -> failed 로 닫고 503
+        scan_state.transition_scan(
+            scan_id, "failed", from_statuses=["queued"], error_message=f"task submit failed: {e}",
+        )
+        raise HTTPException(
+            status_code=503,
+            detail={"scan_id": scan_id, "status": "failed", "error": f"task queue unavailable: {e}"},
+        )
 
     return {
         "scan_id": scan_id,
         "status": "queued",
         "workspace_path": str(repo_root),
+        "queue": scheduler.queue_info(task_id),
+    }
+
+
+@app.post("/scan")
+def create_scan(
+    file: UploadFile = File(...),
+    project_name: str | None = Form(None),
+    semgrep_timeout: int | None = Form(None),     # semgrep --timeout (초, rule/file 당)
+    semgrep_max_memory: int | None = Form(None),  # semgrep --max-memory (MB)
+    priority: str = Form("interactive"),          # interactive / batch
+    task_profile: str | None = Form(None),        # sampling -> worker 작업 프로파일링 (cprofile은 semgrep 스레드를 못 봄)
+):
+    _validate_scan_options(priority, semgrep_timeout, semgrep_max_memory)
+    _validate_task_profile(task_profile, profiling.SCAN_MODES)
+
+    scan_id = str(uuid4())
+
+    # workspace/<scan_id>/src
+    base = Path("workspace") / scan_id
+    base.mkdir(parents=True, exist_ok=True)
+
+    # zip 저장
+    zip_path = base / "upload.zip"
+    with zip_path.open("wb") as f:
+        shutil.copyfileobj(file.file, f)
+
+    return _start_scan(scan_id, zip_path, project_name, semgrep_timeout, semgrep_max_memory, priority, task_profile)
+
+
+# ---------------------------------------------------------------------------
+# 분할(resumable) 업로드: 큰 zip을 chunk 단위로 올리고, 끊기면 빠진 chunk만 다시 전송
+#   1) POST /uploads                      {size, chunk_size?, sha256?, project_name?, ...}
+#   2) PUT  /uploads/{upload_id}          헤더 Upload-Offset, X-Chunk-SHA256 (병렬 전송 가능)
+#   3) GET  /uploads/{upload_id}          받은 / 빠진 chunk 확인 (재개용)
+#   4) POST /uploads/{upload_id}/finalize  -> scan 생성
+
+class UploadInitRequest(BaseModel):
+    size: int
+    chunk_size: int | None = None
+    sha256: str | None = None
+    project_name: str | None = None
+    semgrep_timeout: int | None = None
+    semgrep_max_memory: int | None = None
+    priority: str = "interactive"
+
+
+def _load_upload(upload_id: str) -> Upload:
+    db = SessionLocal()
+    try:
+        upload = db.get(Upload, upload_id)
+        if not upload:
+            raise HTTPException(status_code=404, detail="upload not found")
+        db.expunge(upload)
+        return upload
+    finally:
+        db.close()
+
+
+def _touch_upload(upload_id: str):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Upload)
+            .where(Upload.upload_id == upload_id, Upload.status == "uploading")
+            .values(expires_at=uploads.next_expiry())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+@app.post("/uploads")
+def init_upload(req: UploadInitRequest):
+    _validate_scan_options(req.priority, req.semgrep_timeout, req.semgrep_max_memory)
+    if req.size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+    if req.size > uploads.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"upload too large (max {uploads.UPLOAD_MAX_BYTES} bytes)")
+
+    chunk_size = req.chunk_size or uploads.UPLOAD_CHUNK_SIZE
+    if not uploads.UPLOAD_MIN_CHUNK_SIZE <= chunk_size <= uploads.UPLOAD_MAX_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"chunk_size must be between {uploads.UPLOAD_MIN_CHUNK_SIZE} and {uploads.UPLOAD_MAX_CHUNK_SIZE}",
+        )
+
+    upload_id = str(uuid4())
+    scan_id = str(uuid4())
+    uploads.allocate(scan_id, req.size)
+
+    expires_at = uploads.next_expiry()
+    db = SessionLocal()
+    try:
+        db.add(Upload(
+            upload_id=upload_id,
+            scan_id=scan_id,
+            status="uploading",
+            total_size=req.size,
+            chunk_size=chunk_size,
+            sha256=req.sha256.lower() if req.sha256 else None,
+            project_name=req.project_name,
+            priority=req.priority,
+            semgrep_timeout=req.semgrep_timeout,
+            semgrep_max_memory=req.semgrep_max_memory,
+            expires_at=expires_at,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    return {
+        "upload_id": upload_id,
+        "chunk_size": chunk_size,
+        "chunks": uploads.chunk_count(req.size, chunk_size),
+        "expires_at": expires_at,
     }
 
 
+@app.put("/uploads/{upload_id}")
+async def put_upload_chunk(upload_id: str, request: Request):
+    # body를 메모리에 다 올리지 않고 받는 대로 파일 offset에 기록 (디스크/DB 작업은 threadpool)
+    upload = await run_in_threadpool(_load_upload, upload_id)
+    if upload.status != "uploading":
+        raise HTTPException(status_code=409, detail=f"upload not accepting chunks: status={upload.status}")
+
+    checksum = (request.headers.get("X-Chunk-SHA256") or "").lower()
+    if not checksum:
+        raise HTTPException(status_code=400, detail="X-Chunk-SHA256 header required")
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Upload-Offset header required")
+    if offset < 0 or offset >= upload.total_size or offset % upload.chunk_size:
+        raise HTTPException(status_code=400, detail=f"offset must be a multiple of chunk_size={upload.chunk_size}")
+
+    index = offset // upload.chunk_size
+    length = uploads.expected_length(upload.total_size, upload.chunk_size, index)
+
+    # 임시 파일(stage)에 받으면서 hash -> 맞을 때만 최종 파일에 기록
+    # (체크섬 불일치 / 전송 중 끊김이면 stage만 버림, 이미 받은 chunk의 내용도 그대로)
+    h = hashlib.sha256()
+    received = 0
+    pending = bytearray()
+    fd, stage = await run_in_threadpool(uploads.open_stage, upload.scan_id, index)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for part in request.stream():
+                if received + len(part) > length:
+                    raise HTTPException(status_code=400, detail=f"chunk longer than expected {length} bytes")
+                h.update(part)
+                pending += part
+                received += len(part)
+                if len(pending) >= 1024 * 1024:
+                    await run_in_threadpool(f.write, bytes(pending))
+                    pending.clear()
+            if pending:
+                await run_in_threadpool(f.write, bytes(pending))
+
+        if received != length:
+            raise HTTPException(status_code=400, detail=f"chunk length mismatch: got {received}, expected {length}")
+        if h.hexdigest() != checksum:
+            raise HTTPException(status_code=422, detail="chunk checksum mismatch")
+
+        # finalize와 경합하면 기록하지 않음
+        if not await run_in_threadpool(uploads.commit_chunk, upload_id, upload.scan_id, index, offset, stage):
+            raise HTTPException(status_code=409, detail="upload not accepting chunks")
+    finally:
+        await run_in_threadpool(uploads.discard_stage, stage)
+
+    await run_in_threadpool(_touch_upload, upload_id)
+
+    return {"upload_id": upload_id, "offset": offset, "index": index, "length": length}
+
+
+@app.get("/uploads/{upload_id}")
+def get_upload(upload_id: str):
+    upload = _load_upload(upload_id)
+    total_chunks = uploads.chunk_count(upload.total_size, upload.chunk_size)
+    missing = uploads.missing(upload_id, total_chunks) if upload.status == "uploading" else []
+    return {
+        "upload_id": upload_id,
+        "status": upload.status,
+        "size": upload.total_size,
+        "chunk_size": upload.chunk_size,
+        "chunks": total_chunks,
+        "received_chunks": total_chunks - len(missing),
+        # 재개 시 이 offset들만 다시 보내면 됨
+        "missing_offsets": [i * upload.chunk_size for i in missing],
+        "expires_at": upload.expires_at,
+        "scan_id": upload.scan_id if upload.status == "finalized" else None,
+        "error_message": upload.error_message,
+    }
+
+
+@app.post("/uploads/{upload_id}/finalize", status_code=202)
+def finalize_upload(upload_id: str):
+    # 전체 체크섬 확인 + 압축 해제는 큰 zip에서 오래 걸리므로 worker(run_upload_finalize)에서 진행
+    # 결과는 GET /uploads/{upload_id} 의 status / scan_id / error_message 로 확인
+    upload = _load_upload(upload_id)
+    if upload.status in ("finalizing", "finalized"):
+        # 재시도(응답 유실 등)는 현재 상태를 그대로 돌려줌
+        scan_id = upload.scan_id if upload.status == "finalized" else None
+        return {"upload_id": upload_id, "status": upload.status, "scan_id": scan_id}
+
+    # 동시에 finalize가 두 번 와도 한 번만 진행
+    if not uploads.set_status(upload_id, "finalizing", from_status="uploading"):
+        raise HTTPException(status_code=409, detail=f"upload not finalizable: status={upload.status}")
+
+    total_chunks = uploads.chunk_count(upload.total_size, upload.chunk_size)
+    missing = uploads.missing(upload_id, total_chunks)
+    if missing:
+        uploads.set_status(upload_id, "uploading", from_status="finalizing")
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "upload incomplete", "missing_offsets": [i * upload.chunk_size for i in missing[:1000]]},
+        )
+
+    try:
+        scheduler.submit(
+            run_upload_finalize, [upload_id],
+            kind="upload", project=upload.project_name, priority_class=upload.priority, task_id=str(uuid4()),
+        )
+    except Exception as e:
+        # 제출 실패 -> 다시 uploading 으로 (client가 finalize 재시도 가능)
+        uploads.set_status(upload_id, "uploading", from_status="finalizing")
+        raise HTTPException(status_code=503, detail=f"task queue unavailable: {e}")
+
+    return {"upload_id": upload_id, "status": "finalizing", "scan_id": None}
+
+
 @app.post("/scan/semgrep-smoke")
 def semgrep_smoke():
     target_dir = "/home/sonotri/FuzzLab/workspace/testscan/src"
@@ -89,6 +375,7 @@ def semgrep_smoke():
 @app.post("/scan/semgrep")
 def start_semgrep_scan():
     scan_id = str(uuid4())
+    task_id = str(uuid4())
     repo_root = "/home/sonotri/FuzzLab/workspace/testscan/src"
 
     db = SessionLocal()
@@ -97,18 +384,170 @@ def start_semgrep_scan():
             scan_id=scan_id,
             status="queued",
             workspace_path=repo_root,  # 여기서만 설정하도록
+            task_id=task_id,
         ))
         db.commit()
     finally:
         db.close()
 
     # scan_id만 전달하도록
-    run_semgrep_and_store.delay(scan_id)
+    scheduler.submit(
+        run_semgrep_and_store, [scan_id],
+        kind="scan", project=None, priority_class="interactive", task_id=task_id,
+    )
     return {"scan_id": scan_id, "status": "queued"}
 
 
+@app.get("/ollama/backends")
+def get_ollama_backends():
+    # backend별 동시 처리 / 제외 여부 / 로드된 모델 / 지연 통계
+    return {"backends": ollama_pool.backend_stats()}
+
+
+@app.get("/llm/tiers/stats")
+def get_llm_tier_stats(scan_id: str | None = None):
+    # tier / model 별 처리량, 지연, 토큰(비용), escalation 비율
+    db = SessionLocal()
+    try:
+        q = db.query(
+            LLMAnswer.tier,
+            LLMAnswer.model,
+            func.count(LLMAnswer.id),
+            func.count(LLMAnswer.id).filter(LLMAnswer.status == "done"),
+            func.count(LLMAnswer.id).filter(LLMAnswer.status == "failed_parse"),
+            func.count(LLMAnswer.id).filter(LLMAnswer.escalated.is_(True)),
+            func.avg(LLMAnswer.latency_ms),
+            func.percentile_cont(0.95).within_group(LLMAnswer.latency_ms),
+            func.sum(LLMAnswer.prompt_tokens),
+            func.sum(LLMAnswer.completion_tokens),
+        ).filter(LLMAnswer.latency_ms.isnot(None))
+        if scan_id:
+            q = q.filter(LLMAnswer.scan_id == scan_id)
+        rows = q.group_by(LLMAnswer.tier, LLMAnswer.model).all()
+
+        return {
+            "scan_id": scan_id,
+            "tiers": [
+                {
+                    "tier": tier,
+                    "model": model,
+                    "answers": total,
+                    "done": done,
+                    "failed_parse": failed_parse,
+                    "escalated": escalated,
+                    "avg_latency_ms": round(float(avg_ms), 1) if avg_ms is not None else None,
+                    "p95_latency_ms": round(float(p95_ms), 1) if p95_ms is not None else None,
+                    "prompt_tokens": int(prompt_tokens or 0),
+                    "completion_tokens": int(completion_tokens or 0),
+                }
+                for (tier, model, total, done, failed_parse, escalated,
+                     avg_ms, p95_ms, prompt_tokens, completion_tokens) in rows
+            ],
+        }
+    finally:
+        db.close()
+
+
+@app.get("/scan/{scan_id}")
+def get_scan_status(scan_id: str):
+    db = SessionLocal()
+    try:
+        scan = db.get(Scan, scan_id)
+        if not scan:
+            raise HTTPException(status_code=404, detail="scan not found")
+
+        return {
+            "scan_id": scan.scan_id,
+            "status": scan.status,
+            "project_name": scan.project_name,
+            "priority": scan.priority,
+            "progress": {
+                "shards_total": scan.shards_total,
+                "shards_done": scan.shards_done,
+                "findings_ingested": scan.findings_ingested,
+            },
+            "error_message": scan.error_message,
+            "created_at": scan.created_at,
+            "updated_at": scan.updated_at,
+            # 대기 중일 때만 큐 위치 / 예상 대기시간
+            "queue": scheduler.queue_info(scan.task_id) if scan.status == "queued" else None,
+        }
+    finally:
+        db.close()
+
+
+@app.post("/scan/{scan_id}/cancel")
+def cancel_scan(scan_id: str):
+    db = SessionLocal()
+    try:
+        scan = db.get(Scan, scan_id)
+        if not scan:
+            raise HTTPException(status_code=404, detail="scan not found")
+
+        # 조건부 전이 (queued/running 일 때만) -> worker가 동시에 done으로 바꿔도 덮어쓰지 않음
+        # 실행 중인 worker는 heartbeat 실패 / status를 보고 semgrep 프로세스 그룹을 kill 함
+        scan_cancelled = scan_state.transition_scan(
+            scan_id,
+            "cancelled",
+            from_statuses=["queued", "running"],
+            error_message="cancelled by user",
+        )
+
+        # 대기/실행 중인 LLM 작업도 같이 정리
+        pending = (
+            db.query(LLMAnswer)
+            .filter(
+                LLMAnswer.scan_id == scan_id,
+                LLMAnswer.status.in_(["queued", "running"]),
+            )
+            .all()
+        )
+        llm_task_ids = []
+        for row in pending:
+            if scan_state.transition_answer(
+                scan_id, row.group_id, "cancelled", from_statuses=["queued", "running"],
+            ) and row.task_id:
+                llm_task_ids.append(row.task_id)
+
+        if not scan_cancelled and not llm_task_ids:
+            raise HTTPException(status_code=409, detail=f"nothing to cancel: status={scan.status}")
+
+        db.refresh(scan)
+        scan_task_id = scan.task_id
+        status = scan.status
+    finally:
+        db.close()
+
+    # 큐에 남아있는 semgrep task는 실행되지 않도록 revoke
+    # (실행 중인 task는 terminate 하지 않음 -> worker가 직접 semgrep 그룹을 정리)
+    if scan_cancelled and scan_task_id:
+        celery_app.control.revoke(scan_task_id)
+        scheduler.forget(scan_task_id)
+
+    # LLM task도 revoke만 (terminate X): acks_late + reject_on_worker_lost 라서 SIGKILL로 pool 프로세스를 죽이면
+    # 메시지가 다시 전달될 수 있음. 실행 중인 task는 heartbeat 실패를 보고 다음 Ollama 호출 전에 멈추고,
+    # 진행 중이던 호출 결과는 attempt 조건부 UPDATE에서 버려짐
+    for task_id in llm_task_ids:
+        celery_app.control.revoke(task_id)
+        scheduler.forget(task_id)
+
+    response_cache.invalidate_scan(scan_id)
+
+    return {
+        "scan_id": scan_id,
+        "status": status,
+        "cancelled_llm_answers": len(llm_task_ids),
+    }
+
+
 @app.get("/scan/{scan_id}/report")
-def get_report(scan_id: str):
+def get_report(scan_id: str, request: Request):
+    # 완료된 scan은 결과가 바뀌지 않으므로 캐시 먼저 확인 (hit이면 DB 안 탐)
+    cache_key = response_cache.make_key(scan_id, "report", dict(request.query_params))
+    entry = response_cache.get(cache_key)
+    if entry:
+        return response_cache.to_response(entry, request)
+
     db = SessionLocal()
     try:
         scan = db.get(Scan, scan_id)
@@ -124,12 +563,18 @@ def get_report(scan_id: str):
 
         grouped = group_findings(findings)
 
-        return {
+        payload = {
             "scan": {
                 "scan_id": scan.scan_id,
                 "status": scan.status,
                 "workspace_path": scan.workspace_path,
                 "error_message": scan.error_message,
+                # running 중에는 지금까지 저장된 findings만 포함됨
+                "progress": {
+                    "shards_total": scan.shards_total,
+                    "shards_done": scan.shards_done,
+                    "findings_ingested": scan.findings_ingested,
+                },
                 "created_at": scan.created_at,
                 "updated_at": scan.updated_at,
             },
@@ -149,10 +594,123 @@ def get_report(scan_id: str):
                 for f in findings
             ],
         }
+
+        if scan.status == "done":
+            entry = response_cache.put(scan_id, cache_key, payload)
+            return response_cache.to_response(entry, request)
+        return responses.json_response(payload, request)
+    finally:
+        db.close()
+
+
+@app.get("/scan/{scan_id}/export/{fmt}")
+def export_scan(scan_id: str, fmt: str, request: Request):
+    """
+    SARIF 2.1.0 / CSV 다운로드 (findings + group별 LLM triage)
+    - 완료된 scan: worker가 만들어둔 gzip 파일을 그대로 전송 (없으면 만들도록 요청하고 이번엔 바로 생성)
+    - 그 외: DB cursor로 읽으면서 바로 stream (메모리 일정)
+    """
+    if fmt not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(exports.FORMATS)}")
+
+    db = SessionLocal()
+    try:
+        scan = db.get(Scan, scan_id)
+        if not scan:
+            raise HTTPException(status_code=404, detail="scan not found")
+        status = scan.status
+        project_name = scan.project_name
+    finally:
+        db.close()
+
+    media_type = exports.FORMATS[fmt]["media_type"]
+    headers = {
+        "Content-Disposition": f'attachment; filename="fuzzlab-{scan_id}.{exports.FORMATS[fmt]["ext"]}"',
+        "Vary": "Accept-Encoding",
+    }
+
+    if status == "done":
+        f = exports.open_artifact(scan_id, fmt)
+        if f is not None:
+            if responses.accepts_encoding(request, "gzip"):
+                headers["Content-Encoding"] = "gzip"
+                headers["Content-Length"] = str(os.fstat(f.fileno()).st_size)
+                return StreamingResponse(exports.iter_file(f), media_type=media_type, headers=headers)
+            return StreamingResponse(exports.iter_file(f, decompress=True), media_type=media_type, headers=headers)
+        try:
+            request_export_render(scan_id, project_name)
+        except Exception:
+            # 렌더링 요청 실패는 다운로드에 영향 없음
+            pass
+
+    return StreamingResponse(exports.iter_export(scan_id, fmt), media_type=media_type, headers=headers)
+
+
+
+# ---------------------------------------------------------------------------
+# on-demand 프로파일 (profiling.py) 목록 / 다운로드
+
+@app.get("/scan/{scan_id}/profiles")
+def list_scan_profiles(scan_id: str):
+    db = SessionLocal()
+    try:
+        if not db.get(Scan, scan_id):
+            raise HTTPException(status_code=404, detail="scan not found")
+        rows = (
+            db.query(ProfileArtifact)
+            .filter(ProfileArtifact.scan_id == scan_id)
+            .order_by(ProfileArtifact.created_at.desc())
+            .all()
+        )
+        return {"scan_id": scan_id, "profiles": [profiling.to_dict(r) for r in rows]}
     finally:
         db.close()
 
 
+@app.get("/profiles")
+def list_profiles(kind: str | None = None, limit: int = 50):
+    # scan에 붙지 않은 요청 프로파일 포함, 최근 것부터
+    limit = max(1, min(limit, 500))
+    db = SessionLocal()
+    try:
+        q = db.query(ProfileArtifact)
+        if kind:
+            q = q.filter(ProfileArtifact.kind == kind)
+        rows = q.order_by(ProfileArtifact.created_at.desc()).limit(limit).all()
+        return {"profiles": [profiling.to_dict(r) for r in rows]}
+    finally:
+        db.close()
+
+
+@app.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, request: Request):
+    """
+    sampling: folded stacks (flamegraph.pl / speedscope / inferno 에 그대로)
+    cprofile: pstats 파일 (python -m pstats, snakeviz)
+    """
+    db = SessionLocal()
+    try:
+        row = db.get(ProfileArtifact, profile_id)
+        if not row:
+            raise HTTPException(status_code=404, detail="profile not found")
+        f = profiling.open_artifact(row)
+        if f is None:
+            raise HTTPException(status_code=404, detail="profile file not found")
+        spec = profiling.FORMATS[row.mode]
+    finally:
+        db.close()
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="fuzzlab-profile-{profile_id}.{spec["ext"]}"',
+        "Vary": "Accept-Encoding",
+    }
+    if responses.accepts_encoding(request, "gzip"):
+        headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(os.fstat(f.fileno()).st_size)
+        return StreamingResponse(exports.iter_file(f), media_type=spec["media_type"], headers=headers)
+    return StreamingResponse(exports.iter_file(f, decompress=True), media_type=spec["media_type"], headers=headers)
+
+
 #zpi-slip 방지용
 def safe_extract_zip(zipf: zipfile.ZipFile, dest: Path):
     dest = dest.resolve()
@@ -221,8 +779,15 @@ def group_findings(findings: list[Finding]) -> list[dict]:
     grouped.sort(key=lambda x: x["score"], reverse=True)
     return grouped
 
-@app.get("/scan/{scan_id}/groups/{group_id}/llm-input")
-def get_llm_input(scan_id: str, group_id: str):
+@app.get("/scan/{scan_id}/groups/{group_id:path}/llm-input")
+def get_llm_input(scan_id: str, group_id: str, request: Request):
+    cache_key = response_cache.make_key(
+        scan_id, f"llm-input:{group_id}", dict(request.query_params)
+    )
+    entry = response_cache.get(cache_key)
+    if entry:
+        return response_cache.to_response(entry, request)
+
     db = SessionLocal()
     try:
         scan = db.get(Scan, scan_id)
@@ -242,7 +807,7 @@ def get_llm_input(scan_id: str, group_id: str):
             raise HTTPException(status_code=404, detail="group not found")
 
         # LLM용으로 필요한 필드만 깔끔하게 정리
-        return {
+        payload = {
             "scan": {
                 "scan_id": scan.scan_id,
                 "workspace_path": scan.workspace_path,  # (참고) 코드 위치
@@ -269,12 +834,31 @@ def get_llm_input(scan_id: str, group_id: str):
                 ],
             },
         }
+
+        if scan.status == "done":
+            entry = response_cache.put(scan_id, cache_key, payload)
+            return response_cache.to_response(entry, request)
+        return responses.json_response(payload, request)
     finally:
         db.close()
 
 
-@app.post("/scan/{scan_id}/groups/{group_id}/llm-answer")
-def request_llm_answer(scan_id: str, group_id: str, model: str = "llama3.1:8b"):
+@app.post("/scan/{scan_id}/groups/{group_id:path}/llm-answer")
+def request_llm_answer(
+    scan_id: str,
+    group_id: str,
+    model: str | None = None,   # 지정 안 하면 model_router가 위험도 기준으로 선택
+    priority: str = "interactive",
+    task_profile: str | None = None,   # sampling / cprofile -> worker 작업 프로파일링
+    reuse: bool = False,               # true: 같은 입력의 기존 답(다른 scan 포함)이 있으면 LLM 호출 없이 재사용
+):
+    if priority not in scheduler.PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"unknown priority: {priority}")
+    _validate_task_profile(task_profile)
+
+    task_id = str(uuid4())
+    # 자동 라우팅은 완료될 때까지 "auto" 로 둠 (reaper가 다시 큐에 넣을 때 지정 여부 판단)
+    requested_model = model or "auto"
     db = SessionLocal()
     try:
         # scan 존재 확인
@@ -285,42 +869,96 @@ def request_llm_answer(scan_id: str, group_id: str, model: str = "llama3.1:8b"):
         # semgrep 끝나기 전이면 막기(레이스 방지)
         if scan.status != "done":
             raise HTTPException(status_code=409, detail=f"scan not ready: status={scan.status}")
+        project_name = scan.project_name
 
-        # placeholder upsert
-        row = (
-            db.query(LLMAnswer)
-            .filter(LLMAnswer.scan_id == scan_id, LLMAnswer.group_id == group_id)
-            .first()
-        )
-        if not row:
-            row = LLMAnswer(
+        # 처음 요청이면 queued placeholder 생성
+        created = db.execute(
+            pg_insert(LLMAnswer)
+            .values(
                 scan_id=scan_id,
                 group_id=group_id,
-                model=model,
+                model=requested_model,
                 prompt="",
                 status="queued",
+                task_id=task_id,
+                heartbeat_at=datetime.now(timezone.utc),
+                reuse=reuse,
+                task_profile=task_profile,
             )
-            db.add(row)
-        else:
-            row.model = model
-            row.status = "queued"
-
+            .on_conflict_do_nothing(index_elements=["scan_id", "group_id"])
+            .returning(LLMAnswer.id)
+        ).first()
         db.commit()
+        row = None
+        if not created:
+            row = (
+                db.query(LLMAnswer)
+                .filter(LLMAnswer.scan_id == scan_id, LLMAnswer.group_id == group_id)
+                .first()
+            )
     finally:
         db.close()
 
-    async_result = generate_llm_answer_for_group.delay(scan_id, group_id, model)
+    if row is not None:
+        if row.status == "queued":
+            # 이미 대기 중인 작업이 같은 요청이면 그대로 (다른 모델이면 먼저 끝나길 기다려야 함)
+            if row.model != requested_model:
+                raise HTTPException(status_code=409, detail=f"llm answer already queued with model={row.model}")
+            return {
+                "task_id": row.task_id,
+                "status": "queued",
+                "scan_id": scan_id,
+                "group_id": group_id,
+                "model": row.model,
+                "queue": scheduler.queue_info(row.task_id),
+            }
+        # 이전 상태 -> queued 조건부 전이 (그 사이 다른 요청 / worker가 바꿨으면 실패)
+        # 실행 중이던 이전 요청은 status / attempt 조건 때문에 결과를 저장하지 못함 (최신 요청 우선)
+        if not scan_state.transition_answer(
+            scan_id,
+            group_id,
+            "queued",
+            attempt=row.attempt,
+            from_statuses=[row.status],
+            model=requested_model,
+            task_id=task_id,
+            heartbeat_at=datetime.now(timezone.utc),
+            reuse=reuse,
+            task_profile=task_profile,
+        ):
+            raise HTTPException(status_code=409, detail="llm answer changed concurrently, retry")
+        if row.task_id:
+            scheduler.forget(row.task_id)
+
+    response_cache.invalidate_scan(scan_id)
+
+    try:
+        scheduler.submit(
+            generate_llm_answer_for_group, [scan_id, group_id, model, task_profile, reuse],
+            kind="llm", project=project_name, priority_class=priority, task_id=task_id,
+        )
+    except Exception as e:
+        # 이 요청이 queued로 바꾼 row만 (task_id 조건) failed_call 로 닫음
+        scan_state.transition_answer(
+            scan_id, group_id, "failed_call", from_statuses=["queued"],
+            conditions=[LLMAnswer.task_id == task_id], response_text=f"task submit failed: {e}",
+        )
+        raise HTTPException(
+            status_code=503,
+            detail={"task_id": task_id, "status": "failed_call", "error": f"task queue unavailable: {e}"},
+        )
 
     return {
-        "task_id": async_result.id,
+        "task_id": task_id,
         "status": "queued",
         "scan_id": scan_id,
         "group_id": group_id,
-        "model": model,
+        "model": requested_model,
+        "queue": scheduler.queue_info(task_id),
     }
 
 
-@app.get("/scan/{scan_id}/groups/{group_id}/llm-answer")
+@app.get("/scan/{scan_id}/groups/{group_id:path}/llm-answer")
 def get_llm_answer(scan_id: str, group_id: str):
     db = SessionLocal()
     try:
@@ -338,10 +976,43 @@ def get_llm_answer(scan_id: str, group_id: str):
             "scan_id": row.scan_id,
             "group_id": row.group_id,
             "model": row.model,
+            "tier": row.tier,
+            "escalated": row.escalated,
             "status": row.status,
+            "prompt_version": row.prompt_version,
+            "input_hash": row.input_hash,
+            "reused_from_id": row.reused_from_id,
             "response_json": row.response_json,
             "response_text": row.response_text,
             "created_at": row.created_at,
+            "queue": scheduler.queue_info(row.task_id) if row.status == "queued" else None,
+        }
+    finally:
+        db.close()
+
+
+@app.get("/scan/{scan_id}/groups/{group_id:path}/llm-answer/prompt")
+def get_llm_answer_prompt(scan_id: str, group_id: str):
+    # 감사용: 실제로 보낸 프롬프트 전문을 템플릿 버전 + 입력 blob으로 다시 만든다
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(LLMAnswer)
+            .filter(LLMAnswer.scan_id == scan_id, LLMAnswer.group_id == group_id)
+            .first()
+        )
+        if not row:
+            raise HTTPException(status_code=404, detail="llm answer not found")
+        prompt = llm_inputs.reconstruct_prompt(db, row)
+        if prompt is None:
+            raise HTTPException(status_code=404, detail="prompt not available")
+        return {
+            "scan_id": scan_id,
+            "group_id": group_id,
+            "model": row.model,
+            "prompt_version": row.prompt_version,
+            "input_hash": row.input_hash,
+            "prompt": prompt,
         }
     finally:
         db.close()
@@ -351,7 +1022,7 @@ class ManualLLMAnswerRequest(BaseModel):
     response_json: dict
 
 
-@app.post("/scan/{scan_id}/groups/{group_id}/llm-answer/manual")
+@app.post("/scan/{scan_id}/groups/{group_id:path}/llm-answer/manual")
 def save_manual_llm_answer(scan_id: str, group_id: str, req: ManualLLMAnswerRequest):
     db = SessionLocal()
     try:
@@ -380,14 +1051,116 @@ def save_manual_llm_answer(scan_id: str, group_id: str, req: ManualLLMAnswerRequ
         else:
             row.model = req.model
             row.prompt = "(manual from open-webui)"
+            row.prompt_version = None
+            row.input_hash = None
+            row.reused_from_id = None
+            row.tier = None
+            row.escalated = False
             row.status = "done"
             row.response_json = req.response_json
             row.response_text = None
 
         db.commit()
+        response_cache.invalidate_scan(scan_id)
 
         return {"scan_id": scan_id, "group_id": group_id, "status": "done", "source": "manual"}
     finally:
         db.close()
 
 
+# ---------------------------------------------------------------------------
+# cross-scan 통계 (rollup 테이블만 조회, findings 원본은 읽지 않음)
+
+def _check_bucket(bucket: str):
+    if bucket not in analytics.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {list(analytics.BUCKETS)}")
+
+
+@app.get("/analytics/trends")
+def analytics_trends(
+    project: str | None = None,
+    bucket: str = "week",
+    by: str = "severity",          # severity / rule / path_prefix
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = 20,
+):
+    _check_bucket(bucket)
+    if by not in analytics.DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"by must be one of {list(analytics.DIMENSIONS)}")
+    since, until = analytics.default_window(since, until)
+    return {
+        "project": project,
+        "bucket": bucket,
+        "by": by,
+        "since": since,
+        "until": until,
+        "series": analytics.trends(bucket, by, since, until, project=project, limit=max(1, min(limit, 200))),
+    }
+
+
+@app.get("/analytics/activity")
+def analytics_activity(
+    project: str | None = None,
+    bucket: str = "week",
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    # bucket별 scan 수 / 새 finding / 수정된 finding / 평균 수정 시간
+    _check_bucket(bucket)
+    since, until = analytics.default_window(since, until)
+    return {
+        "project": project,
+        "bucket": bucket,
+        "since": since,
+        "until": until,
+        "series": analytics.activity(bucket, since, until, project=project),
+    }
+
+
+@app.get("/analytics/noisy-rules")
+def analytics_noisy_rules(
+    project: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = 20,
+):
+    since, until = analytics.default_window(since, until)
+    return {
+        "project": project,
+        "since": since,
+        "until": until,
+        "rules": analytics.noisy_rules(since, until, project=project, limit=max(1, min(limit, 200))),
+    }
+
+
+# ---------------------------------------------------------------------------
+# OpenAI 호환 API (Open WebUI 연결용)
+# Open WebUI -> Settings -> Connections -> OpenAI API: http://<fuzzlab>:8000/v1
+
+class ChatCompletionRequest(BaseModel):
+    model: str
+    messages: list[dict]
+    stream: bool = False
+    temperature: float | None = None
+
+
+@app.get("/v1/models")
+def openai_list_models():
+    return {"object": "list", "data": openai_compat.list_models()}
+
+
+@app.post("/v1/chat/completions")
+def openai_chat_completions(req: ChatCompletionRequest):
+    # 마지막 메시지에 scan/group 참조가 있으면 FuzzLab triage (저장된 답 우선), 아니면 Ollama 프록시
+    ref = openai_compat.find_reference(req.messages)
+    if ref:
+        result = openai_compat.triage(
+            ref["scan_id"], ref["group_id"], req.model, req.stream, fresh=ref["fresh"], reuse=ref["reuse"],
+        )
+    else:
+        result = openai_compat.proxy_chat(req.model, req.messages, req.temperature, req.stream)
+
+    if req.stream:
+        return StreamingResponse(result, media_type="text/event-stream")
+    return result
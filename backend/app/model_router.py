@@ -0,0 +1,80 @@
+import os
+import re
+
+# 위험도에 따라 모델 tier 선택
+# - small: INFO/스타일 수준 그룹 -> 빠르고 싼 모델
+# - large: HIGH/CRITICAL 이나 injection 류 규칙 -> 큰 모델
+LLM_MODEL_SMALL = os.getenv("LLM_MODEL_SMALL", "llama3.2:3b")
+LLM_MODEL_LARGE = os.getenv("LLM_MODEL_LARGE", "llama3.1:8b")
+
+TIERS = {
+    "small": LLM_MODEL_SMALL,
+    "large": LLM_MODEL_LARGE,
+}
+# small 답변이 스키마 파싱에 실패하면 올라갈 다음 tier
+ESCALATION = {"small": "large"}
+
+# final_severity(0~4, SEVERITY_MAP 기준) / score 기준
+LLM_LARGE_MIN_SEVERITY = int(os.getenv("LLM_LARGE_MIN_SEVERITY", "3"))
+LLM_LARGE_MIN_SCORE = float(os.getenv("LLM_LARGE_MIN_SCORE", "4.0"))
+
+# rule id에 이런 단어가 있으면 severity와 무관하게 large
+# rule id를 . / - _ 로 나눈 단어 단위로 비교 (부분 문자열 X: "mysql", "execute", "evaluate" 는 해당 없음)
+LLM_LARGE_RULE_KEYWORDS = [
+    k.strip().lower()
+    for k in os.getenv(
+        "LLM_LARGE_RULE_KEYWORDS",
+        "injection,sqli,sql,command,exec,rce,deserialization,pickle,ssrf,xxe,path-traversal,eval",
+    ).split(",")
+    if k.strip()
+]
+_KEYWORD_RES = [
+    re.compile(rf"(?:^|[./_-]){re.escape(k)}(?:$|[./_-])") for k in LLM_LARGE_RULE_KEYWORDS
+]
+
+
+def matches_large_keyword(rule_id: str) -> bool:
+    rule_id = (rule_id or "").lower()
+    return any(r.search(rule_id) for r in _KEYWORD_RES)
+
+
+def route(group: dict) -> dict:
+    """
+    group: group_findings() 결과 한 개 (final_severity, score, rules 사용)
+    반환: {"tier": ..., "model": ..., "reason": ...}
+    """
+    severity = group.get("final_severity") or 0
+    score = group.get("score") or 0
+
+    if severity >= LLM_LARGE_MIN_SEVERITY:
+        return {"tier": "large", "model": TIERS["large"], "reason": f"severity={severity}"}
+    if score >= LLM_LARGE_MIN_SCORE:
+        return {"tier": "large", "model": TIERS["large"], "reason": f"score={score}"}
+
+    for rule in group.get("rules") or []:
+        if matches_large_keyword(rule.get("rule_id")):
+            return {"tier": "large", "model": TIERS["large"], "reason": f"rule={rule.get('rule_id')}"}
+
+    return {"tier": "small", "model": TIERS["small"], "reason": "low risk"}
+
+
+def escalate(tier: str | None) -> dict | None:
+    next_tier = ESCALATION.get(tier or "")
+    if not next_tier:
+        return None
+    return {"tier": next_tier, "model": TIERS[next_tier], "reason": f"escalated from {tier}"}
+
+
+def retry_route(route: dict, valid: bool, auto: bool) -> dict | None:
+    # 답이 스키마에 안 맞고 자동 라우팅(model 미지정)이면 다음 tier로 한 번 더 (celery task / Open WebUI 공통)
+    if valid or not auto:
+        return None
+    return escalate(route.get("tier"))
+
+
+def tier_of(model: str) -> str | None:
+    # 사용자가 model을 직접 지정한 경우 통계용으로 tier 추정
+    for tier, m in TIERS.items():
+        if m == model:
+            return tier
+    return None
@@ -11,6 +11,10 @@ from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy import Integer
 from sqlalchemy import UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Boolean
+from sqlalchemy import BigInteger
+from sqlalchemy import Index, Float
+from sqlalchemy import LargeBinary
 
 
 class Scan(Base):
@@ -20,6 +24,27 @@ class Scan(Base):
     status: Mapped[str] = mapped_column(String(32), nullable=False, default="queued")
     workspace_path: Mapped[str | None] = mapped_column(Text, nullable=True)
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # queued / running / done / failed / cancelled / timed_out
+
+    # fair-share 스케줄링 단위 / 우선순위 클래스(interactive, batch)
+    project_name: Mapped[str | None] = mapped_column(String(128), nullable=True, index=True)
+    priority: Mapped[str] = mapped_column(String(16), nullable=False, default="interactive")
+
+    # 실행 시도 번호 / running 중 주기적으로 갱신 (scan_state 참고)
+    attempt: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    # 파이프라인 ingest 진행 상황 (running 중에도 갱신됨)
+    shards_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    shards_done: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    findings_ingested: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # cancel 시 revoke 하기 위한 celery task id
+    task_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    # scan별 semgrep 옵션 (--timeout 초 / --max-memory MB), None이면 기본값
+    semgrep_timeout: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    semgrep_max_memory: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
@@ -47,6 +72,8 @@ class Finding(Base):
 
     raw_json: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
     normalized_json: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    # scan 간 동일 finding 식별 (normalize_semgrep.finding_fingerprint)
+    fingerprint: Mapped[str | None] = mapped_column(String(40), nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
@@ -64,15 +91,175 @@ class LLMAnswer(Base):
     group_id: Mapped[str] = mapped_column(Text, nullable=False, index=True)
 
     model: Mapped[str] = mapped_column(String(128), nullable=False)   # ex) "llama3.1:8b"
+    # model_router tier (small / large), 직접 지정/수동 입력이면 None일 수 있음
+    tier: Mapped[str | None] = mapped_column(String(16), nullable=True, index=True)
+    escalated: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # 이전 row / 수동 입력만 전문 저장, 자동 생성분은 "" (prompt_version + input_hash로 재구성)
     prompt: Mapped[str] = mapped_column(Text, nullable=False)
+    prompt_version: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    input_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    # 같은 입력(input_hash + model + prompt_version)의 기존 답을 재사용한 경우 원본 id
+    reused_from_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     # 파싱 성공 시 JSON 저장 / 실패 시 원문 저장
     response_json: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
     response_text: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     status: Mapped[str] = mapped_column(String(32), nullable=False, default="done")
-    # done / failed_parse / failed_call
+    # done / failed_parse / failed_call / timed_out / cancelled
+
+    # tier별 비용/지연 집계용
+    latency_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    prompt_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    completion_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    task_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    attempt: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # 요청 옵션 (reaper가 다시 큐에 넣을 때 그대로 사용)
+    reuse: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    task_profile: Mapped[str | None] = mapped_column(String(16), nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
     )
+
+
+# LLM 입력(group + contract)의 content-addressed 저장소 (압축, 해시가 같으면 한 번만 저장)
+class LLMInput(Base):
+    __tablename__ = "llm_inputs"
+
+    input_hash: Mapped[str] = mapped_column(String(64), primary_key=True)   # canonical JSON의 sha256
+    encoding: Mapped[str] = mapped_column(String(16), nullable=False)       # zstd / gzip
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    size_bytes: Mapped[int] = mapped_column(Integer, nullable=False)        # 압축 전 크기
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+
+
+# 대용량 zip 분할 업로드 (init -> PUT chunk -> finalize 시 Scan 생성)
+class Upload(Base):
+    __tablename__ = "uploads"
+
+    upload_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # finalize 때 만들 scan_id (chunk는 workspace/<scan_id>/upload.zip 에 바로 기록)
+    scan_id: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    status: Mapped[str] = mapped_column(String(32), nullable=False, default="uploading")
+    # uploading / finalizing / finalized / failed / expired
+
+    total_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    chunk_size: Mapped[int] = mapped_column(Integer, nullable=False)
+    # 전체 파일 sha256 (선택, finalize 때 확인)
+    sha256: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    # finalize 때 Scan에 그대로 넘길 옵션
+    project_name: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    priority: Mapped[str] = mapped_column(String(16), nullable=False, default="interactive")
+    semgrep_timeout: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    semgrep_max_memory: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+    # chunk를 받을 때마다 연장, 지나면 expire_uploads 가 정리
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    # 마지막 상태 변경 시각 (finalizing에서 오래 멈춘 upload를 expire_uploads 가 정리)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+
+
+# 분할 업로드에서 체크섬 확인 + 최종 파일 기록까지 끝난 chunk (upload 당 chunk 수만큼)
+class UploadChunk(Base):
+    __tablename__ = "upload_chunks"
+
+    upload_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    chunk_index: Mapped[int] = mapped_column(Integer, primary_key=True)
+    received_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+
+
+# ---------------------------------------------------------------------------
+# analytics rollup (scan ingest가 끝날 때 analytics.record_scan 이 갱신)
+# dashboard 쿼리는 findings 대신 이 테이블들만 읽는다
+
+# scan 1개당 1 row
+class ScanRollup(Base):
+    __tablename__ = "scan_rollups"
+    __table_args__ = (
+        Index("ix_scan_rollups_project_finished", "project_name", "finished_at"),
+    )
+
+    scan_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # project 없는 scan은 "(none)"
+    project_name: Mapped[str] = mapped_column(String(128), nullable=False)
+    finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+    findings_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # 이전 scan 대비 새로 나타난 / 사라진(수정된) finding 수
+    new_findings: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    fixed_findings: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # 이번 scan에서 수정 처리된 finding들의 (수정 시각 - 최초 발견) 합계(초) -> 평균 수정 시간 계산용
+    fix_seconds_total: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+
+
+# scan x rule x severity x 경로 prefix 별 finding 수
+class FindingRollup(Base):
+    __tablename__ = "finding_rollups"
+
+    scan_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    rule_id: Mapped[str] = mapped_column(String(256), primary_key=True)
+    severity: Mapped[str] = mapped_column(String(32), primary_key=True)
+    path_prefix: Mapped[str] = mapped_column(String(512), primary_key=True)
+    findings: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+# project별 finding(fingerprint)의 최초 발견 / 마지막 발견 / 수정 시각
+class FindingLifecycle(Base):
+    __tablename__ = "finding_lifecycle"
+    __table_args__ = (
+        # scan 종료 시 "아직 열린(fixed_at IS NULL) finding" 조회용
+        Index("ix_finding_lifecycle_project_fixed", "project_name", "fixed_at"),
+        # scan rollup 재계산 때 "이 scan에서 수정된 finding" 조회용
+        Index("ix_finding_lifecycle_fixed_scan", "fixed_scan_id"),
+    )
+
+    project_name: Mapped[str] = mapped_column(String(128), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(40), primary_key=True)
+    rule_id: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    severity: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    path: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    first_seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    first_scan_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    last_scan_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    # 최신 scan에서 사라진 시각 (다시 나타나면 NULL로 되돌리고 first_seen 재설정)
+    fixed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # 수정 처리한 scan (record_scan을 다시 실행해도 수정 수 / 시간을 같은 값으로 다시 계산)
+    fixed_scan_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+
+# on-demand 프로파일 결과 (API 요청 / celery 작업), 파일은 workspace/<scan_id>/profiles/
+class ProfileArtifact(Base):
+    __tablename__ = "profile_artifacts"
+
+    profile_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    scan_id: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)      # request / task
+    target: Mapped[str] = mapped_column(String(256), nullable=False)   # "GET /scan/{scan_id}/report" / 작업 이름
+    mode: Mapped[str] = mapped_column(String(16), nullable=False)      # sampling / cprofile
+    format: Mapped[str] = mapped_column(String(16), nullable=False)    # folded / pstats
+    path: Mapped[str] = mapped_column(Text, nullable=False)
+    size_bytes: Mapped[int] = mapped_column(Integer, nullable=False)   # 압축 전 크기
+    samples: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    duration_ms: Mapped[int] = mapped_column(Integer, nullable=False)
+    # PROFILE_MAX_SEC를 넘어서 sampling이 중간에 멈춤
+    truncated: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc), index=True
+    )
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import hashlib
 from pathlib import Path
 
 def safe_join_repo(repo_root: Path, rel_path: str) -> Path:
@@ -64,6 +65,20 @@ def context_lines_to_snippet(context_lines: list[dict]) -> str:
     return "\n".join([f'{x["line"]}: {x["text"]}' for x in context_lines])
 
 
+def finding_fingerprint(rule_id: str | None, path: str | None, result: dict) -> str:
+    """
+    scan 간 같은 finding 식별용 (analytics의 최초 발견 / 수정 시각 추적)
+    줄 번호는 위쪽 코드 수정만으로도 바뀌므로 빼고, 매칭된 코드 내용(공백 정리)을 사용
+    """
+    lines = ((result.get("extra") or {}).get("lines") or "").strip()
+    if not lines or lines == "requires login":
+        # 코드 내용이 없으면 위치로 대신
+        lines = str((result.get("start") or {}).get("line"))
+    code = " ".join(lines.split())
+    raw = "\x1f".join([rule_id or "", path or "", code])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
 def normalize_semgrep_result(result: dict, repo_root: Path) -> dict:
     raw_path = result.get("path")
     start = (result.get("start") or {}).get("line")
@@ -119,7 +134,8 @@ def normalize_semgrep_result(result: dict, repo_root: Path) -> dict:
             "id": result.get("check_id"),
             "name": extra.get("message"),
         },
-        "severity": result.get("severity"),
+        # semgrep --json 은 severity를 extra 안에 넣어줌
+        "severity": result.get("severity") or extra.get("severity"),
         "location": {
             "path": rel_path,
             "start_line": start,
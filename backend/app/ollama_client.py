@@ -2,6 +2,7 @@ import os
 import json
 import requests
 from typing import Any, Dict, Optional, Union
+from . import ollama_pool
 
 # 기본 스키마 (JSON 고정용)
 DEFAULT_SCHEMA: Dict[str, Any] = {
@@ -18,21 +19,51 @@ DEFAULT_SCHEMA: Dict[str, Any] = {
     "additionalProperties": False,
 }
 
+_JSON_TYPES = {"string": str, "object": dict, "array": list, "boolean": bool}
+
+
+def validate_answer(resp: Any, schema: Dict[str, Any] = DEFAULT_SCHEMA) -> bool:
+    """
+    LLM 답이 schema를 만족하는지 (required 키 / 타입 / enum)
+    format에 schema를 넘겨도 모델에 따라 키를 빼먹거나 enum 밖의 값을 내므로 저장 전에 확인
+    """
+    if not isinstance(resp, dict):
+        return False
+    for key in schema.get("required", []):
+        if key not in resp:
+            return False
+    for key, prop in schema.get("properties", {}).items():
+        if key not in resp:
+            continue
+        expected = _JSON_TYPES.get(prop.get("type"))
+        if expected and not isinstance(resp[key], expected):
+            return False
+        if "enum" in prop and resp[key] not in prop["enum"]:
+            return False
+    return True
+
+
+# 다른 backend로 다시 시도하는 최대 횟수 (연결 실패 / 5xx 인 경우만)
+OLLAMA_MAX_ATTEMPTS = int(os.getenv("OLLAMA_MAX_ATTEMPTS", "2"))
+
+
 # Ollama /api/generate 호출
 def call_ollama(
     model: str,
     prompt: str,
     base_url: Optional[str] = None,
     schema: Optional[Dict[str, Any]] = DEFAULT_SCHEMA,
-    timeout_sec: int = 180,
+    timeout_sec: int = int(os.getenv("OLLAMA_TIMEOUT_SEC", "180")),
+    stats: Optional[Dict[str, Any]] = None,
 ) -> Union[Dict[str, Any], str]:
     """
     반환:
       - JSON 파싱 성공: dict
       - JSON 파싱 실패: raw string (DB에 response_text로 저장)
-    """
-    base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
+    base_url을 지정하면 그 서버로 바로, 아니면 backend pool(ollama_pool)에서 골라서 호출
+    stats(dict)를 넘기면 backend / 토큰 수를 채워준다 (비용 집계용)
+    """
     payload = {
         "model": model,
         "prompt": prompt,
@@ -43,12 +74,46 @@ def call_ollama(
         "options": {"temperature": 0.1},
     }
 
-    r = requests.post(f"{base_url}/api/generate", json=payload, timeout=timeout_sec)
-    r.raise_for_status()
+    if base_url:
+        r = requests.post(f"{base_url}/api/generate", json=payload, timeout=timeout_sec)
+        r.raise_for_status()
+        body = r.json()
+        backend = base_url
+    else:
+        backend, body = _generate_via_pool(model, payload, timeout_sec)
 
-    text = r.json().get("response", "")
+    if stats is not None:
+        stats["backend"] = backend
+        stats["prompt_tokens"] = body.get("prompt_eval_count")
+        stats["completion_tokens"] = body.get("eval_count")
+
+    text = body.get("response", "")
 
     try:
         return json.loads(text)
     except Exception:
         return text
+
+
+def _generate_via_pool(model: str, payload: dict, timeout_sec: int) -> tuple[str, dict]:
+    tried = set()
+    last_error = None
+    for attempt in range(1, OLLAMA_MAX_ATTEMPTS + 1):
+        try:
+            # 실패/반환 기록과 lease 반환은 backend_lease 안에서 처리
+            with ollama_pool.backend_lease(model, timeout_sec + 30, exclude=tried) as url:
+                tried.add(url)
+                r = requests.post(f"{url}/api/generate", json=payload, timeout=timeout_sec)
+                r.raise_for_status()
+                return url, r.json()
+        except ollama_pool.NoBackendAvailable:
+            # 재시도할 다른 backend가 없으면 원래 에러로 실패
+            if last_error is not None:
+                raise last_error
+            raise
+        except requests.RequestException as e:
+            # backend 문제면 다른 backend로 한 번 더 (요청 자체 문제면 바로 실패)
+            if attempt >= OLLAMA_MAX_ATTEMPTS or not ollama_pool.is_backend_failure(e):
+                raise
+            last_error = e
+    raise last_error
@@ -0,0 +1,242 @@
+import os
+import time
+import uuid
+import requests
+from contextlib import contextmanager
+from .redis_client import get_redis
+
+# 여러 대의 ollama serve 를 묶어서 사용
+# OLLAMA_BACKENDS="http://10.0.0.11:11434|4,http://10.0.0.12:11434|2"  (|뒤는 동시 처리 상한, 생략 시 기본값)
+# 설정이 없으면 기존처럼 OLLAMA_BASE_URL 한 대만 사용
+OLLAMA_BACKENDS = os.getenv("OLLAMA_BACKENDS", "")
+OLLAMA_BACKEND_MAX_CONCURRENCY = int(os.getenv("OLLAMA_BACKEND_MAX_CONCURRENCY", "2"))
+
+# 빈 backend가 없을 때 기다리는 최대 시간
+OLLAMA_ACQUIRE_TIMEOUT_SEC = float(os.getenv("OLLAMA_ACQUIRE_TIMEOUT_SEC", "600"))
+# passive health check: 연속 실패 N번이면 일정 시간 제외
+OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "3"))
+OLLAMA_EJECT_SEC = int(os.getenv("OLLAMA_EJECT_SEC", "30"))
+# 각 backend에 어떤 모델이 올라가 있는지(/api/ps) 다시 확인하는 주기
+OLLAMA_MODELS_REFRESH_SEC = float(os.getenv("OLLAMA_MODELS_REFRESH_SEC", "15"))
+
+POOL_PREFIX = "fuzzlab:ollama"
+
+# 동시 처리 수 확인 + 점유를 원자적으로 (worker 프로세스 여러 개가 같은 backend를 보므로)
+# lease는 만료시각을 score로 저장 -> worker가 죽어도 만료되면 자동 반환
+_ACQUIRE_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local n = redis.call('ZCARD', KEYS[1])
+if n >= tonumber(ARGV[4]) then
+  return -1
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return n + 1
+"""
+
+# 프로세스 내 캐시: url -> (조회시각, 로드된 모델 set)
+_loaded_models: dict[str, tuple[float, set]] = {}
+
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+
+def get_backends() -> list[dict]:
+    raw = OLLAMA_BACKENDS.strip()
+    if not raw:
+        raw = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+    backends = []
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, limit = item.partition("|")
+        backends.append({
+            "url": url.rstrip("/"),
+            "max_concurrency": int(limit) if limit else OLLAMA_BACKEND_MAX_CONCURRENCY,
+        })
+    return backends
+
+
+def _lease_key(url: str) -> str:
+    return f"{POOL_PREFIX}:lease:{url}"
+
+
+def _fails_key(url: str) -> str:
+    return f"{POOL_PREFIX}:fails:{url}"
+
+
+def _ejected_key(url: str) -> str:
+    return f"{POOL_PREFIX}:ejected:{url}"
+
+
+def _metrics_key(url: str) -> str:
+    return f"{POOL_PREFIX}:metrics:{url}"
+
+
+def loaded_models(url: str) -> set:
+    """
+    /api/ps 로 현재 메모리에 올라간 모델 목록 (cold load 피하기용)
+    조회 실패 시 빈 set (affinity만 못 쓸 뿐 라우팅은 계속)
+    """
+    now = time.monotonic()
+    cached = _loaded_models.get(url)
+    if cached and now - cached[0] < OLLAMA_MODELS_REFRESH_SEC:
+        return cached[1]
+
+    models = set()
+    try:
+        r = requests.get(f"{url}/api/ps", timeout=1)
+        if r.ok:
+            for m in r.json().get("models") or []:
+                models.add(m.get("name") or m.get("model"))
+    except requests.RequestException:
+        pass
+    _loaded_models[url] = (now, models)
+    return models
+
+
+def _outstanding(r, url: str, now: float) -> int:
+    return r.zcount(_lease_key(url), now, "+inf")
+
+
+def _ranked(model: str) -> list[dict]:
+    """
+    라우팅 순서:
+      1) 제외(ejected)된 backend는 빼고
+      2) 모델이 이미 로드된 backend 우선 (model affinity)
+      3) 진행 중 요청이 적은 순 (least outstanding requests)
+      4) 같으면 최근 평균 지연이 짧은 순
+    """
+    r = get_redis()
+    now = time.time()
+    ranked = []
+    for b in get_backends():
+        url = b["url"]
+        if r.exists(_ejected_key(url)):
+            continue
+        ema = r.hget(_metrics_key(url), "ema_ms")
+        ranked.append({
+            **b,
+            "outstanding": _outstanding(r, url, now),
+            "has_model": model in loaded_models(url),
+            "ema_ms": float(ema) if ema else 0.0,
+        })
+    ranked.sort(key=lambda b: (not b["has_model"], b["outstanding"] / b["max_concurrency"], b["ema_ms"]))
+    return ranked
+
+
+def acquire(model: str, lease_sec: float, exclude: set | None = None) -> tuple[str, str]:
+    r = get_redis()
+    script = r.register_script(_ACQUIRE_LUA)
+    lease_id = uuid.uuid4().hex
+    deadline = time.monotonic() + OLLAMA_ACQUIRE_TIMEOUT_SEC
+
+    while True:
+        candidates = [b for b in _ranked(model) if b["url"] not in (exclude or set())]
+        now = time.time()
+        for b in candidates:
+            got = script(
+                keys=[_lease_key(b["url"])],
+                args=[now, now + lease_sec, lease_id, b["max_concurrency"], int(lease_sec) + 60],
+            )
+            if got != -1:
+                return b["url"], lease_id
+
+        if not candidates:
+            # 전부 제외(ejected/이미 실패)된 상태면 기다리지 않고 실패
+            raise NoBackendAvailable("all ollama backends are ejected or excluded")
+        if time.monotonic() > deadline:
+            raise NoBackendAvailable(f"no ollama backend available for model={model}")
+        time.sleep(0.2)
+
+
+def _record(url: str, model: str, ok: bool, latency_ms: float, backend_failure: bool):
+    r = get_redis()
+    key = _metrics_key(url)
+    pipe = r.pipeline()
+    pipe.hincrby(key, "requests", 1)
+    if ok:
+        pipe.hincrbyfloat(key, "total_ms", latency_ms)
+        pipe.hset(key, "last_ms", round(latency_ms, 1))
+        pipe.delete(_fails_key(url))
+    else:
+        pipe.hincrby(key, "failures", 1)
+    pipe.execute()
+
+    if ok:
+        prev = r.hget(key, "ema_ms")
+        ema = latency_ms if prev is None else float(prev) * 0.8 + latency_ms * 0.2
+        r.hset(key, "ema_ms", round(ema, 1))
+        # 방금 성공했으면 이 모델은 로드된 상태
+        cached = _loaded_models.get(url)
+        if cached:
+            cached[1].add(model)
+        return
+
+    if backend_failure:
+        fails = r.incr(_fails_key(url))
+        r.expire(_fails_key(url), OLLAMA_EJECT_SEC * 10)
+        if fails >= OLLAMA_EJECT_AFTER_FAILURES:
+            r.set(_ejected_key(url), 1, ex=OLLAMA_EJECT_SEC)
+            r.hincrby(key, "ejections", 1)
+            r.delete(_fails_key(url))
+
+
+def release(url: str, lease_id: str):
+    get_redis().zrem(_lease_key(url), lease_id)
+
+
+def is_backend_failure(e: Exception) -> bool:
+    # 연결 실패 / 타임아웃 / 5xx 만 backend 문제로 본다 (4xx는 요청 문제)
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code >= 500
+    return False
+
+
+@contextmanager
+def backend_lease(model: str, lease_sec: float, exclude: set | None = None):
+    """
+    with backend_lease(model, timeout) as url:
+        requests.post(f"{url}/api/generate", ...)
+    """
+    url, lease_id = acquire(model, lease_sec, exclude)
+    t0 = time.monotonic()
+    try:
+        yield url
+    except Exception as e:
+        _record(url, model, False, (time.monotonic() - t0) * 1000, is_backend_failure(e))
+        raise
+    else:
+        _record(url, model, True, (time.monotonic() - t0) * 1000, False)
+    finally:
+        release(url, lease_id)
+
+
+def backend_stats() -> list[dict]:
+    r = get_redis()
+    now = time.time()
+    out = []
+    for b in get_backends():
+        url = b["url"]
+        m = {k.decode(): v.decode() for k, v in r.hgetall(_metrics_key(url)).items()}
+        requests_ok = int(m.get("requests", 0)) - int(m.get("failures", 0))
+        total_ms = float(m.get("total_ms", 0))
+        out.append({
+            "url": url,
+            "max_concurrency": b["max_concurrency"],
+            "outstanding": _outstanding(r, url, now),
+            "ejected_for_sec": max(0, r.ttl(_ejected_key(url))),
+            "loaded_models": sorted(x for x in loaded_models(url) if x),
+            "requests": int(m.get("requests", 0)),
+            "failures": int(m.get("failures", 0)),
+            "ejections": int(m.get("ejections", 0)),
+            "avg_ms": round(total_ms / requests_ok, 1) if requests_ok > 0 else None,
+            "ema_ms": float(m["ema_ms"]) if "ema_ms" in m else None,
+            "last_ms": float(m["last_ms"]) if "last_ms" in m else None,
+        })
+    return out
@@ -0,0 +1,483 @@
+import os
+import re
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+import requests
+from fastapi import HTTPException
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .db import SessionLocal
+from .models import Scan, LLMAnswer
+from .llm_service import build_llm_input
+from .ollama_client import DEFAULT_SCHEMA, validate_answer
+from .responses import encode_json
+from . import model_router
+from . import ollama_pool
+from . import response_cache
+from . import scan_state
+from . import llm_inputs
+
+# Open WebUI -> FuzzLab -> Ollama
+# Open WebUI의 OpenAI API 연결 주소를 http://<fuzzlab>:8000/v1 로 두면
+# scan/group 참조가 있는 질문은 FuzzLab triage로, 나머지는 Ollama로 그대로 전달 (backend pool 경유)
+FUZZLAB_MODEL = os.getenv("OPENAI_COMPAT_MODEL", "fuzzlab-triage")
+OLLAMA_TIMEOUT_SEC = int(os.getenv("OLLAMA_TIMEOUT_SEC", "180"))
+
+# 메시지 안의 참조
+#   "scan 3f2a...-... group src/app.py:10-12"  /  "/scan/<scan_id>/groups/<group_id>"
+_SCAN_RE = re.compile(r"scan[\s:=/#]+([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})")
+_GROUP_RE = re.compile(r"groups?[\s:=/#]+(\S+:\d+-\d+)")
+# 저장된 답을 쓰지 않고 새로 생성 ("... regenerate", "... --fresh")
+_FRESH_RE = re.compile(r"(?:\bregenerate\b|\brefresh\b|--fresh\b)", re.IGNORECASE)
+# 같은 입력의 다른 scan 답이 있으면 재사용 (API의 reuse=true 와 같음, 기본은 새로 생성)
+_REUSE_RE = re.compile(r"--reuse\b", re.IGNORECASE)
+
+# stored answer를 보여줄 때 필드 순서 / 제목
+_ANSWER_FIELDS = [
+    ("summary", "Summary"),
+    ("risk_level", "Risk level"),
+    ("reasoning", "Reasoning"),
+    ("impact", "Impact"),
+    ("recommendation", "Recommendation"),
+    ("safe_example", "Safe example"),
+]
+
+
+def _text(content) -> str:
+    # OpenAI 형식은 content가 문자열 또는 [{"type": "text", "text": ...}] 목록
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(p.get("text", "") for p in content if isinstance(p, dict) and p.get("type") == "text")
+    return ""
+
+
+def find_reference(messages: list[dict]) -> dict | None:
+    # 마지막 user 메시지에 scan + group 이 둘 다 있을 때만 triage로 처리
+    for m in reversed(messages):
+        if m.get("role") != "user":
+            continue
+        text = _text(m.get("content"))
+        scan = _SCAN_RE.search(text)
+        group = _GROUP_RE.search(text)
+        if scan and group:
+            return {
+                "scan_id": scan.group(1),
+                "group_id": group.group(1),
+                "fresh": bool(_FRESH_RE.search(text)),
+                "reuse": bool(_REUSE_RE.search(text)),
+            }
+        return None
+    return None
+
+
+def render_answer(answer: dict) -> str:
+    lines = []
+    for key, title in _ANSWER_FIELDS:
+        value = answer.get(key)
+        if not value:
+            continue
+        if key == "safe_example":
+            lines.append(f"**{title}**\n```\n{value}\n```")
+        else:
+            lines.append(f"**{title}**: {value}")
+    return "\n\n".join(lines)
+
+
+def list_models() -> list[dict]:
+    """
+    FuzzLab triage 모델 + backend들에 있는 Ollama 모델 (/api/tags, 실패한 backend는 건너뜀)
+    """
+    names = []
+    for b in ollama_pool.get_backends():
+        try:
+            r = requests.get(f"{b['url']}/api/tags", timeout=2)
+            r.raise_for_status()
+            names.extend(m.get("name") or m.get("model") for m in r.json().get("models") or [])
+        except (requests.RequestException, ValueError):
+            continue
+
+    models = [{"id": FUZZLAB_MODEL, "object": "model", "created": 0, "owned_by": "fuzzlab"}]
+    for name in sorted({n for n in names if n}):
+        models.append({"id": name, "object": "model", "created": 0, "owned_by": "ollama"})
+    return models
+
+
+# ---------------------------------------------------------------------------
+# OpenAI 응답 형식
+
+def completion_body(model: str, content: str, stats: dict | None = None) -> dict:
+    body = {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+    }
+    if stats:
+        prompt_tokens = stats.get("prompt_tokens") or 0
+        completion_tokens = stats.get("completion_tokens") or 0
+        body["usage"] = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+    return body
+
+
+def _event(cid: str, created: int, model: str, delta: dict, finish_reason: str | None = None) -> bytes:
+    chunk = {
+        "id": cid,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return b"data: " + encode_json(chunk) + b"\n\n"
+
+
+def sse(model: str, pieces):
+    """
+    text 조각 generator -> OpenAI SSE (text/event-stream)
+    헤더가 이미 나간 뒤라서 upstream 에러는 본문에 표시하고 정상 종료
+    빈 조각("")은 SSE comment(keep-alive)로 보냄 -> 답을 다 만든 뒤 렌더링하는 triage가 기다리는 동안 연결 유지
+    """
+    cid = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    try:
+        yield _event(cid, created, model, {"role": "assistant"})
+        try:
+            for piece in pieces:
+                if not piece:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield _event(cid, created, model, {"content": piece})
+        except (requests.RequestException, ollama_pool.NoBackendAvailable, RuntimeError) as e:
+            yield _event(cid, created, model, {"content": f"\n\n[FuzzLab] upstream error: {e}"})
+        yield _event(cid, created, model, {}, "stop")
+        yield b"data: [DONE]\n\n"
+    finally:
+        # client가 끊겨서 이 generator가 닫히면 upstream generator도 바로 닫음 (lease 반환 / 상태 정리)
+        close = getattr(pieces, "close", None)
+        if close:
+            close()
+
+
+def _reply(model: str, content: str, stream: bool, stats: dict | None = None):
+    if stream:
+        return sse(model, iter([content]))
+    return completion_body(model, content, stats)
+
+
+def _collect(model: str, pieces, stats: dict | None = None) -> dict:
+    try:
+        content = "".join(pieces)
+    except (requests.RequestException, ollama_pool.NoBackendAvailable, RuntimeError) as e:
+        raise HTTPException(status_code=502, detail=f"ollama call failed: {e}")
+    return completion_body(model, content, stats)
+
+
+# ---------------------------------------------------------------------------
+# Ollama /api/chat (stream)
+
+def _ollama_chat_stream(model: str, messages: list[dict], options: dict, fmt=None, stats: dict | None = None):
+    """
+    backend pool에서 lease를 받아 /api/chat 을 stream으로 호출, content 조각을 yield
+    lease는 마지막 조각을 넘길 때까지 유지 -> Open WebUI 요청도 backend 동시 처리 상한에 포함됨
+    """
+    payload = {"model": model, "messages": messages, "stream": True, "options": options}
+    if fmt:
+        payload["format"] = fmt
+
+    with ollama_pool.backend_lease(model, OLLAMA_TIMEOUT_SEC + 30) as url:
+        with requests.post(f"{url}/api/chat", json=payload, stream=True, timeout=OLLAMA_TIMEOUT_SEC) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                piece = (chunk.get("message") or {}).get("content") or ""
+                if piece:
+                    yield piece
+                if chunk.get("done"):
+                    if stats is not None:
+                        stats["backend"] = url
+                        stats["prompt_tokens"] = chunk.get("prompt_eval_count")
+                        stats["completion_tokens"] = chunk.get("eval_count")
+                    break
+
+
+def proxy_chat(model: str, messages: list[dict], temperature: float | None, stream: bool):
+    # 참조 없는 일반 대화: Ollama로 그대로 (FuzzLab 모델을 골랐으면 large tier 모델 사용)
+    target = model_router.TIERS["large"] if model == FUZZLAB_MODEL else model
+    plain = [{"role": m.get("role", "user"), "content": _text(m.get("content"))} for m in messages]
+    options = {} if temperature is None else {"temperature": temperature}
+
+    stats = {}
+    pieces = _ollama_chat_stream(target, plain, options, stats=stats)
+    if stream:
+        return sse(model, pieces)
+    return _collect(model, pieces, stats)
+
+
+# ---------------------------------------------------------------------------
+# triage (scan/group 참조)
+
+def stored_answer(scan_id: str, group_id: str) -> dict | None:
+    """
+    done 상태의 LLMAnswer를 렌더링해서 반환 (response_cache -> DB 순)
+    답이 바뀌면 저장하는 쪽에서 invalidate_scan 하므로 캐시는 done 답만 담는다
+    """
+    key = response_cache.make_key(scan_id, "openai-answer", {"group_id": group_id})
+    entry = response_cache.get(key)
+    if entry:
+        return json.loads(entry["body"])
+
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(LLMAnswer)
+            .filter(LLMAnswer.scan_id == scan_id, LLMAnswer.group_id == group_id)
+            .first()
+        )
+        if not row or row.status != "done" or not isinstance(row.response_json, dict):
+            return None
+        payload = {"model": row.model, "content": render_answer(row.response_json)}
+    finally:
+        db.close()
+
+    response_cache.put(scan_id, key, payload)
+    return payload
+
+
+def _claim_triage(scan_id: str, group_id: str, model: str, reuse: bool = False) -> dict | None:
+    """
+    llm_answers row를 queued -> running 으로 claim (celery task와 같은 상태 머신 사용)
+    이미 queued/running 이면 None (다른 곳에서 생성 중)
+    """
+    db = SessionLocal()
+    try:
+        scan = db.get(Scan, scan_id)
+        if not scan:
+            raise HTTPException(status_code=404, detail="scan not found")
+        if scan.status != "done":
+            raise HTTPException(status_code=409, detail=f"scan not ready: status={scan.status}")
+
+        # 순환 import 방지: group_findings만 지연 import
+        from .main import group_findings
+
+        llm_input = build_llm_input(db, scan_id, group_id, group_findings)
+        prepared = llm_inputs.prepare(llm_input)
+        if model == FUZZLAB_MODEL:
+            route = model_router.route(llm_input["group"])
+        else:
+            route = {"tier": model_router.tier_of(model), "model": model}
+
+        # 자동 라우팅은 완료될 때까지 "auto" (reaper가 다시 큐에 넣을 때 지정 여부 판단)
+        queued_model = "auto" if model == FUZZLAB_MODEL else route["model"]
+        created = db.execute(
+            pg_insert(LLMAnswer)
+            .values(
+                scan_id=scan_id,
+                group_id=group_id,
+                model=queued_model,
+                prompt="",
+                status="queued",
+                heartbeat_at=datetime.now(timezone.utc),
+                reuse=reuse,
+            )
+            .on_conflict_do_nothing(index_elements=["scan_id", "group_id"])
+            .returning(LLMAnswer.id)
+        ).first()
+        db.commit()
+        row = None
+        if not created:
+            row = (
+                db.query(LLMAnswer)
+                .filter(LLMAnswer.scan_id == scan_id, LLMAnswer.group_id == group_id)
+                .first()
+            )
+    finally:
+        db.close()
+
+    if row is not None:
+        if row.status in ("queued", "running"):
+            return None
+        # 끝난 답 -> queued 조건부 전이 (동시에 같은 group을 요청했으면 한 쪽만 성공)
+        if not scan_state.transition_answer(
+            scan_id,
+            group_id,
+            "queued",
+            attempt=row.attempt,
+            from_statuses=[row.status],
+            model=queued_model,
+            task_id=None,
+            heartbeat_at=datetime.now(timezone.utc),
+            reuse=reuse,
+            task_profile=None,
+        ):
+            return None
+
+    attempt = scan_state.claim_answer(scan_id, group_id)
+    if attempt is None:
+        return None
+    llm_inputs.store(prepared)
+    return {
+        "scan_id": scan_id,
+        "group_id": group_id,
+        "attempt": attempt,
+        "model": route["model"],
+        "tier": route["tier"],
+        "prompt": prepared["prompt"],
+        # 자동 라우팅이면 스키마 실패 시 다음 tier로 escalation (celery task와 같은 규칙)
+        "auto": model == FUZZLAB_MODEL,
+        # llm_answers에는 프롬프트 전문 대신 템플릿 버전 + 입력 해시
+        "input": {"prompt": "", "prompt_version": prepared["prompt_version"], "input_hash": prepared["input_hash"]},
+        "stats": {},
+    }
+
+
+def _chat_json(model: str, prompt: str, stats: dict):
+    # 구조화 출력(JSON)을 끝까지 받아서 반환, 받는 동안에는 "" 를 yield (keep-alive)
+    pieces = []
+    for piece in _ollama_chat_stream(
+        model, [{"role": "user", "content": prompt}], {"temperature": 0.1}, fmt=DEFAULT_SCHEMA, stats=stats,
+    ):
+        pieces.append(piece)
+        yield ""
+    return "".join(pieces)
+
+
+def _parse(text: str):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def _failed_content(text: str) -> str:
+    return f"FuzzLab triage failed: the model answer did not match the expected schema.\n\n```\n{text}\n```"
+
+
+def _run_triage(job: dict):
+    """
+    답 전체를 받은 뒤(스키마 확인 + 필요하면 escalation) llm_answers에 저장하고 (내 attempt일 때만)
+    저장된 답과 같은 형식(render_answer)으로 한 번에 내보냄 -> 캐시 여부와 관계없이 같은 모양의 답
+    """
+    scan_id, group_id, attempt = job["scan_id"], job["group_id"], job["attempt"]
+    stats = job["stats"]
+    route = {"model": job["model"], "tier": job["tier"]}
+    escalated = False
+    t0 = time.monotonic()
+
+    with scan_state.Heartbeat(lambda: scan_state.touch_answer(scan_id, group_id, attempt)) as hb:
+        try:
+            text = yield from _chat_json(route["model"], job["prompt"], stats)
+            parsed = _parse(text)
+            next_route = model_router.retry_route(route, validate_answer(parsed), job["auto"])
+            if next_route and not hb.lost.is_set():
+                first_stats = dict(stats)
+                stats.clear()
+                text = yield from _chat_json(next_route["model"], job["prompt"], stats)
+                parsed = _parse(text)
+                for k in ("prompt_tokens", "completion_tokens"):
+                    stats[k] = (stats.get(k) or 0) + (first_stats.get(k) or 0)
+                route = next_route
+                escalated = True
+        except GeneratorExit:
+            # 생성 중 client가 끊김 -> running으로 남겨두지 않고 바로 실패 처리 (다시 물으면 새로 생성)
+            if scan_state.transition_answer(
+                scan_id, group_id, "failed_call", attempt=attempt,
+                model=route["model"], tier=route["tier"],
+                response_json=None, response_text="client disconnected", **job["input"],
+            ):
+                response_cache.invalidate_scan(scan_id)
+            raise
+        except Exception as e:
+            if scan_state.transition_answer(
+                scan_id, group_id, "failed_call", attempt=attempt,
+                model=route["model"], tier=route["tier"],
+                response_json=None, response_text=str(e), **job["input"],
+            ):
+                response_cache.invalidate_scan(scan_id)
+            raise
+
+    ok = validate_answer(parsed)
+    if scan_state.transition_answer(
+        scan_id,
+        group_id,
+        "done" if ok else "failed_parse",
+        attempt=attempt,
+        model=route["model"],
+        tier=route["tier"],
+        escalated=escalated,
+        latency_ms=int((time.monotonic() - t0) * 1000),
+        prompt_tokens=stats.get("prompt_tokens"),
+        completion_tokens=stats.get("completion_tokens"),
+        response_json=parsed if ok else None,
+        response_text=None if ok else text,
+        reused_from_id=None,
+        **job["input"],
+    ):
+        response_cache.invalidate_scan(scan_id)
+
+    yield render_answer(parsed) if ok else _failed_content(text)
+
+
+def triage(scan_id: str, group_id: str, model: str, stream: bool, fresh: bool = False, reuse: bool = False):
+    """
+    1) 저장된 답(done)이 있으면 그대로 (Ollama 호출 없음)
+    2) 없으면 claim 후 Ollama 호출 (자동 라우팅이면 스키마 실패 시 escalation) + 결과 저장,
+       저장된 답과 같은 형식(render_answer)으로 응답
+    3) 다른 곳(celery task / 다른 요청)에서 생성 중이면 안내 메시지
+    fresh=True ("regenerate" 등): 저장된 답을 쓰지 않고 새로 생성
+    reuse=True ("--reuse"): 다른 scan의 같은 입력 답이 있으면 호출 없이 재사용 (fresh면 무시)
+    """
+    if not fresh:
+        stored = stored_answer(scan_id, group_id)
+        if stored:
+            return _reply(stored["model"], stored["content"], stream)
+
+    job = _claim_triage(scan_id, group_id, model, reuse=reuse and not fresh)
+    if job is None:
+        return _reply(
+            model,
+            f"FuzzLab triage for scan {scan_id} group {group_id} is already in progress. Ask again shortly.",
+            stream,
+        )
+
+    # reuse: 같은 입력 + 템플릿 + 모델로 이미 성공한 답이 있으면 (다른 scan 포함) 호출 없이 재사용
+    # 자동 라우팅이면 escalation 모델의 답까지 확인 (celery task와 같은 순서)
+    reused = None
+    route = {"model": job["model"], "tier": job["tier"]}
+    candidates = [route] if reuse and not fresh else []
+    if candidates and job["auto"] and model_router.escalate(route["tier"]):
+        candidates.append(model_router.escalate(route["tier"]))
+    for candidate in candidates:
+        reused = llm_inputs.find_reusable(job["input"]["input_hash"], job["input"]["prompt_version"], candidate["model"])
+        if reused:
+            route = candidate
+            break
+    if reused and scan_state.transition_answer(
+        scan_id, group_id, "done", attempt=job["attempt"],
+        model=route["model"], tier=reused["tier"] or route["tier"], escalated=reused["escalated"],
+        latency_ms=0, prompt_tokens=None, completion_tokens=None,
+        response_json=reused["response_json"], response_text=None, reused_from_id=reused["id"],
+        **job["input"],
+    ):
+        response_cache.invalidate_scan(scan_id)
+        return _reply(route["model"], render_answer(reused["response_json"]), stream)
+
+    pieces = _run_triage(job)
+    if stream:
+        return sse(job["model"], pieces)
+    return _collect(job["model"], pieces, job["stats"])
@@ -0,0 +1,396 @@
+import os
+import re
+import sys
+import gzip
+import time
+import marshal
+import cProfile
+import pstats
+import tempfile
+import threading
+from pathlib import Path
+from uuid import uuid4
+from collections import Counter
+from urllib.parse import parse_qs
+from datetime import datetime, timedelta, timezone
+
+import redis
+from starlette.concurrency import run_in_threadpool
+
+from .db import SessionLocal
+from .models import Scan, ProfileArtifact
+from .redis_client import get_redis
+
+# 운영 중 on-demand 프로파일링 (재배포 없이 특정 요청 / 작업만)
+#   API 요청: 헤더 X-FuzzLab-Profile: 1 또는 ?_profile=1 -> sampling (folded stacks, flamegraph.pl / speedscope 용)
+#   celery 작업: run_semgrep_and_store / generate_llm_answer_for_group 의 profile 인자 (sampling / cprofile)
+# 결과는 workspace/<scan_id>/profiles/ 아래 gzip 파일 + profile_artifacts 테이블
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "1") == "1"
+# 전체(API + worker) 분당 최대 프로파일 수, 프로세스당 동시에는 하나만
+PROFILE_MAX_PER_MIN = int(os.getenv("PROFILE_MAX_PER_MIN", "6"))
+# sampling 간격(ms) / 최대 시간(초, 넘으면 sampling만 멈추고 작업은 계속)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_SEC = float(os.getenv("PROFILE_MAX_SEC", "300"))
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "128"))
+# 대기 중(lock / queue / select)인 스택도 포함할지
+PROFILE_INCLUDE_IDLE = os.getenv("PROFILE_INCLUDE_IDLE", "0") == "1"
+PROFILE_RETENTION_SEC = int(os.getenv("PROFILE_RETENTION_SEC", str(7 * 24 * 3600)))
+
+MODES = ("sampling", "cprofile")
+# run_semgrep_and_store 는 producer / normalize / writer 스레드에서 일하고 호출 스레드는 join만 함
+#   -> cProfile(호출 스레드만)로는 대기만 보여서 sampling만 허용
+SCAN_MODES = ("sampling",)
+# sampling은 프로세스의 모든 스레드를 봄 (같은 프로세스의 다른 요청 / 작업도 섞임), cProfile은 호출 스레드만
+SCOPES = {"sampling": "process", "cprofile": "thread"}
+FORMATS = {
+    "sampling": {"format": "folded", "ext": "folded", "media_type": "text/plain; charset=utf-8"},
+    "cprofile": {"format": "pstats", "ext": "pstats", "media_type": "application/octet-stream"},
+}
+
+PROFILE_HEADER = "x-fuzzlab-profile"
+PROFILE_QUERY = "_profile"
+PROFILE_PREFIX = "fuzzlab:profile"
+
+_TRUTHY = {"1", "true", "yes", "sampling"}
+
+# 이 함수에서 멈춰 있는 스택은 대기(idle)로 봄
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("subprocess.py", "_wait"),
+    ("subprocess.py", "_communicate"),
+}
+
+# 한 프로세스에서 동시에 하나만 (sampling은 프로세스 전체 스레드를 봄)
+_active = threading.Lock()
+# code object -> label (sampling 중에만 사용, finish()에서 비움 -> code object를 계속 붙잡지 않음)
+_labels: dict = {}
+_PATH_PREFIXES = sorted({os.path.abspath(p) + os.sep for p in sys.path if p}, key=len, reverse=True)
+
+
+def _short_path(filename: str) -> str:
+    # sys.path 기준 상대 경로 (threading.py, celery/app/trace.py, backend/app/tasks.py ...)
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        _labels[code] = label
+    return label
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+
+
+def _fold(frame) -> str | None:
+    if not PROFILE_INCLUDE_IDLE and _is_idle(frame):
+        return None
+    labels = []
+    while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class Sampler:
+    """
+    별도 스레드에서 PROFILE_INTERVAL_MS 마다 모든 스레드의 스택을 읽어서 folded 형식으로 집계
+    (스레드 이름;바깥 frame;...;안쪽 frame 횟수) -> 같은 스택은 한 줄이라 결과 크기는 작음
+    """
+
+    def __init__(self):
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.truncated = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fuzzlab-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + PROFILE_MAX_SEC
+        interval = PROFILE_INTERVAL_MS / 1000
+        while not self._stop.wait(interval):
+            if time.monotonic() >= deadline:
+                self.truncated = True
+                break
+            # 번호만 다른 worker 스레드(AnyIO worker thread, ThreadPoolExecutor-0_3 ...)는 합쳐서 봄
+            names = {t.ident: re.sub(r"\d+", "N", t.name) for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = _fold(frame)
+                if stack:
+                    self.stacks[f"{names.get(tid, 'thread')};{stack}"] += 1
+            self.samples += 1
+
+    def dump(self) -> bytes:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common()).encode("utf-8")
+
+
+class Tracer:
+    """
+    cProfile (호출한 스레드만, 모든 함수 호출 기록) -> pstats 파일 (snakeviz / flameprof 로 확인)
+    overhead가 커서 celery 작업에서만 사용
+    """
+
+    def __init__(self):
+        self.samples = None
+        self.truncated = False
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def dump(self) -> bytes:
+        # pstats.Stats.dump_stats 와 같은 형식
+        return marshal.dumps(pstats.Stats(self._profile).stats)
+
+
+# ---------------------------------------------------------------------------
+# 시작 / 종료
+
+def _rate_key() -> str:
+    return f"{PROFILE_PREFIX}:rate:{int(time.time() // 60)}"
+
+
+def _allow() -> bool:
+    # redis를 못 쓰면 프로파일링 안 함 (제한 없이 켜지는 것보다 안전)
+    try:
+        pipe = get_redis().pipeline()
+        pipe.incr(_rate_key())
+        pipe.expire(_rate_key(), 120)
+        count, _ = pipe.execute()
+    except redis.RedisError:
+        return False
+    return count <= PROFILE_MAX_PER_MIN
+
+
+def start(mode: str, kind: str, target: str) -> dict | None:
+    """
+    사용 불가 / 이미 실행 중 / 분당 한도 초과면 None (요청 / 작업은 그대로 실행)
+    """
+    if not PROFILING_ENABLED or mode not in MODES:
+        return None
+    if not _active.acquire(blocking=False):
+        return None
+    if not _allow():
+        _active.release()
+        return None
+    profiler = Sampler() if mode == "sampling" else Tracer()
+    session = {
+        "profile_id": uuid4().hex,
+        "mode": mode,
+        "kind": kind,
+        "target": target,
+        "profiler": profiler,
+        "t0": time.monotonic(),
+    }
+    profiler.start()
+    return session
+
+
+def artifact_path(scan_id: str | None, profile_id: str, mode: str) -> Path:
+    base = Path("workspace") / scan_id if scan_id else Path("workspace") / "_profiles"
+    return base / "profiles" / f"{profile_id}.{FORMATS[mode]['ext']}.gz"
+
+
+def _existing_scan(scan_id: str | None) -> str | None:
+    # 경로의 scan_id는 사용자 입력 -> 실제 있는 scan일 때만 그 workspace에 저장
+    if not scan_id:
+        return None
+    db = SessionLocal()
+    try:
+        return scan_id if db.get(Scan, scan_id) else None
+    finally:
+        db.close()
+
+
+def finish(session: dict, scan_id: str | None = None, target: str | None = None) -> dict | None:
+    profiler = session["profiler"]
+    try:
+        profiler.stop()
+        duration_ms = int((time.monotonic() - session["t0"]) * 1000)
+        data = profiler.dump()
+    finally:
+        _labels.clear()
+        _active.release()
+
+    try:
+        scan_id = _existing_scan(scan_id)
+        path = artifact_path(scan_id, session["profile_id"], session["mode"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+        row = {
+            "profile_id": session["profile_id"],
+            "scan_id": scan_id,
+            "kind": session["kind"],
+            "target": (target or session["target"])[:256],
+            "mode": session["mode"],
+            "format": FORMATS[session["mode"]]["format"],
+            "path": str(path),
+            "size_bytes": len(data),
+            "samples": profiler.samples,
+            "duration_ms": duration_ms,
+            "truncated": profiler.truncated,
+        }
+        db = SessionLocal()
+        try:
+            db.add(ProfileArtifact(**row))
+            db.commit()
+        finally:
+            db.close()
+        print(f"[profile] saved {row['profile_id']} {row['kind']} {row['target']} ({duration_ms}ms)")
+        return row
+    except Exception as e:
+        # 프로파일 저장 실패는 요청 / 작업 결과에 영향 없음
+        print(f"[profile] save failed: {e}")
+        return None
+
+
+class profiled:
+    """
+    celery 작업용: with profiling.profiled(profile, "generate_llm_answer_for_group", scan_id): ...
+    profile이 None이면 아무것도 하지 않음
+    claim 이후에 감쌀 것 (skip된 실행에 분당 한도 / 프로세스 lock을 쓰지 않도록)
+    """
+
+    def __init__(self, mode: str | None, target: str, scan_id: str | None = None):
+        self.mode = mode
+        self.target = target
+        self.scan_id = scan_id
+        self.session = None
+
+    def __enter__(self):
+        if self.mode:
+            self.session = start(self.mode, "task", self.target)
+            if self.session is None:
+                print(f"[profile] skipped {self.target} (disabled / busy / rate limited)")
+        return self.session
+
+    def __exit__(self, *exc):
+        if self.session:
+            finish(self.session, scan_id=self.scan_id)
+        return False
+
+
+# ---------------------------------------------------------------------------
+# API 요청 (ASGI middleware)
+
+def requested(scope) -> bool:
+    for name, value in scope.get("headers") or []:
+        if name == PROFILE_HEADER.encode() and value.decode("latin-1").strip().lower() in _TRUTHY:
+            return True
+    query = parse_qs((scope.get("query_string") or b"").decode("latin-1"))
+    return any(v.strip().lower() in _TRUTHY for v in query.get(PROFILE_QUERY, []))
+
+
+class ProfileMiddleware:
+    """
+    요청 하나를 sampling으로 프로파일링 (StreamingResponse는 본문 전송이 끝날 때까지)
+    - 응답 헤더 X-FuzzLab-Profile: <profile_id> 또는 skipped
+    - 경로에 scan_id가 있으면 그 scan에 붙여서 저장
+    - sampling이라 같은 프로세스에서 동시에 처리 중인 다른 요청의 스택도 섞임 (scope=process)
+    sync endpoint는 threadpool에서 돌기 때문에 cProfile(호출 스레드만)이 아니라 sampling만 지원
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        session = await run_in_threadpool(start, "sampling", "request", f"{scope['method']} {scope['path']}")
+        value = session["profile_id"] if session else "skipped"
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                headers.append((PROFILE_HEADER.encode(), value.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            if session:
+                # router가 scope에 route / path_params 를 채워둠
+                route = scope.get("route")
+                target = f"{scope['method']} {route.path}" if route is not None else None
+                scan_id = (scope.get("path_params") or {}).get("scan_id")
+                await run_in_threadpool(finish, session, scan_id, target)
+
+
+# ---------------------------------------------------------------------------
+# 조회 / 정리
+
+def to_dict(row: ProfileArtifact) -> dict:
+    return {
+        "profile_id": row.profile_id,
+        "scan_id": row.scan_id,
+        "kind": row.kind,
+        "target": row.target,
+        "mode": row.mode,
+        "scope": SCOPES.get(row.mode),
+        "format": row.format,
+        "size_bytes": row.size_bytes,
+        "samples": row.samples,
+        "duration_ms": row.duration_ms,
+        "truncated": row.truncated,
+        "created_at": row.created_at,
+    }
+
+
+def open_artifact(row: ProfileArtifact):
+    try:
+        return Path(row.path).open("rb")
+    except FileNotFoundError:
+        return None
+
+
+def expire(now: datetime | None = None) -> int:
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(seconds=PROFILE_RETENTION_SEC)
+    db = SessionLocal()
+    try:
+        rows = db.query(ProfileArtifact).filter(ProfileArtifact.created_at < cutoff).all()
+        for row in rows:
+            try:
+                os.unlink(row.path)
+            except FileNotFoundError:
+                pass
+            db.delete(row)
+        db.commit()
+        return len(rows)
+    finally:
+        db.close()
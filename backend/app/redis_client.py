@@ -0,0 +1,18 @@
+import os
+import redis
+
+# 앱 레벨 Redis (캐시 등) - celery broker(db 0) / backend(db 1)와 db 번호 분리
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/2")
+
+_client: redis.Redis | None = None
+
+
+def get_redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            REDIS_URL,
+            socket_timeout=2,
+            socket_connect_timeout=2,
+        )
+    return _client
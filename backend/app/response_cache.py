@@ -0,0 +1,150 @@
+import os
+import json
+import hashlib
+import redis
+from fastapi import Request, Response
+from .redis_client import get_redis
+from . import responses
+from . import exports
+
+# 완료(done)된 scan의 응답만 캐시 (findings/groups가 더 이상 바뀌지 않음)
+# 메모리 상한은 redis maxmemory + volatile-lru 정책으로 관리 (infra/docker-compose.yml)
+# -> TTL이 있는 캐시 키만 evict 대상, celery broker 키는 건드리지 않음
+CACHE_TTL_SEC = int(os.getenv("RESPONSE_CACHE_TTL_SEC", "3600"))
+CACHE_PREFIX = "fuzzlab:resp"
+
+
+# 무효화는 scan별 generation을 올리는 것으로 한다 (키 목록 set을 지우는 방식 X)
+# - 캐시 키에 generation이 들어가므로 무효화 이후에는 이전 키를 아무도 읽지 않음 (TTL로 사라짐)
+# - payload를 만드는 동안 무효화되면 put은 이전 generation 키에 쓰게 되어 새 요청에 보이지 않음
+# - generation 키는 TTL이 없어서 volatile-lru eviction 대상이 아님
+
+def _generation_key(scan_id: str) -> str:
+    return f"{CACHE_PREFIX}:{scan_id}:gen"
+
+
+def generation(scan_id: str) -> int | None:
+    try:
+        return int(get_redis().get(_generation_key(scan_id)) or 0)
+    except redis.RedisError:
+        return None
+
+
+def make_key(scan_id: str, endpoint: str, params: dict | None = None) -> str | None:
+    """
+    payload를 만들기 전에 호출 (그 시점의 generation이 키에 들어감)
+    redis를 못 쓰면 None -> get / put 은 아무것도 하지 않음
+    """
+    gen = generation(scan_id)
+    if gen is None:
+        return None
+    # group_id에 ':' 가 들어가므로 endpoint + query params는 해시로 묶는다
+    raw = json.dumps([endpoint, sorted((params or {}).items())], ensure_ascii=False)
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return f"{CACHE_PREFIX}:{scan_id}:{gen}:{digest}"
+
+
+def _key_generation(key: str) -> int:
+    return int(key.rsplit(":", 2)[1])
+
+
+def get(key: str | None) -> dict | None:
+    if key is None:
+        return None
+    try:
+        data = get_redis().hgetall(key)
+    except redis.RedisError:
+        # 캐시 장애 시에는 그냥 DB로 fallback
+        return None
+    if not data or b"body" not in data:
+        return None
+    # 압축본(gzip/zstd)도 한 번 만들어두면 같이 재사용
+    return {
+        "key": key,
+        "etag": data[b"etag"].decode(),
+        "body": data[b"body"],
+        "gzip": data.get(b"gzip"),
+        "zstd": data.get(b"zstd"),
+    }
+
+
+def put(scan_id: str, key: str | None, payload: dict) -> dict:
+    body = responses.encode_json(payload)
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    entry = {"etag": etag, "body": body}
+
+    # 그 사이 무효화됐으면 (generation 변경) 저장하지 않음 -> 응답은 그대로 돌려줌
+    if key is not None and generation(scan_id) == _key_generation(key):
+        try:
+            pipe = get_redis().pipeline()
+            pipe.hset(key, mapping=entry)
+            pipe.expire(key, CACHE_TTL_SEC)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+    entry["key"] = key
+    return entry
+
+
+def _store_variant(key: str | None, encoding: str, data: bytes) -> None:
+    if key is None:
+        return
+    try:
+        r = get_redis()
+        # 그 사이 무효화됐으면 되살리지 않도록 존재할 때만 기록
+        if r.exists(key):
+            r.hset(key, encoding, data)
+    except redis.RedisError:
+        pass
+
+
+def invalidate_scan(scan_id: str) -> None:
+    # LLM 답변(자동/수동)이 바뀌면 해당 scan의 캐시 전체 무효화 (generation + 1)
+    try:
+        get_redis().incr(_generation_key(scan_id))
+    except redis.RedisError:
+        pass
+    # 미리 만든 export 파일(SARIF/CSV)도 LLM 답변을 담고 있으므로 같이 무효화
+    exports.invalidate(scan_id)
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        # 압축 표현은 "<etag>-gzip" 형태이므로 접미사 떼고 비교
+        for suffix in ('-gzip"', '-zstd"'):
+            if tag.endswith(suffix):
+                tag = tag[: -len(suffix)] + '"'
+        if tag == etag:
+            return True
+    return False
+
+
+def to_response(entry: dict, request: Request) -> Response:
+    body = entry["body"]
+    encoding = responses.pick_encoding(request, len(body))
+    etag = entry["etag"]
+    if encoding:
+        etag = etag[:-1] + f'-{encoding}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    # 클라이언트가 같은 버전을 가지고 있으면 body 없이 304
+    if _etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    encoded = None
+    if encoding:
+        encoded = entry.get(encoding)
+        if encoded is None:
+            encoded = responses.compress(body, encoding)
+            _store_variant(entry["key"], encoding, encoded)
+
+    return responses.bytes_response(
+        body, request, headers=headers, encoding=encoding, encoded_body=encoded
+    )
@@ -0,0 +1,101 @@
+import os
+import gzip
+import orjson
+from fastapi import Request, Response
+
+try:
+    import zstandard
+except ImportError:  # zstd는 선택 의존성 (없으면 gzip만 사용)
+    zstandard = None
+
+# 이 크기 이상일 때만 압축 (작은 응답은 압축 오버헤드가 더 큼)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+
+def _default(obj):
+    # orjson이 모르는 타입(Decimal, UUID 외 기타)은 문자열로
+    return str(obj)
+
+
+def encode_json(payload) -> bytes:
+    # datetime / dict / list 를 orjson이 C에서 바로 직렬화 (jsonable_encoder 순회 생략)
+    return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(Response):
+    # app 기본 응답 클래스 (main.py default_response_class): dict를 반환하는 endpoint도 orjson으로 직렬화
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return encode_json(content)
+
+
+def _parse_accept_encoding(header: str | None) -> dict:
+    accepted = {}
+    for part in (header or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def accepts_encoding(request: Request, encoding: str) -> bool:
+    return _parse_accept_encoding(request.headers.get("accept-encoding")).get(encoding, 0) > 0
+
+
+def pick_encoding(request: Request, body_size: int) -> str | None:
+    if body_size < COMPRESS_MIN_BYTES:
+        return None
+    accepted = _parse_accept_encoding(request.headers.get("accept-encoding"))
+
+    # zstd > gzip 순으로 선호 (zstd가 더 빠르고 작음)
+    if zstandard is not None and accepted.get("zstd", 0) > 0:
+        return "zstd"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"unsupported encoding: {encoding}")
+
+
+def bytes_response(
+    body: bytes,
+    request: Request,
+    headers: dict | None = None,
+    encoding: str | None = None,
+    encoded_body: bytes | None = None,
+) -> Response:
+    # 이미 직렬화/압축된 bytes를 그대로 내보냄 (캐시 hit 경로에서 재사용)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+
+    if encoding is None:
+        encoding = pick_encoding(request, len(body))
+    if encoding:
+        if encoded_body is None:
+            encoded_body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+        return Response(content=encoded_body, media_type="application/json", headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def json_response(payload, request: Request, headers: dict | None = None) -> Response:
+    return bytes_response(encode_json(payload), request, headers=headers)
@@ -0,0 +1,206 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update
+from .db import SessionLocal
+from .models import Scan, LLMAnswer
+
+# 상태 전이 규칙 (현재 상태 -> 갈 수 있는 상태)
+# 모든 변경은 "WHERE status IN (이전 상태들) AND attempt = 내 attempt" 조건부 UPDATE로만 한다.
+# -> 죽은 줄 알았던 worker가 뒤늦게 결과를 써도 새 attempt의 상태를 덮어쓰지 못함
+SCAN_TRANSITIONS = {
+    "queued": ("running", "cancelled", "failed"),
+    "running": ("done", "failed", "cancelled", "timed_out", "queued"),
+}
+ANSWER_TRANSITIONS = {
+    "queued": ("running", "cancelled", "failed_call"),
+    "running": ("done", "failed_parse", "failed_call", "timed_out", "cancelled", "queued"),
+    # 끝난 답을 다시 요청 (POST .../llm-answer)
+    "done": ("queued",),
+    "failed_parse": ("queued",),
+    "failed_call": ("queued",),
+    "timed_out": ("queued",),
+    "cancelled": ("queued",),
+}
+
+# running 작업이 heartbeat_at을 갱신하는 주기 / 이 시간 넘게 갱신 없으면 죽은 것으로 간주
+HEARTBEAT_SEC = float(os.getenv("HEARTBEAT_SEC", "5"))
+HEARTBEAT_STALE_SEC = float(os.getenv("HEARTBEAT_STALE_SEC", "30"))
+
+
+class LostOwnership(Exception):
+    # 내 attempt가 더 이상 유효하지 않음 (cancel / reaper가 재할당)
+    pass
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _sources(transitions: dict, to_status: str) -> list[str]:
+    return [src for src, targets in transitions.items() if to_status in targets]
+
+
+def _execute(stmt) -> int:
+    db = SessionLocal()
+    try:
+        res = db.execute(stmt)
+        db.commit()
+        return res.rowcount
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# scans
+
+def transition_scan(
+    scan_id: str,
+    to_status: str,
+    attempt: int | None = None,
+    from_statuses: list[str] | None = None,
+    conditions: list | None = None,
+    **values,
+) -> bool:
+    stmt = update(Scan).where(
+        Scan.scan_id == scan_id,
+        Scan.status.in_(from_statuses or _sources(SCAN_TRANSITIONS, to_status)),
+        *(conditions or []),
+    )
+    if attempt is not None:
+        stmt = stmt.where(Scan.attempt == attempt)
+    stmt = stmt.values(status=to_status, updated_at=_now(), **values)
+    return _execute(stmt) == 1
+
+
+def claim_scan(scan_id: str) -> int | None:
+    """
+    queued -> running, attempt + 1
+    이미 다른 worker가 가져갔거나 cancel 된 경우 None (중복 실행 방지)
+    """
+    db = SessionLocal()
+    try:
+        now = _now()
+        attempt = db.execute(
+            update(Scan)
+            .where(Scan.scan_id == scan_id, Scan.status == "queued")
+            .values(
+                status="running",
+                attempt=Scan.attempt + 1,
+                heartbeat_at=now,
+                updated_at=now,
+                error_message=None,
+            )
+            .returning(Scan.attempt)
+        ).scalar_one_or_none()
+        db.commit()
+        return attempt
+    finally:
+        db.close()
+
+
+def touch_scan(scan_id: str, attempt: int) -> bool:
+    return _execute(
+        update(Scan)
+        .where(Scan.scan_id == scan_id, Scan.status == "running", Scan.attempt == attempt)
+        .values(heartbeat_at=_now())
+    ) == 1
+
+
+# ---------------------------------------------------------------------------
+# llm_answers
+
+def transition_answer(
+    scan_id: str,
+    group_id: str,
+    to_status: str,
+    attempt: int | None = None,
+    from_statuses: list[str] | None = None,
+    conditions: list | None = None,
+    **values,
+) -> bool:
+    stmt = update(LLMAnswer).where(
+        LLMAnswer.scan_id == scan_id,
+        LLMAnswer.group_id == group_id,
+        LLMAnswer.status.in_(from_statuses or _sources(ANSWER_TRANSITIONS, to_status)),
+        *(conditions or []),
+    )
+    if attempt is not None:
+        stmt = stmt.where(LLMAnswer.attempt == attempt)
+    stmt = stmt.values(status=to_status, **values)
+    return _execute(stmt) == 1
+
+
+def claim_answer(scan_id: str, group_id: str) -> int | None:
+    db = SessionLocal()
+    try:
+        attempt = db.execute(
+            update(LLMAnswer)
+            .where(
+                LLMAnswer.scan_id == scan_id,
+                LLMAnswer.group_id == group_id,
+                LLMAnswer.status == "queued",
+            )
+            .values(status="running", attempt=LLMAnswer.attempt + 1, heartbeat_at=_now())
+            .returning(LLMAnswer.attempt)
+        ).scalar_one_or_none()
+        db.commit()
+        return attempt
+    finally:
+        db.close()
+
+
+def touch_answer(scan_id: str, group_id: str, attempt: int) -> bool:
+    return _execute(
+        update(LLMAnswer)
+        .where(
+            LLMAnswer.scan_id == scan_id,
+            LLMAnswer.group_id == group_id,
+            LLMAnswer.status == "running",
+            LLMAnswer.attempt == attempt,
+        )
+        .values(heartbeat_at=_now())
+    ) == 1
+
+
+# ---------------------------------------------------------------------------
+# heartbeat
+
+class Heartbeat:
+    """
+    with Heartbeat(lambda: touch_scan(scan_id, attempt)) as hb:
+        ...
+        if hb.lost.is_set(): 중단
+
+    touch가 실패(rowcount 0)하면 소유권을 잃은 것 -> lost set 후 종료
+    """
+
+    def __init__(self, touch_fn, interval: float = HEARTBEAT_SEC):
+        self.touch_fn = touch_fn
+        self.interval = interval
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 5)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                ok = self.touch_fn()
+            except Exception:
+                # DB 일시 장애는 다음 주기에 다시 시도 (stale 판정은 reaper가)
+                continue
+            if not ok:
+                self.lost.set()
+                return
+
+
+def stale_before() -> datetime:
+    return _now() - timedelta(seconds=HEARTBEAT_STALE_SEC)
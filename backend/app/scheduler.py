@@ -0,0 +1,196 @@
+import os
+import math
+import time
+import redis
+from celery.signals import task_prerun, task_postrun, task_revoked
+from .redis_client import get_redis
+
+# 우선순위 클래스 -> celery queue / 기본 priority (redis transport는 0이 가장 높음)
+PRIORITY_CLASSES = {
+    "interactive": {"queue": "interactive", "base": 0},
+    "batch": {"queue": "batch", "base": 5},
+}
+# worker는 이 순서대로 큐를 확인 (celery_app.conf queue_order_strategy=priority)
+QUEUE_ORDER = ["interactive", "batch"]
+
+DEFAULT_PROJECT = "default"
+
+# 프로젝트별 동시 진행(대기+실행) 작업 상한, 넘으면 batch 최하위로 강등
+PROJECT_MAX_INFLIGHT = int(os.getenv("PROJECT_MAX_INFLIGHT", "8"))
+# 대기시간 추정용 worker 동시 처리 수
+SCHED_WORKER_CONCURRENCY = int(os.getenv("SCHED_WORKER_CONCURRENCY", "4"))
+# 작업 종류별 평균 처리시간 기본값 (측정값이 쌓이기 전)
+DEFAULT_DURATION_SEC = {"scan": 60.0, "llm": 20.0}
+
+SCHED_PREFIX = "fuzzlab:sched"
+INFLIGHT_KEY = f"{SCHED_PREFIX}:inflight"    # hash project -> 진행 중 작업 수
+JOBS_KEY = f"{SCHED_PREFIX}:jobs"            # hash task_id -> "kind|project|queue|priority"
+STARTED_KEY = f"{SCHED_PREFIX}:started"      # hash task_id -> 시작 시각
+
+
+def _pending_key(queue: str) -> str:
+    # 큐 안에서의 순번 계산용 ledger (score = priority, 등록시각)
+    return f"{SCHED_PREFIX}:pending:{queue}"
+
+
+def _avg_key(kind: str) -> str:
+    return f"{SCHED_PREFIX}:avg:{kind}"
+
+
+def plan(project: str, priority_class: str) -> dict:
+    """
+    fair-share: 같은 프로젝트의 진행 중 작업이 많을수록 priority를 낮춘다.
+    한 팀의 대량 업로드가 다른 팀의 interactive 요청을 밀어내지 않도록.
+    """
+    if priority_class not in PRIORITY_CLASSES:
+        raise ValueError(f"unknown priority: {priority_class}")
+
+    cls = PRIORITY_CLASSES[priority_class]
+    inflight = int(get_redis().hget(INFLIGHT_KEY, project) or 0)
+
+    if inflight >= PROJECT_MAX_INFLIGHT:
+        return {"queue": "batch", "priority": 9, "demoted": True}
+
+    priority = min(9, cls["base"] + min(inflight, 4))
+    return {"queue": cls["queue"], "priority": priority, "demoted": False}
+
+
+def submit(task, args: list, kind: str, project: str | None, priority_class: str, task_id: str) -> dict:
+    project = project or DEFAULT_PROJECT
+    p = plan(project, priority_class)
+
+    r = get_redis()
+    pipe = r.pipeline()
+    pipe.zadd(_pending_key(p["queue"]), {task_id: p["priority"] * 1e10 + time.time()})
+    pipe.hset(JOBS_KEY, task_id, f'{kind}|{project}|{p["queue"]}|{p["priority"]}')
+    pipe.hincrby(INFLIGHT_KEY, project, 1)
+    pipe.execute()
+
+    try:
+        task.apply_async(args=args, task_id=task_id, queue=p["queue"], priority=p["priority"])
+    except Exception:
+        # broker에 못 넣었으면 ledger도 되돌림 (inflight가 남으면 해당 project가 계속 강등됨)
+        try:
+            forget(task_id)
+        except redis.RedisError:
+            pass
+        raise
+    return p
+
+
+def _job(task_id: str) -> dict | None:
+    raw = get_redis().hget(JOBS_KEY, task_id)
+    if not raw:
+        return None
+    kind, project, queue, priority = raw.decode().split("|")
+    return {"kind": kind, "project": project, "queue": queue, "priority": int(priority)}
+
+
+def mark_started(task_id: str) -> None:
+    job = _job(task_id)
+    if not job:
+        return
+    pipe = get_redis().pipeline()
+    pipe.zrem(_pending_key(job["queue"]), task_id)
+    pipe.hset(STARTED_KEY, task_id, time.time())
+    pipe.execute()
+
+
+def forget(task_id: str) -> None:
+    """
+    작업 종료/취소 시 호출 (여러 번 불려도 한 번만 반영)
+    """
+    r = get_redis()
+    job = _job(task_id)
+    if not job:
+        return
+    # HDEL 결과로 중복 감소 방지
+    if not r.hdel(JOBS_KEY, task_id):
+        return
+
+    started = r.hget(STARTED_KEY, task_id)
+    pipe = r.pipeline()
+    pipe.zrem(_pending_key(job["queue"]), task_id)
+    pipe.hdel(STARTED_KEY, task_id)
+    pipe.hincrby(INFLIGHT_KEY, job["project"], -1)
+    pipe.execute()
+
+    if started:
+        # 처리시간 이동평균 (대기시간 추정용)
+        duration = time.time() - float(started)
+        prev = r.get(_avg_key(job["kind"]))
+        avg = duration if prev is None else float(prev) * 0.8 + duration * 0.2
+        r.set(_avg_key(job["kind"]), avg)
+
+
+def is_tracked(task_id: str | None) -> bool:
+    # ledger에 남아 있으면 broker 어딘가에 있거나 실행 중 (reaper가 유실 판단에 사용)
+    if not task_id:
+        return False
+    try:
+        return bool(get_redis().hexists(JOBS_KEY, task_id))
+    except Exception:
+        # redis를 못 보면 유실로 판단하지 않음
+        return True
+
+
+def queue_info(task_id: str | None) -> dict | None:
+    """
+    대기 중인 작업의 큐 위치 / 예상 대기시간
+    interactive 큐가 항상 먼저 소비되므로 batch 작업 앞에는 interactive 대기분이 모두 있다.
+    """
+    if not task_id:
+        return None
+    try:
+        job = _job(task_id)
+        if not job:
+            return None
+        r = get_redis()
+        rank = r.zrank(_pending_key(job["queue"]), task_id)
+        if rank is None:
+            # 이미 실행 중
+            return {"queue": job["queue"], "priority": job["priority"], "position": 0, "estimated_wait_sec": 0}
+
+        position = rank
+        for queue in QUEUE_ORDER:
+            if queue == job["queue"]:
+                break
+            position += r.zcard(_pending_key(queue))
+
+        avg = r.get(_avg_key(job["kind"]))
+        avg = float(avg) if avg is not None else DEFAULT_DURATION_SEC.get(job["kind"], 30.0)
+        waves = math.ceil((position + 1) / max(1, SCHED_WORKER_CONCURRENCY))
+
+        return {
+            "queue": job["queue"],
+            "priority": job["priority"],
+            "position": position + 1,
+            "estimated_wait_sec": round(waves * avg, 1),
+        }
+    except redis.RedisError:
+        return None
+
+
+# worker 쪽 ledger 갱신 (tasks.py가 import 하면서 연결됨)
+@task_prerun.connect
+def _on_task_prerun(task_id=None, **kwargs):
+    try:
+        mark_started(task_id)
+    except redis.RedisError:
+        pass
+
+
+@task_postrun.connect
+def _on_task_postrun(task_id=None, **kwargs):
+    try:
+        forget(task_id)
+    except redis.RedisError:
+        pass
+
+
+@task_revoked.connect
+def _on_task_revoked(request=None, **kwargs):
+    try:
+        forget(request.id)
+    except (redis.RedisError, AttributeError):
+        pass
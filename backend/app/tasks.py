@@ -1,31 +1,87 @@
+import os
 import time
 import json
+import queue
+import signal
+import tempfile
+import threading
 import subprocess
 from pathlib import Path
-from datetime import datetime, timezone
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+
+from celery.exceptions import SoftTimeLimitExceeded
+from sqlalchemy import insert, update, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from .celery_app import celery_app
 from .db import SessionLocal
-from .models import Scan, Finding, LLMAnswer
-from .normalize_semgrep import normalize_semgrep_result
-from .ollama_client import call_ollama
-from .llm_service import build_llm_input, make_prompt
+from .models import Scan, Finding, LLMAnswer, Upload
+from .normalize_semgrep import normalize_semgrep_result, finding_fingerprint
+from .ollama_client import call_ollama, validate_answer
+from .llm_service import build_llm_input
+from . import model_router
+from . import response_cache
+from . import scheduler  # worker에서 큐 ledger 갱신 signal도 같이 연결됨
+from . import scan_state
+from . import uploads
+from . import analytics
+from . import exports
+from . import llm_inputs
+from . import profiling
+
+# 단계별 wall-clock 예산(초) - 넘으면 scan을 timed_out 처리
+#   SEMGREP: scan 시작 ~ 마지막 shard의 semgrep 종료
+#   INGEST: semgrep 종료 ~ 남은 결과 정규화 / 저장 완료 (semgrep이 빨리 끝나도 ingest 시간이 늘지 않음)
+SEMGREP_BUDGET_SEC = int(os.getenv("SCAN_SEMGREP_BUDGET_SEC", "1800"))
+INGEST_BUDGET_SEC = int(os.getenv("SCAN_INGEST_BUDGET_SEC", "600"))
+LLM_BUDGET_SEC = int(os.getenv("LLM_BUDGET_SEC", "300"))
+
+# 파이프라인 ingest: semgrep 실행 단위 수 / 단계 사이 queue 크기 / insert batch 크기
+SEMGREP_SHARDS = int(os.getenv("SEMGREP_SHARDS", "4"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+
+# 실행 중 cancel 여부를 DB에서 확인하는 주기
+CANCEL_POLL_SEC = float(os.getenv("CANCEL_POLL_SEC", "1"))
+
+# semgrep 자체 옵션 기본값 (scan별 값이 있으면 그게 우선)
+SEMGREP_DEFAULT_TIMEOUT = os.getenv("SEMGREP_DEFAULT_TIMEOUT")
+SEMGREP_DEFAULT_MAX_MEMORY = os.getenv("SEMGREP_DEFAULT_MAX_MEMORY")
+
 
+# heartbeat가 끊긴 작업을 다시 큐에 넣는 최대 횟수 / queued 상태로 방치된 작업 판정 시간
+MAX_TASK_ATTEMPTS = int(os.getenv("MAX_TASK_ATTEMPTS", "3"))
+QUEUED_LOST_SEC = float(os.getenv("QUEUED_LOST_SEC", "120"))
 
-def set_status(scan_id: str, status: str, error_message: str | None = None):
+
+class ScanCancelled(Exception):
+    pass
+
+
+class StageTimeout(Exception):
+    pass
+
+
+def get_status(scan_id: str) -> str | None:
     db = SessionLocal()
     try:
         scan = db.get(Scan, scan_id)
-        if not scan:
-            return
-        scan.status = status
-        scan.error_message = error_message
-        scan.updated_at = datetime.now(timezone.utc)
-        db.commit()
+        return scan.status if scan else None
     finally:
         db.close()
 
 
+def set_status(
+    scan_id: str,
+    status: str,
+    error_message: str | None = None,
+    attempt: int | None = None,
+) -> bool:
+    # 조건부 전이만 허용 (scan_state.SCAN_TRANSITIONS), attempt를 주면 내 실행분일 때만 반영
+    return scan_state.transition_scan(scan_id, status, attempt=attempt, error_message=error_message)
+
+
 @celery_app.task
 def ping(scan_id: str) -> dict:
     set_status(scan_id, "running")
@@ -47,7 +103,7 @@ def run_semgrep_smoke(target_dir: str) -> dict:
         raise RuntimeError(f"Target dir does not exist: {target_dir}")
 
     cmd = ["semgrep", "--config", "p/default", "--json", str(target)]
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    proc = subprocess.run(cmd, capture_output=True, text=True, timeout=SEMGREP_BUDGET_SEC)
 
     if proc.returncode not in (0, 1):
         raise RuntimeError(f"semgrep failed rc={proc.returncode} stderr={proc.stderr}")
@@ -56,149 +112,823 @@ def run_semgrep_smoke(target_dir: str) -> dict:
     return {"target": target_dir, "results": len(data.get("results", []))}
 
 
+def build_semgrep_cmd(scan: Scan, targets: list[str] | None = None) -> list[str]:
+    cmd = ["semgrep", "--config", "p/default", "--json"]
+
+    timeout = scan.semgrep_timeout or SEMGREP_DEFAULT_TIMEOUT
+    if timeout:
+        cmd += ["--timeout", str(timeout)]
+    max_memory = scan.semgrep_max_memory or SEMGREP_DEFAULT_MAX_MEMORY
+    if max_memory:
+        cmd += ["--max-memory", str(max_memory)]
+
+    cmd += targets or ["."]
+    return cmd
+
+
+def kill_process_group(proc: subprocess.Popen):
+    # semgrep은 내부에서 semgrep-core 등 하위 프로세스를 띄우므로 그룹 단위로 종료
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        proc.wait()
+
+
+def run_semgrep_process(
+    scan_id: str,
+    cmd: list[str],
+    cwd: str,
+    budget_sec: float,
+    stop_event: threading.Event | None = None,
+) -> tuple[int, str, str]:
+    """
+    semgrep 실행 + cancel/timeout 감시
+    - CANCEL_POLL_SEC 마다 scan status 확인 -> cancelled면 ScanCancelled
+      (파이프라인의 다른 단계가 실패해서 stop_event가 set 된 경우도 동일하게 중단)
+    - budget_sec 초과 시 StageTimeout
+    - 어떤 이유로든 빠져나가면 프로세스 그룹 kill (worker slot 즉시 반환)
+    """
+    deadline = time.monotonic() + budget_sec
+
+    # 결과가 클 수 있어서 PIPE 대신 임시파일 (pipe 버퍼 막힘 방지)
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(
+            cmd,
+            cwd=cwd,
+            stdout=out,
+            stderr=err,
+            # 별도 process group -> kill_process_group 으로 semgrep-core까지 정리
+            # (preexec_fn은 파이프라인 스레드가 도는 중에 fork된 자식에서 실행돼 안전하지 않아서 쓰지 않음,
+            #  worker가 통째로 죽은 경우는 reaper가 scan을 다시 큐에 넣음)
+            start_new_session=True,
+        )
+        try:
+            while True:
+                try:
+                    proc.wait(timeout=CANCEL_POLL_SEC)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+
+                if stop_event is not None and stop_event.is_set():
+                    raise ScanCancelled()
+                if get_status(scan_id) == "cancelled":
+                    raise ScanCancelled()
+                if time.monotonic() > deadline:
+                    raise StageTimeout(f"semgrep exceeded {budget_sec:.0f}s budget")
+        except BaseException:
+            kill_process_group(proc)
+            raise
+
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read().decode("utf-8", errors="replace")
+        stderr = err.read().decode("utf-8", errors="replace")
+        return proc.returncode, stdout, stderr
+
+
+def _count_files(path: Path) -> int:
+    if path.is_file():
+        return 1
+    return sum(1 for p in path.rglob("*") if p.is_file())
+
+
+def plan_shards(root: Path, n_shards: int) -> list[list[str]]:
+    """
+    repo를 semgrep 실행 단위(shard)로 나눈다.
+    - 최상위 항목(디렉토리/파일) 단위로 나눠야 semgrep의 ignore 규칙이 그대로 적용됨
+    - zip 안에 폴더 하나만 있는 경우가 많아서, 항목이 하나면 한 단계 내려감
+    - 파일 개수 기준으로 greedy 분배
+
+    의도한 trade-off:
+    - shard마다 semgrep을 따로 실행하므로 rule 로드/파싱(--config p/default)을 shard 수만큼 반복함
+      대신 앞 shard 결과를 정규화/저장하는 동안 다음 shard가 돌고, 진행률(shards_done)을 보여줄 수 있음
+      (semgrep --json은 실행이 끝나야 결과를 내므로 한 프로세스로는 파이프라인이 안 됨)
+    - shard 결과 stdout은 통째로 json.loads -> 최대 메모리는 scan 전체가 아니라 가장 큰 shard 크기에 비례
+    작은 repo거나 rule 로드 비용이 더 크면 SEMGREP_SHARDS=1 로 한 번만 실행
+    """
+    base = root
+    entries = [p for p in base.iterdir() if p.name != ".git"]
+    while len(entries) == 1 and entries[0].is_dir():
+        base = entries[0]
+        entries = [p for p in base.iterdir() if p.name != ".git"]
+
+    if n_shards <= 1 or len(entries) <= 1:
+        return [["."]]
+
+    weighted = sorted(((_count_files(p), p) for p in entries), key=lambda x: x[0], reverse=True)
+    bins = [{"size": 0, "targets": []} for _ in range(min(n_shards, len(entries)))]
+    for size, p in weighted:
+        b = min(bins, key=lambda x: x["size"])
+        b["size"] += size
+        b["targets"].append(p.relative_to(root).as_posix())
+
+    return [b["targets"] for b in bins if b["targets"]]
+
+
+def _put(q: queue.Queue, item, stop_event: threading.Event):
+    # 소비자가 죽었을 때 영원히 막히지 않도록 stop_event 확인하면서 put
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+    raise ScanCancelled()
+
+
+def _semgrep_producer(scan_id, scan, root, shards, raw_q, stop_event, started, semgrep_done):
+    """
+    stage 1: shard 별로 semgrep 실행 -> 결과를 하나씩 raw_q로
+    (다음 shard가 도는 동안 앞 shard 결과가 정규화/저장됨)
+    마지막 semgrep 프로세스가 끝나면 semgrep_done set -> 여기서부터 ingest 예산
+    """
+    try:
+        for done, targets in enumerate(shards):
+            elapsed = time.monotonic() - started
+            remaining = SEMGREP_BUDGET_SEC - elapsed
+            if remaining <= 0:
+                raise StageTimeout(
+                    f"semgrep exceeded {SEMGREP_BUDGET_SEC}s budget ({elapsed:.0f}s, {done}/{len(shards)} shards done)"
+                )
+
+            cmd = build_semgrep_cmd(scan, targets)
+            returncode, stdout, stderr = run_semgrep_process(
+                scan_id, cmd, str(root), remaining, stop_event
+            )
+            if returncode not in (0, 1):
+                raise RuntimeError(stderr)
+            if done == len(shards) - 1:
+                semgrep_done.set()
+
+            for r in json.loads(stdout).get("results", []):
+                _put(raw_q, r, stop_event)
+            _put(raw_q, _SHARD_DONE, stop_event)
+    except BaseException as e:
+        _put_final(raw_q, e, stop_event)
+        return
+    _put_final(raw_q, _END, stop_event)
+
+
+def _normalize_worker(root, raw_q, row_q, stop_event):
+    """
+    stage 2: semgrep 결과 -> Finding insert용 dict
+    """
+    try:
+        while True:
+            try:
+                item = raw_q.get(timeout=0.5)
+            except queue.Empty:
+                if stop_event.is_set():
+                    return
+                continue
+            if item is _END or isinstance(item, BaseException):
+                _put_final(row_q, item, stop_event)
+                return
+            if item is _SHARD_DONE:
+                _put(row_q, item, stop_event)
+                continue
+
+            normalized = normalize_semgrep_result(item, root)
+            loc = normalized.get("location") or {}
+            rule_id = (normalized.get("rule") or {}).get("id")
+            _put(row_q, {
+                "tool": "semgrep",
+                "rule_id": rule_id,
+                "severity": normalized.get("severity"),
+                "message": (normalized.get("rule") or {}).get("name"),
+                "path": loc.get("path"),  # 상대경로
+                "start_line": loc.get("start_line"),
+                "end_line": loc.get("end_line"),
+                "raw_json": item,
+                "normalized_json": normalized,
+                "fingerprint": finding_fingerprint(rule_id, loc.get("path"), item),
+            }, stop_event)
+    except BaseException as e:
+        _put_final(row_q, e, stop_event)
+
+
+def _put_final(q: queue.Queue, item, stop_event: threading.Event):
+    # 종료 표시는 stop 이후에도 최대한 전달 (소비자가 기다리고 있을 수 있음)
+    try:
+        _put(q, item, stop_event)
+    except ScanCancelled:
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            pass
+
+
+# 파이프라인 내부 표시용
+_END = object()
+_SHARD_DONE = object()
+
+
+def _flush_findings(db, scan_id: str, attempt: int, rows: list[dict], shards_done: int):
+    # batch insert + 진행 상황 갱신을 한 트랜잭션으로 -> commit 즉시 report API에 보임
+    # 진행 상황 UPDATE를 attempt 조건으로 걸어서, 소유권을 잃은 worker의 insert는 같이 rollback
+    if rows:
+        for row in rows:
+            row["scan_id"] = scan_id
+        db.execute(insert(Finding), rows)
+    res = db.execute(
+        update(Scan)
+        .where(Scan.scan_id == scan_id, Scan.status == "running", Scan.attempt == attempt)
+        .values(
+            findings_ingested=Scan.findings_ingested + len(rows),
+            shards_done=shards_done,
+            heartbeat_at=datetime.now(timezone.utc),
+            updated_at=datetime.now(timezone.utc),
+        )
+    )
+    if res.rowcount != 1:
+        db.rollback()
+        raise scan_state.LostOwnership()
+    db.commit()
+
+
 @celery_app.task
-def run_semgrep_and_store(scan_id: str) -> dict:
-    set_status(scan_id, "running")
+def run_semgrep_and_store(scan_id: str, profile: str | None = None) -> dict:
+    """
+    semgrep -> normalize -> DB insert 를 순차가 아니라 파이프라인으로 실행
+      [producer: shard별 semgrep] -> raw_q -> [normalize] -> row_q -> [writer: batch insert]
+    queue 크기가 정해져 있어서 메모리는 bounded, 앞 단계가 빠르면 자연스럽게 대기
+
+    queued -> running 을 조건부로 가져간(claim) worker만 실행하고,
+    실행 중에는 heartbeat를 남겨서 worker가 죽으면 reaper가 다시 큐에 넣을 수 있게 한다.
+
+    profile: "sampling" 이면 이 실행을 프로파일링해서 scan에 첨부 (profiling.py, cprofile은 지원 안 함)
+    """
+    # cancel 됐거나 다른 worker가 이미 가져갔으면 실행하지 않음
+    attempt = scan_state.claim_scan(scan_id)
+    if attempt is None:
+        return {"scan_id": scan_id, "status": get_status(scan_id), "skipped": True}
+
+    if profile and profile not in profiling.SCAN_MODES:
+        print(f"[profile] skipped run_semgrep_and_store ({profile} not supported)")
+        profile = None
+    with profiling.profiled(profile, "run_semgrep_and_store", scan_id):
+        return _run_semgrep_and_store(scan_id, attempt)
 
+
+def _run_semgrep_and_store(scan_id: str, attempt: int) -> dict:
     # repo_root는 DB에서 가져옴
     db = SessionLocal()
     try:
         scan = db.get(Scan, scan_id)
-        if not scan or not scan.workspace_path:
+        if not scan.workspace_path:
+            set_status(scan_id, "failed", "workspace_path missing for scan", attempt=attempt)
             raise RuntimeError("workspace_path missing for scan")
         root = Path(scan.workspace_path)
+        shards = plan_shards(root, SEMGREP_SHARDS)
+
+        # 재실행 시 이전 partial 결과 제거
+        db.query(Finding).filter(Finding.scan_id == scan_id).delete()
+        scan.shards_total = len(shards)
+        scan.shards_done = 0
+        scan.findings_ingested = 0
+        db.commit()
+        # producer 스레드에서 semgrep 옵션을 읽으므로 세션에서 분리
+        db.refresh(scan)
+        db.expunge(scan)
     finally:
         db.close()
 
-    cmd = ["semgrep", "--config", "p/default", "--json", "."]
-    proc = subprocess.run(
-        cmd,
-        cwd=str(root),
-        capture_output=True,
-        text=True,
-    )
+    with scan_state.Heartbeat(lambda: scan_state.touch_scan(scan_id, attempt)) as hb:
+        return _run_ingest_pipeline(scan_id, attempt, scan, root, shards, hb)
 
-    if proc.returncode not in (0, 1):
-        set_status(scan_id, "failed", proc.stderr)
-        raise RuntimeError(proc.stderr)
 
-    data = json.loads(proc.stdout)
-    results = data.get("results", [])
+def _run_ingest_pipeline(scan_id: str, attempt: int, scan: Scan, root: Path, shards, hb) -> dict:
+    started = time.monotonic()
+    stop_event = threading.Event()
+    semgrep_done = threading.Event()
+    raw_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    row_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    stages = [
+        threading.Thread(
+            target=_semgrep_producer,
+            args=(scan_id, scan, root, shards, raw_q, stop_event, started, semgrep_done),
+            daemon=True,
+        ),
+        threading.Thread(
+            target=_normalize_worker,
+            args=(root, raw_q, row_q, stop_event),
+            daemon=True,
+        ),
+    ]
+    for t in stages:
+        t.start()
+
+    # stage 3 (writer): 현재 스레드에서 batch insert
+    # ingest 예산은 semgrep이 끝난 시점부터 (그 전까지는 producer의 semgrep 예산)
+    ingest_deadline = None
+    total = 0
+    shards_done = 0
+    batch: list[dict] = []
+    last_check = time.monotonic()
 
     db = SessionLocal()
     try:
-        for r in results:
-            normalized = normalize_semgrep_result(r, root)
-            loc = normalized.get("location") or {}
+        while True:
+            try:
+                item = row_q.get(timeout=CANCEL_POLL_SEC)
+            except queue.Empty:
+                item = None
 
-            db.add(
-                Finding(
-                    scan_id=scan_id,
-                    tool="semgrep",
-                    rule_id=(normalized.get("rule") or {}).get("id"),
-                    severity=normalized.get("severity"),
-                    message=(normalized.get("rule") or {}).get("name"),
-                    path=loc.get("path"),  # 상대경로
-                    start_line=loc.get("start_line"),
-                    end_line=loc.get("end_line"),
-                    raw_json=r,
-                    normalized_json=normalized,
-                )
+            if item is _END:
+                _flush_findings(db, scan_id, attempt, batch, shards_done)
+                total += len(batch)
+                break
+            if isinstance(item, BaseException):
+                raise item
+            if item is _SHARD_DONE:
+                shards_done += 1
+            elif item is not None:
+                batch.append(item)
+
+            if len(batch) >= INGEST_BATCH_SIZE or item is _SHARD_DONE:
+                _flush_findings(db, scan_id, attempt, batch, shards_done)
+                total += len(batch)
+                batch = []
+
+            if ingest_deadline is None and semgrep_done.is_set():
+                ingest_deadline = time.monotonic() + INGEST_BUDGET_SEC
+
+            if time.monotonic() - last_check >= CANCEL_POLL_SEC:
+                last_check = time.monotonic()
+                if hb.lost.is_set():
+                    raise scan_state.LostOwnership()
+                if get_status(scan_id) == "cancelled":
+                    raise ScanCancelled()
+                if ingest_deadline is not None and last_check > ingest_deadline:
+                    raise StageTimeout(
+                        f"ingest exceeded {INGEST_BUDGET_SEC}s budget after semgrep finished ({shards_done}/{len(shards)} shards stored)"
+                    )
+
+    except (ScanCancelled, scan_state.LostOwnership):
+        # cancel / reaper 재할당 -> 상태는 이미 다른 쪽에서 바꿨으므로 건드리지 않음
+        db.rollback()
+        return {"scan_id": scan_id, "status": get_status(scan_id), "findings": total}
+    except StageTimeout as e:
+        db.rollback()
+        set_status(scan_id, "timed_out", str(e), attempt=attempt)
+        return {"scan_id": scan_id, "status": "timed_out", "findings": total}
+    except Exception as e:
+        db.rollback()
+        set_status(scan_id, "failed", str(e), attempt=attempt)
+        raise
+    finally:
+        # 어느 단계에서 끝났든 나머지 단계(semgrep 프로세스 포함) 정리
+        stop_event.set()
+        for t in stages:
+            t.join(timeout=10)
+        db.close()
+
+    if not set_status(scan_id, "done", attempt=attempt):
+        return {"scan_id": scan_id, "status": get_status(scan_id), "findings": total}
+
+    # cross-scan 통계 rollup (실패해도 scan 결과에는 영향 없음, analytics.backfill 로 다시 반영 가능)
+    try:
+        analytics.record_scan(scan_id)
+    except Exception as e:
+        print(f"[worker] analytics rollup failed scan_id={scan_id}: {e}")
+    # SARIF/CSV 미리 만들기 (실패하면 다운로드 시점에 다시 요청됨)
+    try:
+        request_export_render(scan_id, scan.project_name)
+    except Exception as e:
+        print(f"[worker] export render request failed scan_id={scan_id}: {e}")
+    return {"scan_id": scan_id, "findings": total}
+
+
+def _discarded(scan_id: str, group_id: str, attempt: int) -> dict:
+    return {"scan_id": scan_id, "group_id": group_id, "status": "discarded", "attempt": attempt}
+
+
+def _ensure_answer_placeholder(scan_id: str, group_id: str, model: str | None, profile: str | None, reuse: bool):
+    # API를 거치지 않고 task만 직접 보낸 경우에도 상태 전이(queued -> running)가 가능하도록
+    db = SessionLocal()
+    try:
+        db.execute(
+            pg_insert(LLMAnswer)
+            .values(
+                scan_id=scan_id, group_id=group_id, model=model or "auto", prompt="", status="queued",
+                reuse=reuse, task_profile=profile,
             )
+            .on_conflict_do_nothing(index_elements=["scan_id", "group_id"])
+        )
         db.commit()
     finally:
         db.close()
 
-    set_status(scan_id, "done")
-    return {"scan_id": scan_id, "findings": len(results)}
-
 
-@celery_app.task
-def generate_llm_answer_for_group(scan_id: str, group_id: str, model: str = "llama3.1:8b") -> dict:
+@celery_app.task(soft_time_limit=LLM_BUDGET_SEC, time_limit=LLM_BUDGET_SEC + 30)
+def generate_llm_answer_for_group(
+    scan_id: str,
+    group_id: str,
+    model: str | None = None,
+    profile: str | None = None,
+    reuse: bool = False,
+) -> dict:
     """
     1) scan_id + group_id로 llm-input 생성
     2) prompt 생성
-    3) Ollama 호출 (JSON 고정)
-    4) llm_answers 테이블에 upsert 저장
+    3) 모델 선택 (model 미지정 시 model_router가 severity/score/rule로 tier 결정)
+    4) Ollama 호출 (JSON 고정), small tier 답이 스키마 파싱 실패면 large로 한 번 더
+    5) llm_answers 에 결과 저장 (실제 사용한 model / tier / 지연 / 토큰 기록)
 
     안정화(중요):
-    - placeholder row가 이미 만들어져 있다고 가정하고(status=queued)
-      task 시작 시 running으로 바꾼다.
+    - queued -> running 을 조건부로 가져간(claim) worker만 실행 (중복 실행 방지)
+    - 결과 저장도 "status=running AND attempt=내 attempt" 조건부 UPDATE
+      -> cancel 되었거나 reaper가 다시 큐에 넣은 뒤면 늦게 끝난 결과는 버려짐
+
+    profile: "sampling" / "cprofile" 이면 이 실행을 프로파일링해서 scan에 첨부 (profiling.py)
+    reuse=True 면 같은 입력 + 템플릿 + 모델로 이미 성공한 답(다른 scan 포함)이 있을 때 LLM 호출 없이 복사
+    """
+    _ensure_answer_placeholder(scan_id, group_id, model, profile, reuse)
+    attempt = scan_state.claim_answer(scan_id, group_id)
+    if attempt is None:
+        return {"scan_id": scan_id, "group_id": group_id, "skipped": True}
+
+    with profiling.profiled(profile, "generate_llm_answer_for_group", scan_id):
+        return _generate_llm_answer_for_group(scan_id, group_id, model, attempt, reuse)
+
+
+def _generate_llm_answer_for_group(scan_id: str, group_id: str, model: str | None, attempt: int, reuse: bool = False) -> dict:
+    prepared = None
+    route = {"tier": model_router.tier_of(model) if model else None, "model": model}
+    # cancel은 worker를 죽이지 않고(SIGKILL X) 상태만 바꿈 -> heartbeat 실패(hb.lost)를 보고 다음 호출 전에 중단
+    with scan_state.Heartbeat(lambda: scan_state.touch_answer(scan_id, group_id, attempt)) as hb:
+        db = SessionLocal()
+        try:
+            # 순환 import 방지: group_findings만 지연 import
+            from .main import group_findings
+
+            llm_input = build_llm_input(db, scan_id, group_id, group_findings)
+            # 입력 blob은 해시로 한 번만 저장 (프롬프트 전문은 DB에 저장하지 않음)
+            prepared = llm_inputs.prepare(llm_input)
+            llm_inputs.store(prepared)
+        except Exception as e:
+            _record_answer_failure(scan_id, group_id, attempt, route, prepared, e)
+            raise
+        finally:
+            db.close()
+
+        try:
+            if not model:
+                route = model_router.route(llm_input["group"])
+
+            # 같은 입력 + 템플릿 + 모델로 이미 성공한 답이 있으면 재사용 (자동 라우팅이면 escalation 모델까지 확인)
+            candidates = [route] if reuse else []
+            if reuse and not model and model_router.escalate(route["tier"]):
+                candidates.append(model_router.escalate(route["tier"]))
+            for candidate in candidates:
+                reused = llm_inputs.find_reusable(prepared["input_hash"], prepared["prompt_version"], candidate["model"])
+                if reused:
+                    return _store_reused_answer(scan_id, group_id, attempt, candidate, prepared, reused)
+
+            if hb.lost.is_set():
+                return _discarded(scan_id, group_id, attempt)
+            stats = {}
+            t0 = time.monotonic()
+            resp = call_ollama(model=route["model"], prompt=prepared["prompt"], stats=stats)
+
+            escalated = False
+            # 작은 모델이 스키마를 못 맞추면(JSON 아님 / 필수 키 누락 / enum 밖 값) 큰 모델로 재시도
+            next_route = model_router.retry_route(route, validate_answer(resp), auto=not model)
+            if next_route:
+                if hb.lost.is_set():
+                    return _discarded(scan_id, group_id, attempt)
+                first_stats = stats
+                stats = {}
+                resp = call_ollama(model=next_route["model"], prompt=prepared["prompt"], stats=stats)
+                for k in ("prompt_tokens", "completion_tokens"):
+                    stats[k] = (stats.get(k) or 0) + (first_stats.get(k) or 0)
+                route = next_route
+                escalated = True
+            latency_ms = int((time.monotonic() - t0) * 1000)
+        except Exception as e:
+            _record_answer_failure(scan_id, group_id, attempt, route, prepared, e)
+            raise
+
+    valid = validate_answer(resp)
+    status = "done" if valid else "failed_parse"
+    applied = scan_state.transition_answer(
+        scan_id,
+        group_id,
+        status,
+        attempt=attempt,
+        model=route["model"],
+        tier=route["tier"],
+        escalated=escalated,
+        latency_ms=latency_ms,
+        prompt_tokens=stats.get("prompt_tokens"),
+        completion_tokens=stats.get("completion_tokens"),
+        response_json=resp if valid else None,
+        # 스키마가 안 맞는 JSON도 확인할 수 있게 원문으로
+        response_text=None if valid else (resp if isinstance(resp, str) else json.dumps(resp, ensure_ascii=False)),
+        reused_from_id=None,
+        **_input_values(prepared),
+    )
+    if not applied:
+        # cancel / 재할당 이후에 끝난 결과 -> 저장하지 않음
+        return _discarded(scan_id, group_id, attempt)
+
+    response_cache.invalidate_scan(scan_id)
+    return {
+        "scan_id": scan_id,
+        "group_id": group_id,
+        "status": status,
+        "model": route["model"],
+        "tier": route["tier"],
+        "escalated": escalated,
+    }
+
+
+def _input_values(prepared: dict | None) -> dict:
+    # llm_answers에는 프롬프트 전문 대신 템플릿 버전 + 입력 해시
+    if not prepared:
+        return {}
+    return {"prompt": "", "prompt_version": prepared["prompt_version"], "input_hash": prepared["input_hash"]}
+
+
+def _store_reused_answer(scan_id: str, group_id: str, attempt: int, route: dict, prepared: dict, reused: dict) -> dict:
+    applied = scan_state.transition_answer(
+        scan_id,
+        group_id,
+        "done",
+        attempt=attempt,
+        model=route["model"],
+        tier=reused["tier"] or route["tier"],
+        escalated=reused["escalated"],
+        latency_ms=0,
+        prompt_tokens=None,
+        completion_tokens=None,
+        response_json=reused["response_json"],
+        response_text=None,
+        reused_from_id=reused["id"],
+        **_input_values(prepared),
+    )
+    if not applied:
+        return _discarded(scan_id, group_id, attempt)
+    response_cache.invalidate_scan(scan_id)
+    return {
+        "scan_id": scan_id,
+        "group_id": group_id,
+        "status": "done",
+        "model": route["model"],
+        "reused_from_id": reused["id"],
+    }
+
+
+def _record_answer_failure(scan_id: str, group_id: str, attempt: int, route: dict, prepared: dict | None, e: Exception):
+    # 실패도 DB에 남기기 (내 attempt일 때만)
+    values = {"tier": route["tier"], "response_json": None, **_input_values(prepared)}
+    if route["model"]:
+        values["model"] = route["model"]
+    if isinstance(e, SoftTimeLimitExceeded):
+        status = "timed_out"
+        values["response_text"] = f"llm call exceeded {LLM_BUDGET_SEC}s budget"
+    else:
+        status = "failed_call"
+        values["response_text"] = str(e)
+    if scan_state.transition_answer(scan_id, group_id, status, attempt=attempt, **values):
+        response_cache.invalidate_scan(scan_id)
+
+
+def _requeue_scan(db, scan: Scan, from_status: str) -> bool:
     """
+    heartbeat가 끊긴 running scan / broker에서 사라진 queued scan을 다시 큐에 넣음
+    attempt + task_id 조건부 -> reaper가 여러 개 돌아도 한 번만 반영
+    """
+    new_task_id = str(uuid4())
+    ok = scan_state.transition_scan(
+        scan.scan_id,
+        "queued",
+        attempt=scan.attempt,
+        from_statuses=[from_status],
+        conditions=[Scan.task_id == scan.task_id] if scan.task_id else [Scan.task_id.is_(None)],
+        task_id=new_task_id,
+        heartbeat_at=datetime.now(timezone.utc),
+    )
+    if not ok:
+        return False
+    if scan.task_id:
+        scheduler.forget(scan.task_id)
+    scheduler.submit(
+        run_semgrep_and_store, [scan.scan_id],
+        kind="scan", project=scan.project_name, priority_class=scan.priority or "batch", task_id=new_task_id,
+    )
+    return True
+
+
+def _requeue_answer(db, row: LLMAnswer, from_status: str) -> bool:
+    new_task_id = str(uuid4())
+    ok = scan_state.transition_answer(
+        row.scan_id,
+        row.group_id,
+        "queued",
+        attempt=row.attempt,
+        from_statuses=[from_status],
+        conditions=[LLMAnswer.task_id == row.task_id] if row.task_id else [LLMAnswer.task_id.is_(None)],
+        task_id=new_task_id,
+        heartbeat_at=datetime.now(timezone.utc),
+    )
+    if not ok:
+        return False
+    if row.task_id:
+        scheduler.forget(row.task_id)
+    scan = db.get(Scan, row.scan_id)
+    # queued / running 동안 자동 라우팅은 model="auto" 로 남아 있음 (실제 모델은 완료 시 기록)
+    # -> 사용자가 직접 지정한 모델 / 재사용 / 프로파일 옵션은 그대로 다시 사용
+    model = None if row.model == "auto" else row.model
+    scheduler.submit(
+        generate_llm_answer_for_group, [row.scan_id, row.group_id, model, row.task_profile, row.reuse],
+        kind="llm",
+        project=scan.project_name if scan else None,
+        priority_class=(scan.priority if scan else None) or "batch",
+        task_id=new_task_id,
+    )
+    return True
+
+
+@celery_app.task
+def reap_stale_work() -> dict:
+    """
+    celery beat로 주기 실행 (celery_app.beat_schedule)
+    - running 인데 heartbeat가 HEARTBEAT_STALE_SEC 넘게 끊김 -> worker가 죽은 것
+      -> attempt가 MAX_TASK_ATTEMPTS 미만이면 queued로 되돌리고 다시 제출, 넘으면 failed
+    - queued 인데 scheduler ledger에 없음 (broker 유실 등) -> 다시 제출
+    """
+    stale = scan_state.stale_before()
+    lost_before = datetime.now(timezone.utc) - timedelta(seconds=QUEUED_LOST_SEC)
+    out = {"requeued": 0, "failed": 0, "resubmitted": 0}
+
     db = SessionLocal()
-    prompt = ""
     try:
-        # ✅ Step 6: 작업 시작 표시 (queued -> running)
-        row = (
-            db.query(LLMAnswer)
-            .filter(LLMAnswer.scan_id == scan_id, LLMAnswer.group_id == group_id)
-            .first()
-        )
-        if row:
-            row.status = "running"
-            db.commit()
+        scans = db.query(Scan).filter(
+            Scan.status == "running",
+            or_(Scan.heartbeat_at.is_(None), Scan.heartbeat_at < stale),
+        ).all()
+        for scan in scans:
+            if scan.attempt >= MAX_TASK_ATTEMPTS:
+                if set_status(scan.scan_id, "failed", f"worker lost {scan.attempt} times", attempt=scan.attempt):
+                    out["failed"] += 1
+                    response_cache.invalidate_scan(scan.scan_id)
+            elif _requeue_scan(db, scan, "running"):
+                out["requeued"] += 1
 
-        # 순환 import 방지: group_findings만 지연 import
-        from .main import group_findings
+        answers = db.query(LLMAnswer).filter(
+            LLMAnswer.status == "running",
+            or_(LLMAnswer.heartbeat_at.is_(None), LLMAnswer.heartbeat_at < stale),
+        ).all()
+        for row in answers:
+            if row.attempt >= MAX_TASK_ATTEMPTS:
+                if scan_state.transition_answer(
+                    row.scan_id, row.group_id, "failed_call", attempt=row.attempt,
+                    response_text=f"worker lost {row.attempt} times",
+                ):
+                    out["failed"] += 1
+                    response_cache.invalidate_scan(row.scan_id)
+            elif _requeue_answer(db, row, "running"):
+                out["requeued"] += 1
 
-        llm_input = build_llm_input(db, scan_id, group_id, group_findings)
-        prompt = make_prompt(llm_input)
+        # queued 시각은 heartbeat_at(없으면 created_at/updated_at)으로 판단
+        queued_scans = db.query(Scan).filter(
+            Scan.status == "queued",
+            func.coalesce(Scan.heartbeat_at, Scan.updated_at) < lost_before,
+        ).all()
+        for scan in queued_scans:
+            if not scheduler.is_tracked(scan.task_id) and _requeue_scan(db, scan, "queued"):
+                out["resubmitted"] += 1
 
-        resp = call_ollama(model=model, prompt=prompt)
+        queued_answers = db.query(LLMAnswer).filter(
+            LLMAnswer.status == "queued",
+            func.coalesce(LLMAnswer.heartbeat_at, LLMAnswer.created_at) < lost_before,
+        ).all()
+        for row in queued_answers:
+            if not scheduler.is_tracked(row.task_id) and _requeue_answer(db, row, "queued"):
+                out["resubmitted"] += 1
+    finally:
+        db.close()
 
-        # upsert (scan_id, group_id 유니크)
-        row = (
-            db.query(LLMAnswer)
-            .filter(LLMAnswer.scan_id == scan_id, LLMAnswer.group_id == group_id)
-            .first()
-        )
-        if not row:
-            # placeholder가 없더라도 안전하게 생성
-            row = LLMAnswer(
-                scan_id=scan_id,
-                group_id=group_id,
-                model=model,
-                prompt=prompt,
-                status="running",
-            )
-            db.add(row)
-        else:
-            row.model = model
-            row.prompt = prompt
-
-        if isinstance(resp, dict):
-            row.response_json = resp
-            row.response_text = None
-            row.status = "done"
-        else:
-            row.response_json = None
-            row.response_text = resp
-            row.status = "failed_parse"
+    return out
 
-        db.commit()
-        return {"scan_id": scan_id, "group_id": group_id, "status": row.status}
 
-    except Exception as e:
-        # 실패도 DB에 남기기
-        row = (
-            db.query(LLMAnswer)
-            .filter(LLMAnswer.scan_id == scan_id, LLMAnswer.group_id == group_id)
-            .first()
-        )
-        if not row:
-            row = LLMAnswer(
-                scan_id=scan_id,
-                group_id=group_id,
-                model=model,
-                prompt=prompt,
+@celery_app.task
+def run_upload_finalize(upload_id: str) -> dict:
+    """
+    POST /uploads/{upload_id}/finalize 뒤 실행: 전체 체크섬 확인 -> 압축 해제 + scan 생성 / 제출 (_start_scan)
+    결과는 uploads row에 남김 (finalized + scan_id / failed + error_message)
+    """
+    from .main import _start_scan  # main이 tasks를 import 하므로 여기서
+
+    db = SessionLocal()
+    try:
+        upload = db.get(Upload, upload_id)
+        if upload:
+            db.expunge(upload)
+        # worker가 죽어서 다시 전달된 경우: scan 생성까지 끝났으면 finalized 로만 정리
+        scan_exists = bool(upload) and db.get(Scan, upload.scan_id) is not None
+    finally:
+        db.close()
+    if not upload or upload.status != "finalizing":
+        return {"upload_id": upload_id, "skipped": True}
+
+    if not scan_exists:
+        zip_path = uploads.zip_path(upload.scan_id)
+        if upload.sha256 and uploads.file_sha256(zip_path) != upload.sha256:
+            if uploads.set_status(upload_id, "failed", from_status="finalizing", error_message="file checksum mismatch"):
+                uploads.remove(upload.scan_id)
+            uploads.forget_chunks(upload_id)
+            return {"upload_id": upload_id, "status": "failed"}
+
+        try:
+            _start_scan(
+                upload.scan_id, zip_path,
+                upload.project_name, upload.semgrep_timeout, upload.semgrep_max_memory, upload.priority,
             )
-            db.add(row)
+        except Exception as e:
+            # HTTPException(503)이면 detail에 scan 상태가 들어 있음
+            uploads.set_status(upload_id, "failed", from_status="finalizing", error_message=str(getattr(e, "detail", e)))
+            uploads.forget_chunks(upload_id)
+            return {"upload_id": upload_id, "status": "failed"}
+
+    uploads.set_status(upload_id, "finalized", from_status="finalizing")
+    uploads.forget_chunks(upload_id)
+    return {"upload_id": upload_id, "scan_id": upload.scan_id, "status": "finalized"}
 
-        row.response_json = None
-        row.response_text = str(e)
-        row.status = "failed_call"
-        db.commit()
-        raise
 
+@celery_app.task
+def expire_uploads() -> dict:
+    """
+    celery beat로 주기 실행: 분할 업로드 정리
+    - uploading 인데 기한(expires_at)이 지남 -> 더 이상 chunk가 오지 않음
+    - finalizing 인데 UPLOAD_FINALIZE_STALE_SEC 넘게 그대로(updated_at) -> finalize 작업이 유실됨
+    상태 조건부 변경(-> expired)에 성공한 것만 파일 삭제 (finalize와 경합 방지)
+    """
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=uploads.UPLOAD_FINALIZE_STALE_SEC)
+    conditions = [
+        (Upload.status == "uploading", Upload.expires_at < now),
+        (Upload.status == "finalizing", Upload.updated_at < stale_before),
+    ]
+    expired = 0
+    db = SessionLocal()
+    try:
+        for cond in conditions:
+            rows = db.query(Upload).filter(*cond).all()
+            for upload in rows:
+                res = db.execute(
+                    update(Upload)
+                    .where(Upload.upload_id == upload.upload_id, *cond)
+                    .values(status="expired", updated_at=now)
+                )
+                db.commit()
+                if res.rowcount != 1:
+                    continue
+                uploads.remove(upload.scan_id)
+                uploads.forget_chunks(upload.upload_id)
+                expired += 1
     finally:
         db.close()
+    return {"expired": expired}
+
+
+@celery_app.task
+def expire_profiles() -> dict:
+    # celery beat로 주기 실행: PROFILE_RETENTION_SEC 지난 프로파일 파일 / row 삭제
+    return {"expired": profiling.expire()}
+
+
+def request_export_render(scan_id: str, project: str | None = None) -> bool:
+    # 완료된 scan의 SARIF/CSV gzip 파일 생성 요청 (이미 진행 중이면 건너뜀)
+    if not exports.claim_render(scan_id):
+        return False
+    try:
+        scheduler.submit(
+            render_exports, [scan_id],
+            kind="export", project=project, priority_class="batch", task_id=str(uuid4()),
+        )
+    except Exception:
+        exports.release_render(scan_id)
+        raise
+    return True
+
+
+@celery_app.task
+def render_exports(scan_id: str) -> dict:
+    try:
+        if get_status(scan_id) != "done":
+            return {"scan_id": scan_id, "skipped": True}
+        return exports.render(scan_id)
+    finally:
+        exports.release_render(scan_id)
@@ -0,0 +1,180 @@
+import os
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .db import SessionLocal
+from .models import Upload, UploadChunk
+
+# 분할 업로드 설정
+# chunk 크기는 client가 정할 수 있지만 이 범위 안에서만 (너무 작으면 요청 수가, 크면 재전송 비용이 커짐)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_MIN_CHUNK_SIZE = int(os.getenv("UPLOAD_MIN_CHUNK_SIZE", str(256 * 1024)))
+UPLOAD_MAX_CHUNK_SIZE = int(os.getenv("UPLOAD_MAX_CHUNK_SIZE", str(64 * 1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024 * 1024)))
+# 마지막 chunk 이후 이 시간 동안 진행이 없으면 만료
+UPLOAD_TTL_SEC = int(os.getenv("UPLOAD_TTL_SEC", str(24 * 3600)))
+# finalize(체크섬 + 압축 해제) 작업이 이 시간 넘게 끝나지 않으면 worker가 죽은 것으로 보고 만료
+UPLOAD_FINALIZE_STALE_SEC = int(os.getenv("UPLOAD_FINALIZE_STALE_SEC", str(2 * 3600)))
+
+
+def workspace_dir(scan_id: str) -> Path:
+    # POST /scan 과 같은 위치 (workspace/<scan_id>/upload.zip, src/)
+    return Path("workspace") / scan_id
+
+
+def zip_path(scan_id: str) -> Path:
+    return workspace_dir(scan_id) / "upload.zip"
+
+
+def chunk_count(total_size: int, chunk_size: int) -> int:
+    return max(1, -(-total_size // chunk_size))
+
+
+def expected_length(total_size: int, chunk_size: int, index: int) -> int:
+    # 마지막 chunk만 짧을 수 있음
+    return min(chunk_size, total_size - index * chunk_size)
+
+
+def next_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=UPLOAD_TTL_SEC)
+
+
+def allocate(scan_id: str, total_size: int) -> Path:
+    # 전체 크기로 미리 잡아두면(sparse) 각 chunk를 offset에 바로 쓸 수 있음 -> 병렬 업로드 가능
+    path = zip_path(scan_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as f:
+        f.truncate(total_size)
+    return path
+
+
+def open_for_chunk(scan_id: str) -> int:
+    return os.open(zip_path(scan_id), os.O_WRONLY)
+
+
+def write_at(fd: int, data: bytes, offset: int) -> None:
+    # 서로 다른 offset이면 여러 요청이 동시에 써도 안전 (seek 공유 없음)
+    view = memoryview(data)
+    while view:
+        n = os.pwrite(fd, view, offset)
+        view = view[n:]
+        offset += n
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def remove(scan_id: str) -> None:
+    shutil.rmtree(workspace_dir(scan_id), ignore_errors=True)
+
+
+def set_status(upload_id: str, status: str, from_status: str, error_message: str | None = None) -> bool:
+    # from_status일 때만 변경 (API / finalize task / expire_uploads 경합 방지)
+    db = SessionLocal()
+    try:
+        res = db.execute(
+            update(Upload)
+            .where(Upload.upload_id == upload_id, Upload.status == from_status)
+            .values(status=status, error_message=error_message, updated_at=datetime.now(timezone.utc))
+        )
+        db.commit()
+        return res.rowcount == 1
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# chunk 수신: 임시 파일(stage)에 받고 -> 체크섬이 맞으면 최종 파일에 기록
+# 체크섬이 틀리거나 전송이 끊긴 chunk는 최종 파일을 건드리지 않음 (이미 받은 chunk를 다시 보낸 경우도)
+
+def open_stage(scan_id: str, index: int) -> tuple[int, str]:
+    d = workspace_dir(scan_id) / "chunks"
+    d.mkdir(parents=True, exist_ok=True)
+    return tempfile.mkstemp(dir=d, prefix=f"{index}-", suffix=".part")
+
+
+def discard_stage(stage: str) -> None:
+    try:
+        os.unlink(stage)
+    except FileNotFoundError:
+        pass
+
+
+def commit_chunk(upload_id: str, scan_id: str, index: int, offset: int, stage: str) -> bool:
+    """
+    체크섬이 확인된 chunk를 최종 파일 offset에 기록 + 받은 목록(upload_chunks)에 추가
+    upload row를 FOR SHARE로 잡은 상태에서 status=uploading일 때만 기록
+    -> finalize(status 변경 UPDATE)는 진행 중인 기록이 끝날 때까지 기다리고,
+       finalize가 먼저 시작됐으면 False (파일을 건드리지 않음)
+    FOR SHARE끼리는 막지 않으므로 chunk 여러 개를 동시에 기록할 수 있음
+    """
+    db = SessionLocal()
+    try:
+        status = db.execute(
+            select(Upload.status).where(Upload.upload_id == upload_id).with_for_update(read=True)
+        ).scalar_one_or_none()
+        if status != "uploading":
+            db.rollback()
+            return False
+
+        fd = open_for_chunk(scan_id)
+        try:
+            with open(stage, "rb") as src:
+                pos = offset
+                for block in iter(lambda: src.read(1024 * 1024), b""):
+                    write_at(fd, block, pos)
+                    pos += len(block)
+        finally:
+            os.close(fd)
+
+        db.execute(
+            pg_insert(UploadChunk)
+            .values(upload_id=upload_id, chunk_index=index)
+            .on_conflict_do_nothing(index_elements=["upload_id", "chunk_index"])
+        )
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# 받은 chunk 목록 (DB, 최종 파일 기록까지 끝난 것만)
+# redis(TTL + volatile-lru)에 두면 eviction 때 진행 상황이 조용히 사라지므로 upload_chunks 테이블에 둔다
+
+def received(upload_id: str) -> set[int]:
+    db = SessionLocal()
+    try:
+        return set(
+            db.execute(select(UploadChunk.chunk_index).where(UploadChunk.upload_id == upload_id)).scalars()
+        )
+    finally:
+        db.close()
+
+
+def missing(upload_id: str, total_chunks: int) -> list[int]:
+    got = received(upload_id)
+    return [i for i in range(total_chunks) if i not in got]
+
+
+def forget_chunks(upload_id: str) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(delete(UploadChunk).where(UploadChunk.upload_id == upload_id))
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,202 @@
+"""
+벤치마크/테스트용 가짜 Ollama 서버 (/api/generate, /api/chat, /api/ps, /api/tags)
+
+    python -m bench.fake_ollama --port 11500 --latency-ms 200 --tokens 120 --token-rate 40
+
+- latency-ms : 요청당 고정 지연 (모델 로드/프롬프트 처리 흉내)
+- tokens / token-rate : 생성 토큰 수 / 초당 토큰 -> tokens / token-rate 초 만큼 추가 지연
+- cold-load-ms / --loaded : 로드 안 된 모델을 처음 부를 때 추가 지연 (model affinity 확인용)
+- format 으로 schema(dict)가 오면 required 필드를 채운 JSON을 돌려준다
+- /api/chat 은 stream=true 이면 NDJSON 조각을 token-rate 에 맞춰 나눠 보낸다
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def fake_answer(fmt) -> str:
+    fields = ["summary", "risk_level", "reasoning", "impact", "recommendation", "safe_example"]
+    if isinstance(fmt, dict):
+        fields = fmt.get("required") or list((fmt.get("properties") or {}).keys()) or fields
+    out = {}
+    for f in fields:
+        out[f] = "medium" if f == "risk_level" else f"synthetic {f}"
+    return json.dumps(out)
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    # 서버 설정은 make_server에서 주입
+    config: dict = {}
+    stats: dict = {}
+    lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        if self.config.get("verbose"):
+            super().log_message(fmt, *args)
+
+    def _send_json(self, code: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _generation_delay(self) -> tuple[float, int]:
+        cfg = self.config
+        tokens = cfg["tokens"]
+        delay = cfg["latency_ms"] / 1000 + (tokens / cfg["token_rate"] if cfg["token_rate"] else 0)
+        return delay, tokens
+
+    def do_GET(self):
+        if self.path in ("/api/ps", "/api/tags"):
+            with self.lock:
+                models = sorted(self.config["loaded"])
+            self._send_json(200, {"models": [{"name": m, "model": m} for m in models]})
+            return
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        req = self._read_json()
+        model = req.get("model")
+        with self.lock:
+            self.stats["requests"] = self.stats.get("requests", 0) + 1
+            cold = model not in self.config["loaded"]
+            self.config["loaded"].add(model)
+
+        if random.random() < self.config.get("fail_rate", 0.0):
+            self._send_json(500, {"error": "synthetic failure"})
+            return
+
+        delay, tokens = self._generation_delay()
+        if cold:
+            delay += self.config["cold_load_ms"] / 1000
+
+        if self.path == "/api/chat":
+            self._chat(req, delay, tokens)
+            return
+
+        time.sleep(delay)
+
+        self._send_json(200, {
+            "model": req.get("model"),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": fake_answer(req.get("format")),
+            "done": True,
+            "total_duration": int(delay * 1e9),
+            "prompt_eval_count": len(req.get("prompt", "")) // 4,
+            "eval_count": tokens,
+        })
+
+
+    def _chat(self, req: dict, delay: float, tokens: int):
+        content = fake_answer(req.get("format")) if req.get("format") else "synthetic chat reply"
+        prompt_chars = sum(len(m.get("content") or "") for m in req.get("messages") or [])
+        final = {
+            "model": req.get("model"),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "total_duration": int(delay * 1e9),
+            "prompt_eval_count": prompt_chars // 4,
+            "eval_count": tokens,
+        }
+        if req.get("stream") is False:
+            time.sleep(delay)
+            final["message"]["content"] = content
+            self._send_json(200, final)
+            return
+
+        # 고정 지연 후 content를 여러 조각으로 나눠 전송 (HTTP/1.0 -> 연결 종료로 끝 표시)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        time.sleep(self.config["latency_ms"] / 1000)
+        n = max(1, min(tokens, len(content)))
+        step = -(-len(content) // n)
+        per_piece = (delay - self.config["latency_ms"] / 1000) / n
+        for i in range(0, len(content), step):
+            time.sleep(per_piece)
+            chunk = {"model": req.get("model"), "message": {"role": "assistant", "content": content[i:i + step]}, "done": False}
+            self.wfile.write(json.dumps(chunk).encode("utf-8") + b"\n")
+            self.wfile.flush()
+        self.wfile.write(json.dumps(final).encode("utf-8") + b"\n")
+
+
+def make_server(
+    port: int = 11500,
+    host: str = "127.0.0.1",
+    latency_ms: float = 200,
+    tokens: int = 120,
+    token_rate: float = 40,
+    fail_rate: float = 0.0,
+    cold_load_ms: float = 0,
+    loaded: list[str] | None = None,
+    verbose: bool = False,
+) -> ThreadingHTTPServer:
+    # 서버마다 설정이 다르도록 handler 클래스를 새로 만든다 (여러 대 동시 실행용)
+    handler = type("Handler", (FakeOllamaHandler,), {
+        "config": {
+            "latency_ms": latency_ms,
+            "tokens": tokens,
+            "token_rate": token_rate,
+            "fail_rate": fail_rate,
+            "cold_load_ms": cold_load_ms,
+            "loaded": set(loaded or []),
+            "verbose": verbose,
+        },
+        "stats": {},
+        "lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(**kwargs) -> ThreadingHTTPServer:
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--token-rate", type=float, default=40)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--cold-load-ms", type=float, default=0)
+    parser.add_argument("--loaded", default="", help="처음부터 로드된 모델 (쉼표 구분)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(
+        port=args.port,
+        host=args.host,
+        latency_ms=args.latency_ms,
+        tokens=args.tokens,
+        token_rate=args.token_rate,
+        fail_rate=args.fail_rate,
+        cold_load_ms=args.cold_load_ms,
+        loaded=[m for m in args.loaded.split(",") if m],
+        verbose=args.verbose,
+    )
+    print(f"fake ollama listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+벤치마크용 합성 repo / zip 생성
+
+    python -m bench.gen_repo --out /tmp/fuzzlab-bench/repo.zip --files 500 --lines 120
+"""
+import io
+import random
+import zipfile
+import argparse
+from pathlib import Path
+
+# semgrep 규칙에 걸릴 만한 패턴 (진짜 semgrep으로 돌려도 결과가 나오도록)
+VULN_SNIPPETS = [
+    'cur.execute("SELECT * FROM users WHERE name = \'%s\'" % user_input)',
+    "subprocess.call(user_input, shell=True)",
+    "obj = pickle.loads(user_input)",
+    "eval(user_input)",
+    "os.system('ls ' + user_input)",
+]
+
+
+def make_file(rng: random.Random, lines: int, vuln_ratio: float) -> str:
+    out = ["import os", "import pickle", "import subprocess", "", ""]
+    func = 0
+    while len(out) < lines:
+        out.append(f"def handler_{func}(user_input, cur=None):")
+        for _ in range(rng.randint(3, 8)):
+            if rng.random() < vuln_ratio:
+                out.append("    " + rng.choice(VULN_SNIPPETS))
+            else:
+                out.append(f"    value_{rng.randint(0, 999)} = len(str(user_input)) * {rng.randint(1, 9)}")
+        out.append("    return None")
+        out.append("")
+        func += 1
+    return "\n".join(out[:lines]) + "\n"
+
+
+def iter_repo_files(files: int, lines: int, vuln_ratio: float, seed: int):
+    rng = random.Random(seed)
+    n_dirs = max(1, files // 25)
+    for i in range(files):
+        rel = f"pkg_{i % n_dirs}/module_{i}.py"
+        yield rel, make_file(rng, lines, vuln_ratio)
+
+
+def make_repo(dest: Path, files: int = 100, lines: int = 120, vuln_ratio: float = 0.1, seed: int = 0) -> Path:
+    dest.mkdir(parents=True, exist_ok=True)
+    for rel, text in iter_repo_files(files, lines, vuln_ratio, seed):
+        p = dest / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text)
+    return dest
+
+
+def make_zip_bytes(files: int = 100, lines: int = 120, vuln_ratio: float = 0.1, seed: int = 0) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        for rel, text in iter_repo_files(files, lines, vuln_ratio, seed):
+            z.writestr(f"repo/{rel}", text)
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", required=True, help=".zip 이면 zip, 아니면 디렉토리 생성")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=120)
+    parser.add_argument("--vuln-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    if out.suffix == ".zip":
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_bytes(make_zip_bytes(args.files, args.lines, args.vuln_ratio, args.seed))
+    else:
+        make_repo(out, args.files, args.lines, args.vuln_ratio, args.seed)
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""
+FuzzLab end-to-end 부하 테스트 (네트워크 없이 실행 가능)
+
+가짜 semgrep(bench/bin/semgrep) + 가짜 Ollama(bench/fake_ollama.py) + 합성 repo zip으로
+POST /scan -> report 조회 -> LLM 일괄 요청을 정해진 동시성으로 돌리고
+단계별 처리량 / p50/p95/p99 지연 / 최대 RSS 를 출력한다.
+
+postgres / redis 는 로컬에 떠 있어야 함 (infra/docker-compose.yml)
+
+    # API/worker/가짜 Ollama 까지 직접 띄워서 측정 + baseline 저장
+    python -m bench.loadtest --spawn --scans 20 --concurrency 4 --save-baseline bench/baselines/local.json
+
+    # 이미 떠 있는 API 대상으로 측정 + baseline 비교 (회귀 시 exit 1)
+    python -m bench.loadtest --api http://127.0.0.1:8000 --compare bench/baselines/local.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import threading
+import subprocess
+from pathlib import Path
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench import fake_ollama
+from bench.gen_repo import make_zip_bytes
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+FAKE_BIN = REPO_ROOT / "bench" / "bin"
+TERMINAL_SCAN = ("done", "failed", "cancelled", "timed_out")
+TERMINAL_LLM = ("done", "failed_parse", "failed_call", "timed_out", "cancelled")
+
+
+# ---------------------------------------------------------------------------
+# 통계
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    # nearest-rank
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[k]
+
+
+def summarize(latencies: list[float], errors: int, wall_sec: float) -> dict:
+    ok = len(latencies)
+    return {
+        "count": ok,
+        "errors": errors,
+        "wall_sec": round(wall_sec, 3),
+        "throughput_per_sec": round(ok / wall_sec, 3) if wall_sec > 0 else None,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+    }
+
+
+def _ms(v: float | None) -> float | None:
+    return round(v * 1000, 1) if v is not None else None
+
+
+# ---------------------------------------------------------------------------
+# RSS 측정 (/proc 기반, 프로세스 트리 합계)
+
+def _children(pid: int) -> list[int]:
+    out = []
+    task_dir = Path(f"/proc/{pid}/task")
+    try:
+        for t in task_dir.iterdir():
+            text = (t / "children").read_text().split()
+            out += [int(x) for x in text]
+    except OSError:
+        pass
+    return out
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def tree_rss_kb(pid: int) -> int:
+    total = 0
+    stack = [pid]
+    while stack:
+        p = stack.pop()
+        total += _rss_kb(p)
+        stack += _children(p)
+    return total
+
+
+class RssSampler:
+    """
+    단계(stage) 동안 역할별(api/worker) 프로세스 트리의 최대 RSS 기록
+    """
+
+    def __init__(self, pids: dict[str, int], interval: float = 0.2):
+        self.pids = pids
+        self.interval = interval
+        self.peak: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = {role: 0 for role in self.pids}
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for role, pid in self.pids.items():
+                self.peak[role] = max(self.peak[role], tree_rss_kb(pid))
+            self._stop.wait(self.interval)
+
+    def peak_mb(self) -> dict:
+        return {role: round(kb / 1024, 1) for role, kb in self.peak.items()}
+
+
+class _NoSampler:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def peak_mb(self) -> dict:
+        return {}
+
+
+# ---------------------------------------------------------------------------
+# 스택 실행 (--spawn)
+
+def wait_http(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError(f"timeout waiting for {url}")
+
+
+def spawn_stack(args) -> tuple[str, dict, list]:
+    ollama = fake_ollama.start_in_thread(
+        port=args.ollama_port,
+        latency_ms=args.ollama_latency_ms,
+        tokens=args.ollama_tokens,
+        token_rate=args.ollama_token_rate,
+    )
+
+    env = dict(os.environ)
+    env["PATH"] = f"{FAKE_BIN}{os.pathsep}{env.get('PATH', '')}"
+    env["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{args.ollama_port}"
+    env["FAKE_SEMGREP_RESULTS_PER_FILE"] = str(args.results_per_file)
+    env["FAKE_SEMGREP_DELAY_SEC"] = str(args.semgrep_delay_sec)
+
+    log_dir = Path(args.workdir) / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app",
+         "--host", "127.0.0.1", "--port", str(args.api_port), "--workers", "1"],
+        cwd=args.workdir, env={**env, "PYTHONPATH": str(REPO_ROOT)},
+        stdout=(log_dir / "api.log").open("w"), stderr=subprocess.STDOUT,
+    )
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "celery", "-A", "backend.app.celery_app.celery_app", "worker",
+         "-Q", "interactive,batch", "--concurrency", str(args.worker_concurrency), "--loglevel=WARNING"],
+        cwd=args.workdir, env={**env, "PYTHONPATH": str(REPO_ROOT)},
+        stdout=(log_dir / "worker.log").open("w"), stderr=subprocess.STDOUT,
+    )
+
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    wait_http(f"{api_url}/openapi.json")
+    return api_url, {"api": api.pid, "worker": worker.pid}, [api, worker, ollama]
+
+
+def stop_stack(handles: list):
+    for h in handles:
+        if isinstance(h, subprocess.Popen):
+            h.terminate()
+            try:
+                h.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                h.kill()
+        else:
+            h.shutdown()
+
+
+# ---------------------------------------------------------------------------
+# 단계별 부하
+
+def run_pool(jobs: list, fn, concurrency: int) -> tuple[list[float], int, float, list]:
+    latencies = []
+    errors = 0
+    outputs = []
+    lock = threading.Lock()
+
+    def _one(job):
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            out = fn(job)
+        except Exception as e:
+            with lock:
+                errors += 1
+            print(f"  ! {type(e).__name__}: {e}", file=sys.stderr)
+            return
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+            outputs.append(out)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(_one, jobs))
+    return latencies, errors, time.perf_counter() - t0, outputs
+
+
+def stage_scan(api: str, args) -> tuple[list[float], int, float, list]:
+    zips = [make_zip_bytes(args.files, args.lines, seed=i) for i in range(args.scans)]
+
+    def _scan(i):
+        r = requests.post(
+            f"{api}/scan",
+            files={"file": (f"bench-{i}.zip", zips[i], "application/zip")},
+            data={"project_name": f"bench-{i % args.projects}", "priority": "batch"},
+            timeout=120,
+        )
+        r.raise_for_status()
+        scan_id = r.json()["scan_id"]
+
+        deadline = time.monotonic() + args.scan_timeout
+        while time.monotonic() < deadline:
+            status = requests.get(f"{api}/scan/{scan_id}", timeout=30).json()["status"]
+            if status in TERMINAL_SCAN:
+                if status != "done":
+                    raise RuntimeError(f"scan {scan_id} ended with {status}")
+                return scan_id
+            time.sleep(args.poll_interval)
+        raise TimeoutError(f"scan {scan_id} not done in {args.scan_timeout}s")
+
+    return run_pool(list(range(args.scans)), _scan, args.concurrency)
+
+
+def stage_report(api: str, scan_ids: list[str], args):
+    jobs = [scan_ids[i % len(scan_ids)] for i in range(args.report_reads)]
+
+    def _read(scan_id):
+        r = requests.get(f"{api}/scan/{scan_id}/report", timeout=120)
+        r.raise_for_status()
+        return len(r.content)
+
+    return run_pool(jobs, _read, args.concurrency)
+
+
+def stage_llm(api: str, scan_ids: list[str], args):
+    groups = []
+    for scan_id in scan_ids:
+        report = requests.get(f"{api}/scan/{scan_id}/report", timeout=120).json()
+        for g in report.get("grouped_findings", []):
+            groups.append((scan_id, g["group_id"]))
+            if len(groups) >= args.llm_groups:
+                break
+        if len(groups) >= args.llm_groups:
+            break
+
+    def _ask(job):
+        scan_id, group_id = job
+        url = f"{api}/scan/{scan_id}/groups/{quote(group_id, safe='/')}/llm-answer"
+        r = requests.post(url, params={"priority": "batch"}, timeout=60)
+        r.raise_for_status()
+
+        deadline = time.monotonic() + args.llm_timeout
+        while time.monotonic() < deadline:
+            status = requests.get(url, timeout=30).json().get("status")
+            if status in TERMINAL_LLM:
+                if status != "done":
+                    raise RuntimeError(f"llm answer {group_id} ended with {status}")
+                return status
+            time.sleep(args.poll_interval)
+        raise TimeoutError(f"llm answer {group_id} not done in {args.llm_timeout}s")
+
+    return run_pool(groups, _ask, args.llm_concurrency)
+
+
+# ---------------------------------------------------------------------------
+# baseline
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    problems = []
+    for stage, cur in result["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        if base.get("p95_ms") and cur.get("p95_ms") and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{stage}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if (
+            base.get("throughput_per_sec") and cur.get("throughput_per_sec")
+            and cur["throughput_per_sec"] < base["throughput_per_sec"] * (1 - tolerance)
+        ):
+            problems.append(
+                f"{stage}: throughput {base['throughput_per_sec']}/s -> {cur['throughput_per_sec']}/s"
+            )
+        for role, mb in (cur.get("peak_rss_mb") or {}).items():
+            base_mb = (base.get("peak_rss_mb") or {}).get(role)
+            if base_mb and mb > base_mb * (1 + tolerance):
+                problems.append(f"{stage}: {role} peak RSS {base_mb}MB -> {mb}MB")
+        if cur.get("errors") and not base.get("errors"):
+            problems.append(f"{stage}: {cur['errors']} errors")
+    return problems
+
+
+def print_table(result: dict):
+    print(f"{'stage':<8} {'count':>6} {'err':>4} {'thr/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  peak RSS MB")
+    for stage, s in result["stages"].items():
+        print(
+            f"{stage:<8} {s['count']:>6} {s['errors']:>4} {s['throughput_per_sec'] or 0:>8} "
+            f"{s['p50_ms'] or 0:>9} {s['p95_ms'] or 0:>9} {s['p99_ms'] or 0:>9}  {s.get('peak_rss_mb') or '-'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api", default=None, help="이미 떠 있는 API 주소 (없으면 --spawn 필요)")
+    parser.add_argument("--spawn", action="store_true", help="API / worker / 가짜 Ollama 직접 실행")
+    parser.add_argument("--workdir", default="/tmp/fuzzlab-bench")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--worker-concurrency", type=int, default=4)
+
+    parser.add_argument("--scans", type=int, default=10)
+    parser.add_argument("--projects", type=int, default=3)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=120)
+    parser.add_argument("--results-per-file", type=int, default=2)
+    parser.add_argument("--semgrep-delay-sec", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--report-reads", type=int, default=100)
+    parser.add_argument("--llm-groups", type=int, default=40)
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+
+    parser.add_argument("--ollama-port", type=int, default=11500)
+    parser.add_argument("--ollama-latency-ms", type=float, default=200)
+    parser.add_argument("--ollama-tokens", type=int, default=120)
+    parser.add_argument("--ollama-token-rate", type=float, default=40)
+
+    parser.add_argument("--scan-timeout", type=float, default=600)
+    parser.add_argument("--llm-timeout", type=float, default=600)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+
+    parser.add_argument("--save-baseline", default=None)
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="허용 회귀 비율 (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if not args.api and not args.spawn:
+        parser.error("--api 또는 --spawn 중 하나는 필요")
+
+    Path(args.workdir).mkdir(parents=True, exist_ok=True)
+    handles = []
+    pids = {}
+    api = args.api
+    if args.spawn:
+        api, pids, handles = spawn_stack(args)
+
+    def sampler():
+        return RssSampler(pids) if pids else _NoSampler()
+
+    result = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("save_baseline", "compare")},
+        },
+        "stages": {},
+    }
+
+    try:
+        print(f"[scan] {args.scans} scans x {args.files} files, concurrency={args.concurrency}")
+        with sampler() as s:
+            lat, err, wall, scan_ids = stage_scan(api, args)
+        result["stages"]["scan"] = {**summarize(lat, err, wall), "peak_rss_mb": s.peak_mb()}
+
+        if scan_ids:
+            print(f"[report] {args.report_reads} reads")
+            with sampler() as s:
+                lat, err, wall, _ = stage_report(api, scan_ids, args)
+            result["stages"]["report"] = {**summarize(lat, err, wall), "peak_rss_mb": s.peak_mb()}
+
+            print(f"[llm] {args.llm_groups} groups, concurrency={args.llm_concurrency}")
+            with sampler() as s:
+                lat, err, wall, _ = stage_llm(api, scan_ids, args)
+            result["stages"]["llm"] = {**summarize(lat, err, wall), "peak_rss_mb": s.peak_mb()}
+    finally:
+        if handles:
+            stop_stack(handles)
+
+    print_table(result)
+
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_baseline).write_text(json.dumps(result, indent=2))
+        print(f"baseline saved: {args.save_baseline}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        problems = compare(result, baseline, args.tolerance)
+        if problems:
+            print("REGRESSION:")
+            for p in problems:
+                print(f"  - {p}")
+            sys.exit(1)
+        print(f"no regression vs {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
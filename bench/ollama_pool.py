@@ -0,0 +1,72 @@
+"""
+Ollama backend pool 확인용 (가짜 Ollama 여러 대 + 로컬 redis)
+
+    python -m bench.ollama_pool --requests 60 --concurrency 8
+
+- backend A: 빠름, 모델 로드됨
+- backend B: 느림 (cold load 지연 있음)
+- backend C: 절반 확률로 500 -> 연속 실패 후 ejected 되는지 확인
+"""
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from bench import fake_ollama
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--model", default="llama3.1:8b")
+    parser.add_argument("--base-port", type=int, default=11600)
+    args = parser.parse_args()
+
+    specs = [
+        {"latency_ms": 50, "tokens": 20, "token_rate": 200, "loaded": [args.model]},
+        {"latency_ms": 300, "tokens": 20, "token_rate": 50, "cold_load_ms": 1500},
+        {"latency_ms": 50, "tokens": 20, "token_rate": 200, "fail_rate": 0.5, "loaded": [args.model]},
+    ]
+    servers = []
+    urls = []
+    for i, spec in enumerate(specs):
+        port = args.base_port + i
+        servers.append(fake_ollama.start_in_thread(port=port, **spec))
+        urls.append(f"http://127.0.0.1:{port}|2")
+
+    # 모듈 import 전에 설정해야 반영됨
+    os.environ["OLLAMA_BACKENDS"] = ",".join(urls)
+    os.environ.setdefault("OLLAMA_EJECT_SEC", "10")
+    from backend.app import ollama_pool
+    from backend.app.ollama_client import call_ollama
+
+    def _one(i) -> bool:
+        try:
+            call_ollama(model=args.model, prompt=f"bench {i}", timeout_sec=30)
+            return True
+        except Exception as e:
+            print(f"  ! {type(e).__name__}: {e}")
+            return False
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        # 결과는 future에서 모아서 셈 (worker 스레드에서 공유 카운터를 올리지 않음)
+        results = list(ex.map(_one, range(args.requests)))
+    wall = time.perf_counter() - t0
+    ok = sum(results)
+    failed = len(results) - ok
+
+    print(f"ok={ok} failed={failed} wall={wall:.2f}s")
+    for b in ollama_pool.backend_stats():
+        print(
+            f"  {b['url']:<26} req={b['requests']:>4} fail={b['failures']:>3} "
+            f"eject={b['ejections']} avg={b['avg_ms']}ms ema={b['ema_ms']}ms models={b['loaded_models']}"
+        )
+
+    for s in servers:
+        s.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+report 응답 직렬화/압축 벤치마크
+
+    python -m bench.serialization --findings 50000
+
+- default : FastAPI 기본 경로 (jsonable_encoder + json.dumps)
+- orjson  : backend.app.responses.encode_json
+- 압축    : gzip / zstd 크기와 시간
+"""
+import gzip
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from backend.app import responses
+
+
+def make_report(n_findings: int) -> dict:
+    now = datetime.now(timezone.utc)
+    findings = []
+    groups = []
+    for i in range(n_findings):
+        path = f"src/module_{i % 500}/file_{i % 37}.py"
+        start = (i * 7) % 4000 + 1
+        context_lines = [
+            {"line": ln, "text": f"    value_{ln} = call_{ln}(user_input)", "is_match": ln == start}
+            for ln in range(max(1, start - 3), start + 4)
+        ]
+        evidence = {
+            "status": "ok",
+            "reason": None,
+            "match": {"start_line": start, "end_line": start},
+            "context": {"before": 3, "after": 3},
+            "context_lines": context_lines,
+            "snippet": "\n".join(f'{x["line"]}: {x["text"]}' for x in context_lines),
+        }
+        normalized = {
+            "tool": "semgrep",
+            "rule": {"id": f"python.lang.security.rule-{i % 120}", "name": "possible injection"},
+            "severity": ["INFO", "LOW", "MEDIUM", "HIGH", "CRITICAL"][i % 5],
+            "location": {"path": path, "start_line": start, "end_line": start},
+            "references": {"cwe": ["CWE-89: SQL Injection"]},
+            "evidence": evidence,
+            "metadata": {"semgrep": {"raw_path": path}},
+        }
+        findings.append({
+            "id": i + 1,
+            "tool": "semgrep",
+            "rule_id": normalized["rule"]["id"],
+            "severity": normalized["severity"],
+            "message": normalized["rule"]["name"],
+            "path": path,
+            "start_line": start,
+            "end_line": start,
+            "normalized": normalized,
+        })
+        if i % 2 == 0:
+            groups.append({
+                "group_id": f"{path}:{start}-{start}",
+                "location": normalized["location"],
+                "rules": [{"rule_id": normalized["rule"]["id"], "message": "x", "severity": "HIGH"}],
+                "final_severity": 3,
+                "score": 4.0,
+                "evidence": evidence,
+            })
+
+    return {
+        "scan": {
+            "scan_id": "bench",
+            "status": "done",
+            "workspace_path": "workspace/bench/src",
+            "error_message": None,
+            "created_at": now,
+            "updated_at": now,
+        },
+        "grouped_findings": groups,
+        "findings": findings,
+    }
+
+
+def default_encode(payload) -> bytes:
+    # starlette JSONResponse.render 와 동일한 옵션
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def timeit(fn, repeat: int) -> tuple[float, object]:
+    times = []
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--findings", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payload = make_report(args.findings)
+    print(f"findings={args.findings} repeat={args.repeat} (median ms)")
+
+    ms, default_body = timeit(lambda: default_encode(payload), args.repeat)
+    print(f"  default (jsonable_encoder+json) : {ms:9.1f} ms  {len(default_body):>12,} bytes")
+
+    ms, body = timeit(lambda: responses.encode_json(payload), args.repeat)
+    print(f"  orjson                          : {ms:9.1f} ms  {len(body):>12,} bytes")
+
+    ms, gz = timeit(lambda: gzip.compress(body, compresslevel=responses.GZIP_LEVEL), args.repeat)
+    print(f"  gzip (level {responses.GZIP_LEVEL})                  : {ms:9.1f} ms  {len(gz):>12,} bytes")
+
+    if responses.zstandard is not None:
+        ms, zs = timeit(lambda: responses.compress(body, "zstd"), args.repeat)
+        print(f"  zstd (level {responses.ZSTD_LEVEL})                  : {ms:9.1f} ms  {len(zs):>12,} bytes")
+    else:
+        print("  zstd: zstandard not installed")
+
+
+if __name__ == "__main__":
+    main()
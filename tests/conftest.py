@@ -0,0 +1,37 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# backend.app / bench 를 패키지로 import (repo root 기준)
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# DB / redis 가 필요한 테스트는 환경이 있을 때만 실행
+#   DATABASE_URL=postgresql+psycopg://... REDIS_URL=redis://localhost:6379/15 python -m pytest -q
+
+
+@pytest.fixture(scope="session")
+def database():
+    pytest.importorskip("sqlalchemy")
+    pytest.importorskip("dotenv")
+    if not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL is not set")
+    from backend.app import init_db
+
+    init_db.init_db()
+
+
+@pytest.fixture(scope="session")
+def redis_client():
+    redis = pytest.importorskip("redis")
+    from backend.app.redis_client import get_redis
+
+    r = get_redis()
+    try:
+        r.ping()
+    except redis.RedisError as e:
+        pytest.skip(f"redis not available: {e}")
+    return r
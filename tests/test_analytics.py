@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+
+pytestmark = pytest.mark.usefixtures("database")
+
+
+@pytest.fixture
+def project():
+    from backend.app.db import SessionLocal
+    from backend.app.models import Finding, FindingLifecycle, FindingRollup, Scan, ScanRollup
+
+    project = f"test-{uuid4().hex[:8]}"
+    yield project
+    db = SessionLocal()
+    try:
+        scan_ids = [s for (s,) in db.query(Scan.scan_id).filter(Scan.project_name == project)]
+        db.query(Finding).filter(Finding.scan_id.in_(scan_ids)).delete(synchronize_session=False)
+        db.query(FindingRollup).filter(FindingRollup.scan_id.in_(scan_ids)).delete(synchronize_session=False)
+        db.query(ScanRollup).filter(ScanRollup.project_name == project).delete()
+        db.query(FindingLifecycle).filter(FindingLifecycle.project_name == project).delete()
+        db.query(Scan).filter(Scan.project_name == project).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def _done_scan(project, finished_at, fingerprints) -> str:
+    from backend.app.db import SessionLocal
+    from backend.app.models import Finding, Scan
+
+    scan_id = str(uuid4())
+    db = SessionLocal()
+    try:
+        db.add(Scan(scan_id=scan_id, status="done", project_name=project, updated_at=finished_at))
+        for fp in fingerprints:
+            db.add(Finding(
+                scan_id=scan_id, rule_id=f"rule.{fp}", severity="ERROR", path=f"src/{fp}.py",
+                start_line=1, end_line=1, fingerprint=fp,
+            ))
+        db.commit()
+    finally:
+        db.close()
+    return scan_id
+
+
+def _counts(row):
+    return row["new_findings"], row["fixed_findings"], row["fix_seconds_total"]
+
+
+def test_record_scan_twice_keeps_fixed_counts(project):
+    from backend.app import analytics
+
+    t0 = datetime.now(timezone.utc) - timedelta(days=2)
+    t1 = t0 + timedelta(hours=5)
+    first = _done_scan(project, t0, ["fp1", "fp2"])
+    second = _done_scan(project, t1, ["fp2", "fp3"])
+
+    assert _counts(analytics.record_scan(first)) == (2, 0, 0.0)
+    # fp3 새로 발견, fp1 수정 (5시간)
+    expected = (1, 1, 5 * 3600.0)
+    assert _counts(analytics.record_scan(second)) == expected
+    # 재실행해도 수정 수 / 시간이 사라지지 않음
+    assert _counts(analytics.record_scan(second)) == expected
+    # 더 나중 scan이 반영된 뒤 이전 scan 재실행 -> 이전 값 유지
+    assert _counts(analytics.record_scan(first)) == (2, 0, 0.0)
+    assert analytics.record_scan(second)["findings_total"] == 2
@@ -0,0 +1,116 @@
+import csv
+import gzip
+import io
+import json
+from uuid import uuid4
+
+import pytest
+
+pytestmark = pytest.mark.usefixtures("database")
+
+
+@pytest.fixture
+def scan_id():
+    from backend.app.db import SessionLocal
+    from backend.app.models import Finding, LLMAnswer, Scan
+
+    scan_id = str(uuid4())
+    db = SessionLocal()
+    try:
+        db.add(Scan(scan_id=scan_id, status="done", project_name="exports-test"))
+        for i, (rule, severity) in enumerate([("rule.a", "ERROR"), ("rule.b", "WARNING"), ("rule.a", "INFO")]):
+            db.add(Finding(
+                scan_id=scan_id, rule_id=rule, severity=severity, message=f"msg {i}",
+                path="src/app.py", start_line=i + 1, end_line=i + 1, fingerprint=f"fp{i}",
+                normalized_json={"evidence": {"snippet": f"line {i}"}, "references": {"cwe": ["CWE-89"]}},
+            ))
+        db.add(LLMAnswer(
+            scan_id=scan_id, group_id="src/app.py:1-1", model="test", prompt="", status="done",
+            response_json={"summary": "S", "risk_level": "high", "recommendation": "R"},
+        ))
+        db.commit()
+    finally:
+        db.close()
+    yield scan_id
+    db = SessionLocal()
+    try:
+        db.query(LLMAnswer).filter(LLMAnswer.scan_id == scan_id).delete()
+        db.query(Finding).filter(Finding.scan_id == scan_id).delete()
+        db.query(Scan).filter(Scan.scan_id == scan_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_sarif_shape(scan_id, monkeypatch):
+    from backend.app import exports
+
+    # flush가 여러 번 일어나도 이어 붙이면 하나의 JSON
+    monkeypatch.setattr(exports, "EXPORT_FLUSH_BYTES", 1)
+    doc = json.loads(b"".join(exports.iter_sarif(scan_id)))
+
+    assert doc["$schema"] == exports.SARIF_SCHEMA
+    assert doc["version"] == "2.1.0"
+    run, = doc["runs"]
+    rules = run["tool"]["driver"]["rules"]
+    assert [r["id"] for r in rules] == ["rule.a", "rule.b"]
+    assert rules[0]["properties"]["tags"] == ["security", "CWE-89"]
+    assert run["properties"]["scan_id"] == scan_id
+
+    results = run["results"]
+    assert len(results) == 3
+    for r in results:
+        assert rules[r["ruleIndex"]]["id"] == r["ruleId"]
+    assert [r["level"] for r in results] == ["error", "warning", "note"]
+    first = results[0]
+    assert first["locations"][0]["physicalLocation"]["region"] == {
+        "startLine": 1, "endLine": 1, "snippet": {"text": "line 0"},
+    }
+    assert first["partialFingerprints"] == {"fuzzlab/v1": "fp0"}
+    assert first["properties"]["triage"]["risk_level"] == "high"
+    assert "triage" not in results[1]["properties"]
+
+
+def test_csv_shape(scan_id, monkeypatch):
+    from backend.app import exports
+
+    monkeypatch.setattr(exports, "EXPORT_FLUSH_BYTES", 1)
+    rows = list(csv.reader(io.StringIO(b"".join(exports.iter_csv(scan_id)).decode("utf-8"))))
+
+    assert rows[0] == exports.CSV_COLUMNS
+    assert len(rows) == 4
+    first = dict(zip(exports.CSV_COLUMNS, rows[1]))
+    assert first["rule_id"] == "rule.a"
+    assert first["group_id"] == "src/app.py:1-1"
+    assert first["triage_status"] == "done"
+    assert first["triage_summary"] == "S"
+    assert dict(zip(exports.CSV_COLUMNS, rows[2]))["triage_status"] == ""
+
+
+def test_unknown_scan_exports_nothing():
+    from backend.app import exports
+
+    assert b"".join(exports.iter_sarif(str(uuid4()))) == b""
+    assert b"".join(exports.iter_csv(str(uuid4()))) == b""
+
+
+def test_generation_does_not_restart_after_key_loss(scan_id, redis_client, tmp_path, monkeypatch):
+    from backend.app import exports
+
+    monkeypatch.chdir(tmp_path)
+    assert exports.render(scan_id)["status"] == "done"
+    gen = exports.generation(scan_id)
+    with gzip.open(exports.artifact_path(scan_id, "csv", gen), "rb") as f:
+        assert f.read().startswith(b"scan_id,")
+
+    # redis 재시작 등으로 키가 사라져도 이전 generation 파일이 다시 열리지 않음
+    redis_client.delete(exports._generation_key(scan_id))
+    new_gen = exports.generation(scan_id)
+    assert new_gen > gen
+    assert exports.open_artifact(scan_id, "csv") is None
+
+    # 다시 렌더링하면 이전 generation 파일은 정리됨
+    assert exports.render(scan_id)["status"] == "done"
+    names = sorted(p.name for p in exports._exports_dir(scan_id).glob("report.*.gz"))
+    assert names == sorted(exports.artifact_path(scan_id, fmt, new_gen).name for fmt in exports.FORMATS)
+    redis_client.delete(exports._generation_key(scan_id))
@@ -0,0 +1,56 @@
+import pytest
+
+pytestmark = pytest.mark.usefixtures("database")
+
+
+def _llm_input(**group):
+    return {
+        "scan_id": "ignored",
+        "workspace_path": "/tmp/ignored",
+        "group": {"group_id": "src/app.py:10-12", "final_severity": 3, "rules": [{"rule_id": "x.sql"}], **group},
+        "contract": {"fields": ["summary", "risk_level"]},
+    }
+
+
+def test_prepare_is_canonical():
+    from backend.app import llm_inputs
+
+    a = llm_inputs.prepare(_llm_input())
+    # scan_id / workspace_path 가 달라도, dict 순서가 달라도 같은 입력
+    other = _llm_input()
+    other["scan_id"] = "another-scan"
+    other["group"] = dict(reversed(list(other["group"].items())))
+    b = llm_inputs.prepare(other)
+    assert a["input_hash"] == b["input_hash"]
+    assert a["prompt"] == b["prompt"]
+
+    c = llm_inputs.prepare(_llm_input(final_severity=1))
+    assert c["input_hash"] != a["input_hash"]
+
+
+def test_store_and_reconstruct_prompt():
+    from backend.app import llm_inputs
+    from backend.app.db import SessionLocal
+    from backend.app.models import LLMAnswer, LLMInput
+
+    prepared = llm_inputs.prepare(_llm_input(note="round-trip"))
+    assert llm_inputs.store(prepared) == prepared["input_hash"]
+    # 두 번 저장해도 그대로
+    llm_inputs.store(prepared)
+
+    db = SessionLocal()
+    try:
+        row = LLMAnswer(input_hash=prepared["input_hash"], prompt_version=prepared["prompt_version"], prompt="")
+        assert llm_inputs.load_input_json(db, prepared["input_hash"]) == prepared["input_json"]
+        assert llm_inputs.reconstruct_prompt(db, row) == prepared["prompt"]
+
+        # 이전 row: prompt 컬럼의 전문을 그대로
+        legacy = LLMAnswer(input_hash=None, prompt_version=None, prompt="full prompt")
+        assert llm_inputs.reconstruct_prompt(db, legacy) == "full prompt"
+
+        missing = LLMAnswer(input_hash="0" * 64, prompt_version=prepared["prompt_version"], prompt="")
+        assert llm_inputs.reconstruct_prompt(db, missing) is None
+    finally:
+        db.query(LLMInput).filter(LLMInput.input_hash == prepared["input_hash"]).delete()
+        db.commit()
+        db.close()
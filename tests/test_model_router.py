@@ -0,0 +1,65 @@
+from backend.app import model_router
+
+
+def _group(severity=0, score=0.0, rules=()):
+    return {"final_severity": severity, "score": score, "rules": [{"rule_id": r} for r in rules]}
+
+
+def test_route_low_risk_is_small():
+    route = model_router.route(_group(severity=1, score=1.0, rules=["python.lang.style.unused-import"]))
+    assert route["tier"] == "small"
+    assert route["model"] == model_router.TIERS["small"]
+
+
+def test_route_high_severity_is_large():
+    route = model_router.route(_group(severity=model_router.LLM_LARGE_MIN_SEVERITY))
+    assert route["tier"] == "large"
+    assert route["reason"].startswith("severity=")
+
+
+def test_route_high_score_is_large():
+    route = model_router.route(_group(severity=0, score=model_router.LLM_LARGE_MIN_SCORE))
+    assert route["tier"] == "large"
+    assert route["reason"].startswith("score=")
+
+
+def test_route_rule_keyword_is_large():
+    route = model_router.route(_group(rules=["python.django.security.injection.sql-injection"]))
+    assert route["tier"] == "large"
+    assert route["reason"] == "rule=python.django.security.injection.sql-injection"
+
+
+def test_route_keyword_matches_whole_words_only():
+    # "mysql" / "execute" / "evaluate" 는 sql / exec / eval 이 아님
+    for rule_id in ("python.mysql.connection-string", "js.execute-once", "ts.evaluate-config"):
+        assert not model_router.matches_large_keyword(rule_id), rule_id
+        assert model_router.route(_group(rules=[rule_id]))["tier"] == "small"
+
+
+def test_route_missing_fields():
+    assert model_router.route({})["tier"] == "small"
+    assert model_router.route({"final_severity": None, "score": None, "rules": None})["tier"] == "small"
+
+
+def test_escalate():
+    assert model_router.escalate("small") == {
+        "tier": "large",
+        "model": model_router.TIERS["large"],
+        "reason": "escalated from small",
+    }
+    assert model_router.escalate("large") is None
+    assert model_router.escalate(None) is None
+
+
+def test_tier_of():
+    assert model_router.tier_of(model_router.TIERS["large"]) == "large"
+    assert model_router.tier_of("some-other:1b") is None
+
+
+def test_retry_route():
+    small = {"tier": "small", "model": model_router.TIERS["small"]}
+    assert model_router.retry_route(small, valid=False, auto=True)["tier"] == "large"
+    # 통과한 답 / 사용자가 지정한 모델 / 이미 large 면 재시도 없음
+    assert model_router.retry_route(small, valid=True, auto=True) is None
+    assert model_router.retry_route(small, valid=False, auto=False) is None
+    assert model_router.retry_route({"tier": "large"}, valid=False, auto=True) is None
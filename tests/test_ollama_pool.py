@@ -0,0 +1,128 @@
+from uuid import uuid4
+
+import pytest
+
+pytest.importorskip("requests")
+pytestmark = pytest.mark.usefixtures("redis_client")
+
+MODEL = "llama3.1:8b"
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    from bench import fake_ollama
+    from backend.app import ollama_pool
+
+    # 가짜 Ollama 두 대: A는 모델 로드됨, B는 아님 (둘 다 동시 처리 1)
+    servers = [
+        fake_ollama.start_in_thread(port=0, latency_ms=5, tokens=1, token_rate=0, loaded=[MODEL]),
+        fake_ollama.start_in_thread(port=0, latency_ms=5, tokens=1, token_rate=0),
+    ]
+    urls = [f"http://127.0.0.1:{s.server_address[1]}" for s in servers]
+
+    # 테스트마다 다른 redis key prefix (이전 lease / 실패 기록과 섞이지 않게)
+    monkeypatch.setattr(ollama_pool, "POOL_PREFIX", f"test:ollama:{uuid4().hex}")
+    monkeypatch.setattr(ollama_pool, "OLLAMA_BACKENDS", ",".join(f"{u}|1" for u in urls))
+    monkeypatch.setattr(ollama_pool, "OLLAMA_ACQUIRE_TIMEOUT_SEC", 0.5)
+    monkeypatch.setattr(ollama_pool, "OLLAMA_EJECT_AFTER_FAILURES", 2)
+    monkeypatch.setattr(ollama_pool, "_loaded_models", {})
+    yield urls
+    for s in servers:
+        s.shutdown()
+        s.server_close()
+
+
+def test_prefers_backend_with_model_loaded(backends):
+    from backend.app import ollama_pool
+
+    url, lease_id = ollama_pool.acquire(MODEL, lease_sec=30)
+    try:
+        assert url == backends[0]
+    finally:
+        ollama_pool.release(url, lease_id)
+
+
+def test_acquire_respects_concurrency_and_release(backends):
+    from backend.app import ollama_pool
+
+    a = ollama_pool.acquire(MODEL, lease_sec=30)
+    b = ollama_pool.acquire(MODEL, lease_sec=30)
+    assert {a[0], b[0]} == set(backends)
+
+    # 둘 다 꽉 참 -> timeout 후 실패
+    with pytest.raises(ollama_pool.NoBackendAvailable):
+        ollama_pool.acquire(MODEL, lease_sec=30)
+
+    ollama_pool.release(*a)
+    c = ollama_pool.acquire(MODEL, lease_sec=30)
+    assert c[0] == a[0]
+    ollama_pool.release(*b)
+    ollama_pool.release(*c)
+    assert all(s["outstanding"] == 0 for s in ollama_pool.backend_stats())
+
+
+def test_expired_lease_is_reclaimed(backends):
+    from backend.app import ollama_pool
+
+    # lease 만료시각이 지나면 (worker가 죽은 경우) 반환하지 않아도 다시 쓸 수 있음
+    stale = ollama_pool.acquire(MODEL, lease_sec=-1, exclude={backends[1]})
+    url, lease_id = ollama_pool.acquire(MODEL, lease_sec=30, exclude={backends[1]})
+    assert url == stale[0] == backends[0]
+    ollama_pool.release(url, lease_id)
+
+
+def test_backend_lease_calls_fake_server(backends):
+    import requests
+    from backend.app import ollama_pool
+
+    with ollama_pool.backend_lease(MODEL, lease_sec=30) as url:
+        res = requests.post(f"{url}/api/generate", json={"model": MODEL, "prompt": "hi", "stream": False}, timeout=5)
+        res.raise_for_status()
+        assert res.json()["done"] is True
+
+    stats = {s["url"]: s for s in ollama_pool.backend_stats()}
+    assert stats[url]["requests"] == 1
+    assert stats[url]["failures"] == 0
+    assert stats[url]["outstanding"] == 0
+    assert stats[url]["ema_ms"] is not None
+
+
+def test_backend_failures_eject(backends):
+    import requests
+    from backend.app import ollama_pool
+
+    # 연속 backend 실패 2번 -> A 제외, lease는 매번 반환
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            with ollama_pool.backend_lease(MODEL, lease_sec=30, exclude={backends[1]}) as url:
+                assert url == backends[0]
+                raise requests.ConnectionError("boom")
+
+    stats = {s["url"]: s for s in ollama_pool.backend_stats()}
+    assert stats[backends[0]]["ejections"] == 1
+    assert stats[backends[0]]["ejected_for_sec"] > 0
+    assert stats[backends[0]]["outstanding"] == 0
+
+    # 남은 B로 라우팅, B까지 제외하면 기다리지 않고 실패
+    url, lease_id = ollama_pool.acquire(MODEL, lease_sec=30)
+    assert url == backends[1]
+    ollama_pool.release(url, lease_id)
+    with pytest.raises(ollama_pool.NoBackendAvailable):
+        ollama_pool.acquire(MODEL, lease_sec=30, exclude={backends[1]})
+
+
+def test_request_errors_do_not_eject(backends):
+    import requests
+    from backend.app import ollama_pool
+
+    # 4xx 는 요청 문제 -> 실패로만 기록
+    response = requests.Response()
+    response.status_code = 400
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            with ollama_pool.backend_lease(MODEL, lease_sec=30, exclude={backends[1]}):
+                raise requests.HTTPError(response=response)
+
+    stats = {s["url"]: s for s in ollama_pool.backend_stats()}
+    assert stats[backends[0]]["failures"] == 3
+    assert stats[backends[0]]["ejections"] == 0
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("requests")
+pytestmark = pytest.mark.usefixtures("database")
+
+SCAN = "3f2a1b4c-0d5e-4f60-8a71-92b3c4d5e6f7"
+
+
+def _user(text):
+    return {"role": "user", "content": text}
+
+
+def test_find_reference_in_last_user_message():
+    from backend.app import openai_compat
+
+    ref = openai_compat.find_reference([_user(f"explain scan {SCAN} group src/app.py:10-12")])
+    assert ref == {"scan_id": SCAN, "group_id": "src/app.py:10-12", "fresh": False, "reuse": False}
+
+    ref = openai_compat.find_reference([_user(f"/scan/{SCAN}/groups/src/a/b.py:1-2 regenerate please")])
+    assert ref == {"scan_id": SCAN, "group_id": "src/a/b.py:1-2", "fresh": True, "reuse": False}
+
+
+def test_find_reference_ignores_older_messages_and_assistant_turns():
+    from backend.app import openai_compat
+
+    messages = [
+        _user(f"scan {SCAN} group src/app.py:10-12"),
+        {"role": "assistant", "content": "..."},
+        _user("what does that mean?"),
+    ]
+    assert openai_compat.find_reference(messages) is None
+
+    messages = [_user(f"scan {SCAN} group src/app.py:10-12"), {"role": "assistant", "content": "answer"}]
+    assert openai_compat.find_reference(messages)["group_id"] == "src/app.py:10-12"
+
+    # scan 또는 group 하나만 있으면 일반 대화
+    assert openai_compat.find_reference([_user(f"scan {SCAN}")]) is None
+    assert openai_compat.find_reference([]) is None
+
+
+def test_find_reference_with_content_parts():
+    from backend.app import openai_compat
+
+    content = [{"type": "text", "text": f"scan {SCAN}"}, {"type": "image_url"}, {"type": "text", "text": "group x.py:1-3"}]
+    assert openai_compat.find_reference([{"role": "user", "content": content}])["group_id"] == "x.py:1-3"
+
+
+def test_fresh_keyword_is_a_whole_word():
+    from backend.app import openai_compat
+
+    assert not openai_compat.find_reference([_user(f"scan {SCAN} group a.py:1-2 refreshing")])["fresh"]
+    assert openai_compat.find_reference([_user(f"scan {SCAN} group a.py:1-2 --fresh")])["fresh"]
+
+
+def test_reuse_is_opt_in():
+    from backend.app import openai_compat
+
+    assert not openai_compat.find_reference([_user(f"scan {SCAN} group a.py:1-2")])["reuse"]
+    assert openai_compat.find_reference([_user(f"scan {SCAN} group a.py:1-2 --reuse")])["reuse"]
+
+
+def _events(chunks):
+    events = []
+    for chunk in chunks:
+        assert chunk.endswith(b"\n\n")
+        if chunk.startswith(b":"):
+            events.append("keep-alive")
+            continue
+        assert chunk.startswith(b"data: ")
+        data = chunk[len(b"data: "):-2]
+        events.append("[DONE]" if data == b"[DONE]" else json.loads(data))
+    return events
+
+
+def test_sse_framing():
+    from backend.app import openai_compat
+
+    events = _events(openai_compat.sse("fuzzlab-triage", iter(["Hel", "", "lo"])))
+    assert events[-1] == "[DONE]"
+    assert events[2] == "keep-alive"
+    chunks = [e for e in events if isinstance(e, dict)]
+    assert {c["id"] for c in chunks} == {chunks[0]["id"]}
+    assert all(c["object"] == "chat.completion.chunk" and c["model"] == "fuzzlab-triage" for c in chunks)
+    assert chunks[0]["choices"][0]["delta"] == {"role": "assistant"}
+    assert "".join(c["choices"][0]["delta"].get("content", "") for c in chunks) == "Hello"
+    assert chunks[-1]["choices"][0] == {"index": 0, "delta": {}, "finish_reason": "stop"}
+
+
+def test_sse_reports_upstream_error_and_finishes():
+    from backend.app import openai_compat
+
+    def pieces():
+        yield "partial"
+        raise RuntimeError("backend gone")
+
+    events = _events(openai_compat.sse("m", pieces()))
+    contents = [e["choices"][0]["delta"].get("content") for e in events if isinstance(e, dict)]
+    assert any("upstream error: backend gone" in (c or "") for c in contents)
+    assert events[-2]["choices"][0]["finish_reason"] == "stop"
+    assert events[-1] == "[DONE]"
+
+
+def test_sse_close_closes_upstream():
+    from backend.app import openai_compat
+
+    closed = []
+
+    def pieces():
+        try:
+            yield "a"
+            yield "b"
+        finally:
+            closed.append(True)
+
+    stream = openai_compat.sse("m", pieces())
+    next(stream)
+    next(stream)
+    stream.close()
+    assert closed == [True]
+
+
+def test_render_answer_matches_stored_format():
+    from backend.app import openai_compat
+
+    text = openai_compat.render_answer({"summary": "S", "risk_level": "high", "safe_example": "x = 1", "impact": ""})
+    assert text == "**Summary**: S\n\n**Risk level**: high\n\n**Safe example**\n```\nx = 1\n```"
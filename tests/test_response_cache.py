@@ -0,0 +1,77 @@
+from uuid import uuid4
+
+import pytest
+
+pytestmark = pytest.mark.usefixtures("database", "redis_client")
+
+
+def _request(headers=None):
+    pytest.importorskip("fastapi")
+    from starlette.requests import Request
+
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": raw})
+
+
+def test_invalidate_hides_cached_payload():
+    from backend.app import response_cache
+
+    scan_id = str(uuid4())
+    key = response_cache.make_key(scan_id, "report")
+    assert response_cache.get(key) is None
+    response_cache.put(scan_id, key, {"n": 1})
+    assert response_cache.get(response_cache.make_key(scan_id, "report"))["body"] == b'{"n":1}'
+
+    response_cache.invalidate_scan(scan_id)
+    assert response_cache.get(response_cache.make_key(scan_id, "report")) is None
+
+
+def test_put_after_invalidate_is_not_served():
+    from backend.app import response_cache
+
+    # payload를 만드는 동안 LLM 답이 바뀐 경우: 먼저 만든 키로 늦게 put
+    scan_id = str(uuid4())
+    stale_key = response_cache.make_key(scan_id, "report")
+    response_cache.invalidate_scan(scan_id)
+    entry = response_cache.put(scan_id, stale_key, {"n": "stale"})
+    assert entry["body"] == b'{"n":"stale"}'
+    assert response_cache.get(stale_key) is None
+    assert response_cache.get(response_cache.make_key(scan_id, "report")) is None
+
+
+def test_keys_differ_by_params():
+    from backend.app import response_cache
+
+    scan_id = str(uuid4())
+    a = response_cache.make_key(scan_id, "report", {"x": "1"})
+    assert a == response_cache.make_key(scan_id, "report", {"x": "1"})
+    assert a != response_cache.make_key(scan_id, "report", {"x": "2"})
+    assert a != response_cache.make_key(scan_id, "llm-input:src/a.py:1-2", {"x": "1"})
+
+
+def test_etag_and_304():
+    from backend.app import response_cache
+
+    scan_id = str(uuid4())
+    entry = response_cache.put(scan_id, response_cache.make_key(scan_id, "report"), {"n": 1})
+    etag = entry["etag"]
+
+    res = response_cache.to_response(entry, _request())
+    assert res.status_code == 200
+    assert res.headers["etag"] == etag
+    assert res.body == b'{"n":1}'
+
+    assert response_cache.to_response(entry, _request({"If-None-Match": etag})).status_code == 304
+    # 압축 표현의 ETag / weak ETag / 목록 중 하나여도 같은 버전
+    compressed = etag[:-1] + '-gzip"'
+    for value in (compressed, f"W/{etag}", f'"other", {etag}', "*"):
+        assert response_cache.to_response(entry, _request({"If-None-Match": value})).status_code == 304, value
+    assert response_cache.to_response(entry, _request({"If-None-Match": '"other"'})).status_code == 200
+
+
+def test_etag_matches_helper():
+    from backend.app import response_cache
+
+    assert not response_cache._etag_matches(None, '"a"')
+    assert response_cache._etag_matches('"a-zstd"', '"a"')
+    assert not response_cache._etag_matches('"b"', '"a"')
@@ -0,0 +1,55 @@
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("orjson")
+
+from starlette.requests import Request  # noqa: E402
+
+from backend.app import responses  # noqa: E402
+
+BIG = responses.COMPRESS_MIN_BYTES
+
+
+def _request(accept_encoding=None):
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": headers})
+
+
+def test_small_bodies_are_not_compressed():
+    assert responses.pick_encoding(_request("gzip, zstd"), BIG - 1) is None
+
+
+def test_prefers_zstd_when_available(monkeypatch):
+    monkeypatch.setattr(responses, "zstandard", object())
+    assert responses.pick_encoding(_request("gzip, zstd"), BIG) == "zstd"
+    monkeypatch.setattr(responses, "zstandard", None)
+    assert responses.pick_encoding(_request("gzip, zstd"), BIG) == "gzip"
+
+
+def test_respects_q_values_and_missing_header():
+    assert responses.pick_encoding(_request("gzip;q=0"), BIG) is None
+    assert responses.pick_encoding(_request("zstd;q=0, gzip;q=0.5"), BIG) == "gzip"
+    assert responses.pick_encoding(_request("br"), BIG) is None
+    assert responses.pick_encoding(_request(), BIG) is None
+    assert responses.pick_encoding(_request("GZIP;q=bad"), BIG) is None
+
+
+def test_bytes_response_compresses():
+    body = b"x" * BIG
+    res = responses.bytes_response(body, _request("gzip"), encoding="gzip")
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(res.body) == body
+
+    plain = responses.bytes_response(b"{}", _request("gzip"))
+    assert "content-encoding" not in plain.headers
+
+
+def test_orjson_response_encodes_datetimes_and_int_keys():
+    ts = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    res = responses.ORJSONResponse({"at": ts, 1: "one"})
+    assert res.media_type == "application/json"
+    assert res.body == b'{"at":"2026-01-02T03:04:05+00:00","1":"one"}'
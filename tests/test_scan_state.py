@@ -0,0 +1,140 @@
+from datetime import timedelta
+from uuid import uuid4
+
+import pytest
+
+pytestmark = pytest.mark.usefixtures("database")
+
+
+@pytest.fixture
+def scan_id():
+    from backend.app.db import SessionLocal
+    from backend.app.models import Scan
+
+    scan_id = str(uuid4())
+    db = SessionLocal()
+    try:
+        db.add(Scan(scan_id=scan_id, status="queued"))
+        db.commit()
+    finally:
+        db.close()
+    yield scan_id
+    db = SessionLocal()
+    try:
+        db.query(Scan).filter(Scan.scan_id == scan_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def answer(scan_id):
+    from backend.app.db import SessionLocal
+    from backend.app.models import LLMAnswer
+
+    group_id = "src/app.py:10-12"
+    db = SessionLocal()
+    try:
+        db.add(LLMAnswer(scan_id=scan_id, group_id=group_id, model="test", prompt="", status="queued"))
+        db.commit()
+    finally:
+        db.close()
+    yield scan_id, group_id
+    db = SessionLocal()
+    try:
+        db.query(LLMAnswer).filter(LLMAnswer.scan_id == scan_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def _scan(scan_id):
+    from backend.app.db import SessionLocal
+    from backend.app.models import Scan
+
+    db = SessionLocal()
+    try:
+        return db.get(Scan, scan_id)
+    finally:
+        db.close()
+
+
+def test_claim_scan_once(scan_id):
+    from backend.app import scan_state
+
+    assert scan_state.claim_scan(scan_id) == 1
+    # 이미 running -> 다른 worker는 못 가져감
+    assert scan_state.claim_scan(scan_id) is None
+    assert _scan(scan_id).status == "running"
+
+
+def test_stale_attempt_rejected_after_requeue(scan_id):
+    from backend.app import scan_state
+
+    first = scan_state.claim_scan(scan_id)
+    # reaper가 다시 큐에 넣고 다른 worker가 가져감
+    assert scan_state.transition_scan(scan_id, "queued", attempt=first)
+    second = scan_state.claim_scan(scan_id)
+    assert second == first + 1
+
+    # 늦게 깨어난 첫 worker는 heartbeat / 결과 기록 둘 다 실패
+    assert not scan_state.touch_scan(scan_id, first)
+    assert not scan_state.transition_scan(scan_id, "done", attempt=first)
+    assert _scan(scan_id).status == "running"
+
+    assert scan_state.touch_scan(scan_id, second)
+    assert scan_state.transition_scan(scan_id, "done", attempt=second)
+    assert _scan(scan_id).status == "done"
+
+
+def test_invalid_scan_transitions(scan_id):
+    from backend.app import scan_state
+
+    # queued -> done 은 규칙에 없음
+    assert not scan_state.transition_scan(scan_id, "done")
+    assert scan_state.transition_scan(scan_id, "cancelled")
+    # cancel 된 scan은 claim 되지 않음
+    assert scan_state.claim_scan(scan_id) is None
+    assert _scan(scan_id).status == "cancelled"
+
+
+def test_answer_claim_and_stale_attempt(answer):
+    from backend.app import scan_state
+
+    scan_id, group_id = answer
+    first = scan_state.claim_answer(scan_id, group_id)
+    assert first == 1
+    assert scan_state.claim_answer(scan_id, group_id) is None
+
+    assert scan_state.transition_answer(scan_id, group_id, "queued", attempt=first)
+    second = scan_state.claim_answer(scan_id, group_id)
+    assert second == first + 1
+
+    assert not scan_state.touch_answer(scan_id, group_id, first)
+    assert not scan_state.transition_answer(scan_id, group_id, "done", attempt=first)
+    assert scan_state.transition_answer(scan_id, group_id, "done", attempt=second)
+
+    # 끝난 답은 다시 요청(queued)만 가능
+    assert not scan_state.transition_answer(scan_id, group_id, "running")
+    assert scan_state.transition_answer(scan_id, group_id, "queued")
+
+
+def test_heartbeat_sets_lost_when_touch_fails():
+    from backend.app import scan_state
+
+    calls = []
+
+    def touch():
+        calls.append(1)
+        return len(calls) < 2
+
+    with scan_state.Heartbeat(touch, interval=0.01) as hb:
+        assert hb.lost.wait(2)
+    assert len(calls) == 2
+
+
+def test_stale_before():
+    from backend.app import scan_state
+
+    delta = scan_state._now() - scan_state.stale_before()
+    assert abs(delta - timedelta(seconds=scan_state.HEARTBEAT_STALE_SEC)) < timedelta(seconds=1)
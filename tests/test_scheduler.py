@@ -0,0 +1,102 @@
+from uuid import uuid4
+
+import pytest
+
+pytest.importorskip("celery")
+pytestmark = pytest.mark.usefixtures("redis_client")
+
+
+class FakeTask:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def apply_async(self, **kwargs):
+        if self.fail:
+            raise ConnectionError("broker down")
+        self.calls.append(kwargs)
+
+
+@pytest.fixture
+def project(monkeypatch):
+    from backend.app import scheduler
+
+    monkeypatch.setattr(scheduler, "PROJECT_MAX_INFLIGHT", 3)
+    name = f"test-{uuid4().hex}"
+    task_ids = []
+    yield name, task_ids
+    for task_id in task_ids:
+        scheduler.forget(task_id)
+    scheduler.get_redis().hdel(scheduler.INFLIGHT_KEY, name)
+
+
+def _inflight(project: str) -> int:
+    from backend.app import scheduler
+
+    return int(scheduler.get_redis().hget(scheduler.INFLIGHT_KEY, project) or 0)
+
+
+def _submit(project, task_ids, task, priority_class="interactive"):
+    from backend.app import scheduler
+
+    task_id = str(uuid4())
+    task_ids.append(task_id)
+    return task_id, scheduler.submit(task, ["x"], kind="scan", project=project, priority_class=priority_class, task_id=task_id)
+
+
+def test_fair_share_lowers_priority_then_demotes(project):
+    name, task_ids = project
+    task = FakeTask()
+
+    plans = [_submit(name, task_ids, task)[1] for _ in range(4)]
+    assert [(p["queue"], p["priority"], p["demoted"]) for p in plans] == [
+        ("interactive", 0, False),
+        ("interactive", 1, False),
+        ("interactive", 2, False),
+        # PROJECT_MAX_INFLIGHT(3)개가 진행 중 -> batch 최하위
+        ("batch", 9, True),
+    ]
+    assert [c["queue"] for c in task.calls] == ["interactive"] * 3 + ["batch"]
+    assert _inflight(name) == 4
+
+
+def test_batch_class_starts_lower():
+    from backend.app import scheduler
+
+    p = scheduler.plan(f"test-{uuid4().hex}", "batch")
+    assert (p["queue"], p["priority"], p["demoted"]) == ("batch", 5, False)
+    with pytest.raises(ValueError):
+        scheduler.plan("x", "urgent")
+
+
+def test_submit_failure_rolls_back_ledger(project):
+    from backend.app import scheduler
+
+    name, task_ids = project
+    with pytest.raises(ConnectionError):
+        task_id, _ = _submit(name, task_ids, FakeTask(fail=True))
+    task_id = task_ids[-1]
+
+    assert _inflight(name) == 0
+    assert not scheduler.is_tracked(task_id)
+    assert scheduler.queue_info(task_id) is None
+    # 실패한 제출 때문에 강등되지 않음
+    assert scheduler.plan(name, "interactive")["priority"] == 0
+
+
+def test_forget_is_idempotent_and_queue_position(project):
+    from backend.app import scheduler
+
+    name, task_ids = project
+    first, _ = _submit(name, task_ids, FakeTask())
+    second, _ = _submit(name, task_ids, FakeTask())
+    assert scheduler.queue_info(second)["position"] >= 2
+
+    scheduler.mark_started(first)
+    assert scheduler.queue_info(first)["position"] == 0
+
+    scheduler.forget(first)
+    scheduler.forget(first)
+    assert _inflight(name) == 1
+    assert not scheduler.is_tracked(first)
+    assert scheduler.is_tracked(second)
@@ -0,0 +1,192 @@
+import hashlib
+
+import pytest
+
+pytestmark = pytest.mark.usefixtures("database")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    from backend.app.main import app
+
+    # workspace/<scan_id>/upload.zip 은 cwd 기준
+    monkeypatch.chdir(tmp_path)
+    return TestClient(app)
+
+
+@pytest.fixture
+def upload(client):
+    from backend.app import uploads
+    from backend.app.db import SessionLocal
+    from backend.app.models import Upload
+
+    chunk_size = uploads.UPLOAD_MIN_CHUNK_SIZE
+    res = client.post("/uploads", json={"size": chunk_size * 2 - 100, "chunk_size": chunk_size})
+    assert res.status_code == 200
+    body = res.json()
+    yield body
+    uploads.forget_chunks(body["upload_id"])
+    db = SessionLocal()
+    try:
+        db.query(Upload).filter(Upload.upload_id == body["upload_id"]).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def _put(client, upload_id, offset, data, checksum=None):
+    return client.put(
+        f"/uploads/{upload_id}",
+        content=data,
+        headers={
+            "Upload-Offset": str(offset),
+            "X-Chunk-SHA256": checksum or hashlib.sha256(data).hexdigest(),
+        },
+    )
+
+
+def _file(upload_id) -> bytes:
+    from backend.app import uploads
+    from backend.app.main import _load_upload
+
+    return uploads.zip_path(_load_upload(upload_id).scan_id).read_bytes()
+
+
+def _stages(upload_id) -> list:
+    from backend.app import uploads
+    from backend.app.main import _load_upload
+
+    return list((uploads.workspace_dir(_load_upload(upload_id).scan_id) / "chunks").glob("*.part"))
+
+
+def test_chunk_written_and_recorded(client, upload):
+    from backend.app import uploads
+
+    upload_id, size = upload["upload_id"], upload["chunk_size"]
+    data = b"a" * size
+    res = _put(client, upload_id, 0, data)
+    assert res.status_code == 200
+    assert res.json()["index"] == 0
+    assert uploads.received(upload_id) == {0}
+    assert _file(upload_id)[:size] == data
+    assert _stages(upload_id) == []
+
+
+def test_re_put_with_bad_checksum_keeps_received_chunk(client, upload):
+    from backend.app import uploads
+
+    upload_id, size = upload["upload_id"], upload["chunk_size"]
+    good = b"a" * size
+    assert _put(client, upload_id, 0, good).status_code == 200
+
+    # 이미 받은 chunk를 다시 보냈는데 체크섬이 틀림 -> 최종 파일 / 받은 목록 그대로
+    res = _put(client, upload_id, 0, b"b" * size, checksum=hashlib.sha256(b"other").hexdigest())
+    assert res.status_code == 422
+    assert _file(upload_id)[:size] == good
+    assert uploads.received(upload_id) == {0}
+    assert _stages(upload_id) == []
+
+
+def test_re_put_with_good_checksum_overwrites(client, upload):
+    from backend.app import uploads
+
+    upload_id, size = upload["upload_id"], upload["chunk_size"]
+    assert _put(client, upload_id, 0, b"a" * size).status_code == 200
+    assert _put(client, upload_id, 0, b"c" * size).status_code == 200
+    assert _file(upload_id)[:size] == b"c" * size
+    assert uploads.received(upload_id) == {0}
+
+
+def test_short_last_chunk_and_length_mismatch(client, upload):
+    from backend.app import uploads
+
+    upload_id, size = upload["upload_id"], upload["chunk_size"]
+    # 마지막 chunk는 size - 100 바이트
+    assert _put(client, upload_id, size, b"x" * size).status_code == 400
+    assert _put(client, upload_id, size, b"x" * (size - 200)).status_code == 400
+    assert uploads.received(upload_id) == set()
+    assert _put(client, upload_id, size, b"x" * (size - 100)).status_code == 200
+    assert uploads.missing(upload_id, upload["chunks"]) == [0]
+
+
+def test_bad_offset_and_missing_checksum(client, upload):
+    upload_id = upload["upload_id"]
+    assert _put(client, upload_id, 1, b"a").status_code == 400
+    res = client.put(f"/uploads/{upload_id}", content=b"a", headers={"Upload-Offset": "0"})
+    assert res.status_code == 400
+
+
+def test_put_rejected_after_finalize_started(client, upload):
+    from backend.app import uploads
+
+    upload_id, size = upload["upload_id"], upload["chunk_size"]
+    assert uploads.set_status(upload_id, "finalizing", from_status="uploading")
+    assert _put(client, upload_id, 0, b"a" * size).status_code == 409
+    assert uploads.received(upload_id) == set()
+
+
+def test_commit_chunk_skips_when_not_uploading(client, upload, tmp_path):
+    # PUT이 상태 확인을 통과한 뒤 finalize가 먼저 시작된 경우 -> 파일을 건드리지 않음
+    from backend.app import uploads
+    from backend.app.main import _load_upload
+
+    upload_id, size = upload["upload_id"], upload["chunk_size"]
+    scan_id = _load_upload(upload_id).scan_id
+    fd, stage = uploads.open_stage(scan_id, 0)
+    with open(fd, "wb") as f:
+        f.write(b"z" * size)
+    assert uploads.set_status(upload_id, "finalizing", from_status="uploading")
+
+    assert not uploads.commit_chunk(upload_id, scan_id, 0, 0, stage)
+    assert _file(upload_id)[:size] == b"\0" * size
+    assert uploads.received(upload_id) == set()
+    uploads.discard_stage(stage)
+
+
+def test_finalize_incomplete_goes_back_to_uploading(client, upload):
+    from backend.app.main import _load_upload
+
+    upload_id, size = upload["upload_id"], upload["chunk_size"]
+    assert _put(client, upload_id, 0, b"a" * size).status_code == 200
+    res = client.post(f"/uploads/{upload_id}/finalize")
+    assert res.status_code == 409
+    assert res.json()["detail"]["missing_offsets"] == [size]
+    assert _load_upload(upload_id).status == "uploading"
+
+
+def test_expire_uploads_stale_finalizing(client, upload):
+    pytest.importorskip("celery")
+    from datetime import datetime, timedelta, timezone
+
+    from sqlalchemy import update
+
+    from backend.app import uploads
+    from backend.app.db import SessionLocal
+    from backend.app.main import _load_upload
+    from backend.app.models import Upload
+    from backend.app.tasks import expire_uploads
+
+    upload_id = upload["upload_id"]
+    assert uploads.set_status(upload_id, "finalizing", from_status="uploading")
+
+    # 방금 finalizing 이 된 것은 그대로
+    expire_uploads()
+    assert _load_upload(upload_id).status == "finalizing"
+
+    # finalize 작업이 유실되어 오래 멈춘 것은 만료 + 파일 삭제
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Upload)
+            .where(Upload.upload_id == upload_id)
+            .values(updated_at=datetime.now(timezone.utc) - timedelta(seconds=uploads.UPLOAD_FINALIZE_STALE_SEC + 60))
+        )
+        db.commit()
+    finally:
+        db.close()
+    expire_uploads()
+    assert _load_upload(upload_id).status == "expired"
+    assert not uploads.workspace_dir(_load_upload(upload_id).scan_id).exists()